@@ -0,0 +1,211 @@
+"""
+Fake Deepgram and Gemini servers for offline benchmarks.
+
+Both speak just enough of the real REST APIs for the SDKs used by the services,
+with configurable latency and payload size.
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Any, List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+VOCABULARY = (
+    "the model learns a representation of the data by minimising the loss over many "
+    "examples so that gradient descent can update every parameter in the network while "
+    "the learning rate controls how far each step moves and regularisation keeps weights small"
+).split()
+
+
+def make_words(duration_seconds: float, words_per_second: float = 2.5, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate Deepgram-style words covering the given duration.
+    """
+    rng = random.Random(seed)
+    word_count = int(duration_seconds * words_per_second)
+    step = 1 / words_per_second
+    words = []
+    for i in range(word_count):
+        word = rng.choice(VOCABULARY)
+        start = round(i * step, 3)
+        words.append({
+            "word": word,
+            "start": start,
+            "end": round(start + step * 0.8, 3),
+            "confidence": 0.99,
+            "punctuated_word": word.capitalize() if i % 12 == 0 else word,
+        })
+    return words
+
+
+def make_transcription(duration_seconds: float, words_per_second: float = 2.5, seed: int = 0) -> Dict[str, Any]:
+    """
+    Generate a synthetic Deepgram prerecorded response of the given duration.
+    """
+    words = make_words(duration_seconds, words_per_second, seed)
+    return {
+        "metadata": {
+            "transaction_key": "deprecated",
+            "request_id": f"fake-{seed}",
+            "sha256": "",
+            "created": "2025-01-01T00:00:00.000Z",
+            "duration": float(duration_seconds),
+            "channels": 1,
+            "models": ["fake"],
+            "model_info": {},
+        },
+        "results": {
+            "channels": [{
+                "alternatives": [{
+                    "transcript": " ".join(word["punctuated_word"] for word in words),
+                    "confidence": 0.99,
+                    "words": words,
+                }]
+            }]
+        },
+    }
+
+
+def create_fake_deepgram_app(latency: float = 0.5, audio_bytes_per_second: int = 2000, words_per_second: float = 2.5) -> FastAPI:
+    """
+    A fake of Deepgram's POST /v1/listen. The transcript duration is derived from the
+    size of the uploaded audio, so bigger uploads return bigger transcripts.
+    """
+    app = FastAPI()
+
+    @app.post("/v1/listen")
+    async def listen(request: Request):
+        body = await request.body()
+        await asyncio.sleep(latency)
+        duration = len(body) / audio_bytes_per_second
+        return make_transcription(duration, words_per_second, seed=len(body))
+
+    return app
+
+
+def _sections_for(segment_count: int, segments_per_section: int) -> Dict[str, Any]:
+    sections = []
+    for start_index in range(0, segment_count, segments_per_section):
+        end_index = min(start_index + segments_per_section, segment_count) - 1
+        sections.append({
+            "title": f"Section {len(sections) + 1}",
+            "start_index": start_index,
+            "end_index": end_index,
+            "summary": [f"Point {i + 1} about segments {start_index} to {end_index}" for i in range(3)],
+        })
+    return {"sections": sections}
+
+
+def _artifacts_for(segment_count: int) -> Dict[str, Any]:
+    return {
+        "summary": f"A video of {segment_count} segments. " + " ".join(VOCABULARY[:20]),
+        "actionables": [f"Try step {i + 1}" for i in range(3)],
+        "mindmap": {
+            "root": "Video",
+            "branches": [{"title": f"Topic {i + 1}", "children": [f"Subtopic {i + 1}.{j + 1}" for j in range(3)]} for i in range(3)],
+        },
+    }
+
+
+def create_fake_gemini_app(latency: float = 1.0, answer_words: int = 150, segments_per_section: int = 30) -> FastAPI:
+    """
+    A fake of Gemini's REST generateContent and streamGenerateContent. Requests for
+    sections get sections that cover every transcript segment in the prompt (with the
+    derived artifacts if the prompt asks for them); everything else gets an answer of
+    answer_words words.
+    """
+    app = FastAPI()
+    segment_pattern = re.compile(r'^(\d+): ', re.MULTILINE)
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        body = await request.json()
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in [body.get("systemInstruction") or {}, *body.get("contents", [])]
+            for part in content.get("parts", [])
+        )
+        await asyncio.sleep(latency)
+
+        if "start_index" in prompt:
+            segment_count = len(segment_pattern.findall(prompt)) or 1
+            payload = _sections_for(segment_count, segments_per_section)
+            if "mindmap" in prompt:
+                payload.update(_artifacts_for(segment_count))
+        elif "mindmap" in prompt:
+            payload = _artifacts_for(len(segment_pattern.findall(prompt)))
+        else:
+            payload = {"response": " ".join(VOCABULARY[i % len(VOCABULARY)] for i in range(answer_words))}
+
+        text = json.dumps(payload)
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": (len(prompt) + len(text)) // 4,
+            },
+        }
+
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def stream_generate_content(model: str, request: Request):
+        # Answers only; the same total latency as generateContent, spread over chunks of 10 words
+        await request.body()
+        words = [VOCABULARY[i % len(VOCABULARY)] for i in range(answer_words)]
+        chunks = [" ".join(words[i:i + 10]) + " " for i in range(0, len(words), 10)] or [""]
+
+        async def stream():
+            yield "["
+            for i, text in enumerate(chunks):
+                await asyncio.sleep(latency / len(chunks))
+                chunk = {
+                    "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}],
+                }
+                if i == len(chunks) - 1:
+                    chunk["candidates"][0]["finishReason"] = "STOP"
+                    chunk["usageMetadata"] = {"promptTokenCount": 0, "candidatesTokenCount": answer_words}
+                yield ("," if i else "") + json.dumps(chunk)
+            yield "]"
+
+        return StreamingResponse(stream(), media_type="application/json")
+
+    return app
+
+
+class FakeServer:
+    """
+    Runs an ASGI app with uvicorn in a background thread.
+
+    Usage:
+        with FakeServer(create_fake_deepgram_app(), port=8766) as server:
+            print(server.url)
+    """
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
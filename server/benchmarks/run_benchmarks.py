@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of the API endpoints.
+
+Runs the FastAPI app in-process against fake Deepgram and Gemini servers, with
+synthetic transcripts from 1 minute to 6 hours, and writes throughput, latency
+percentiles and peak RSS per endpoint to a JSON file.
+
+The fake Gemini server speaks the REST API, and the Gemini SDK only has a blocking
+client for REST. Pointing GEMINI_API_ENDPOINT at it therefore switches llm_service
+to that client, run in the llm thread pool, instead of the async gRPC client used
+in production. LLM call overhead and concurrency are measured on that path, not
+the production one; the rest of each request is the same.
+
+Usage (from the server directory):
+    python -m benchmarks.run_benchmarks --durations 60 3600 --requests 20 --concurrency 4
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/previous.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List, Callable
+
+server_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(server_dir))
+
+from benchmarks.fake_providers import (
+    FakeServer,
+    create_fake_deepgram_app,
+    create_fake_gemini_app,
+    make_transcription,
+)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_DURATIONS = [60, 600, 3600, 21600]  # 1 minute to 6 hours
+# Printed and saved with every run, see the module docstring
+LLM_TRANSPORT_NOTE = (
+    "LLM calls go to the fake Gemini over REST with the blocking client in the llm thread pool, "
+    "not over gRPC with the async client used in production"
+)
+
+
+class RSSSampler:
+    """
+    Samples the resident set size of this process in a background thread to find
+    the peak of one scenario (ru_maxrss only gives the peak of the whole process).
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_rss_bytes() -> int:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.current_rss_bytes())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak_bytes = self.current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def video_id_for(scenario: str, duration: int, index: int) -> str:
+    # YouTube IDs are 11 characters of [A-Za-z0-9_-]
+    return f"{scenario[0]}{duration:06d}{index:04d}"[:11].ljust(11, "x")
+
+
+def youtube_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def write_transcription(data_dir: Path, video_id: str, duration: int):
+    video_dir = data_dir / video_id
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "transcription.json", "w") as f:
+        json.dump(make_transcription(duration, seed=duration), f)
+
+
+def write_audio(data_dir: Path, video_id: str, duration: int, audio_bytes_per_second: int):
+    video_dir = data_dir / video_id
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "audio.webm", "wb") as f:
+        f.write(os.urandom(duration * audio_bytes_per_second))
+
+
+async def run_load(client, make_request: Callable[[int], Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Send requests with at most `concurrency` in flight and measure each one.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one(index: int):
+        async with semaphore:
+            method, path, body = make_request(index)
+            started_at = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started_at)
+            if response.status_code >= 400:
+                errors.append(f"{response.status_code}: {response.text[:200]}")
+
+    with RSSSampler() as sampler:
+        started_at = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "peak_rss_mb": round(sampler.peak_bytes / (1024 * 1024), 2),
+    }
+
+
+async def run_chat_load(base_url: str, video_id: str, duration: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Ask questions over `concurrency` chat websockets, each kept open for all of its questions,
+    and measure the time to the first streamed token and to the full answer.
+    """
+    import websockets
+
+    rng = random.Random(duration)
+    latencies = []
+    first_token_latencies = []
+    errors = []
+    url = f"{base_url.replace('http://', 'ws://')}/ws/videos/{video_id}/chat"
+
+    async def connection(questions: int):
+        async with websockets.connect(url, max_size=None) as websocket:
+            json.loads(await websocket.recv())  # ready
+            for i in range(questions):
+                started_at = time.perf_counter()
+                await websocket.send(json.dumps({
+                    "type": "question", "id": str(i), "question": "What is this part about?",
+                    "position": rng.uniform(0, max(duration - 1, 0)),
+                }))
+                first_token_at = None
+                while True:
+                    message = json.loads(await websocket.recv())
+                    if message["type"] == "token" and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if message["type"] in ("done", "error"):
+                        break
+                latencies.append(time.perf_counter() - started_at)
+                if first_token_at:
+                    first_token_latencies.append(first_token_at - started_at)
+                if message["type"] == "error":
+                    errors.append(message["detail"])
+
+    per_connection = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    with RSSSampler() as sampler:
+        started_at = time.perf_counter()
+        await asyncio.gather(*[connection(count) for count in per_connection if count])
+        elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "first_token_ms": {
+            "p50": round(percentile(first_token_latencies, 50) * 1000, 2),
+            "p99": round(percentile(first_token_latencies, 99) * 1000, 2),
+        },
+        "peak_rss_mb": round(sampler.peak_bytes / (1024 * 1024), 2),
+    }
+
+
+async def run_benchmarks(args, data_dir: Path) -> List[Dict[str, Any]]:
+    import httpx
+    from main import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for duration in args.durations:
+            endpoints = {}
+
+            # /videos/transcribe: every request is a new video with audio but no transcript yet
+            for i in range(args.requests):
+                write_audio(data_dir, video_id_for("transcribe", duration, i), duration, args.audio_bytes_per_second)
+            endpoints["/videos/transcribe"] = lambda i: (
+                "POST", "/videos/transcribe", {"youtube_url": youtube_url(video_id_for("transcribe", duration, i))}
+            )
+
+            # /videos/create_sections: every request is a new video with a transcript but no sections yet
+            for i in range(args.requests):
+                write_transcription(data_dir, video_id_for("sections", duration, i), duration)
+            endpoints["/videos/create_sections"] = lambda i: (
+                "POST", "/videos/create_sections", {"youtube_url": youtube_url(video_id_for("sections", duration, i))}
+            )
+
+            # /videos/answer_question: questions at random positions of the first sectioned video
+            rng = random.Random(duration)
+            answer_video_url = youtube_url(video_id_for("sections", duration, 0))
+            endpoints["/videos/answer_question"] = lambda i: (
+                "POST", "/videos/answer_question", {
+                    "youtube_url": answer_video_url,
+                    "question": "What is this part about?",
+                    "timestamp": time.strftime('%H:%M:%S', time.gmtime(rng.uniform(0, max(duration - 1, 0)))),
+                }
+            )
+
+            for endpoint, make_request in endpoints.items():
+                if args.endpoints and endpoint not in args.endpoints:
+                    continue
+                if endpoint == "/videos/answer_question":
+                    # Questions need sections; this is a cached read if create_sections already ran
+                    await client.post("/videos/create_sections", json={"youtube_url": answer_video_url})
+                print(f"Benchmarking {endpoint} with a {duration}s transcript...", flush=True)
+                result = await run_load(client, make_request, args.requests, args.concurrency)
+                results.append({"endpoint": endpoint, "transcript_seconds": duration, **result})
+                print(
+                    f"  {result['throughput_rps']} req/s, p50 {result['latency_ms']['p50']} ms, "
+                    f"p99 {result['latency_ms']['p99']} ms, peak RSS {result['peak_rss_mb']} MB, "
+                    f"{result['errors']} errors",
+                    flush=True
+                )
+
+            mixed_endpoint = "/videos/answer_question (under sectioning load)"
+            if not args.endpoints or mixed_endpoint in args.endpoints:
+                # Questions while create_sections requests for new videos keep the LLM busy
+                background_count = args.concurrency * 4
+                for i in range(background_count):
+                    write_transcription(data_dir, video_id_for("mixed", duration, i), duration)
+                background = asyncio.gather(*[
+                    client.post("/videos/create_sections", json={"youtube_url": youtube_url(video_id_for("mixed", duration, i))})
+                    for i in range(background_count)
+                ])
+                await asyncio.sleep(0.1)
+                print(f"Benchmarking {mixed_endpoint} with a {duration}s transcript...", flush=True)
+                result = await run_load(client, endpoints["/videos/answer_question"], args.requests, args.concurrency)
+                await background
+                results.append({"endpoint": mixed_endpoint, "transcript_seconds": duration, **result})
+                print(
+                    f"  {result['throughput_rps']} req/s, p50 {result['latency_ms']['p50']} ms, "
+                    f"p99 {result['latency_ms']['p99']} ms, {result['errors']} errors",
+                    flush=True
+                )
+
+            chat_endpoint = "/ws/videos/{video_id}/chat"
+            if not args.endpoints or chat_endpoint in args.endpoints:
+                # Websockets need a real server; the app is served on a local port for this scenario
+                await client.post("/videos/create_sections", json={"youtube_url": answer_video_url})
+                print(f"Benchmarking {chat_endpoint} with a {duration}s transcript...", flush=True)
+                with FakeServer(app) as app_server:
+                    result = await run_chat_load(
+                        app_server.url, video_id_for("sections", duration, 0), duration, args.requests, args.concurrency
+                    )
+                results.append({"endpoint": chat_endpoint, "transcript_seconds": duration, **result})
+                print(
+                    f"  {result['throughput_rps']} req/s, p50 {result['latency_ms']['p50']} ms, "
+                    f"p99 {result['latency_ms']['p99']} ms, first token p50 {result['first_token_ms']['p50']} ms, "
+                    f"peak RSS {result['peak_rss_mb']} MB, {result['errors']} errors",
+                    flush=True
+                )
+
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["transcript_seconds"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparison with {baseline_path} (positive = slower / bigger):")
+    for result in results:
+        previous = baseline.get((result["endpoint"], result["transcript_seconds"]))
+        if not previous:
+            continue
+
+        def change(current, before):
+            return f"{(current - before) / before * 100:+.1f}%" if before else "n/a"
+
+        print(
+            f"  {result['endpoint']} @ {result['transcript_seconds']}s: "
+            f"p50 {change(result['latency_ms']['p50'], previous['latency_ms']['p50'])}, "
+            f"p99 {change(result['latency_ms']['p99'], previous['latency_ms']['p99'])}, "
+            f"throughput {change(previous['throughput_rps'], result['throughput_rps'])}, "
+            f"peak RSS {change(result['peak_rss_mb'], previous['peak_rss_mb'])}"
+        )
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=server_dir, text=True, capture_output=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against fake Deepgram and Gemini servers")
+    parser.add_argument("--durations", type=int, nargs="+", default=DEFAULT_DURATIONS, help="Transcript durations in seconds")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per endpoint and duration")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--endpoints", type=str, nargs="*", help="Only benchmark these endpoints")
+    parser.add_argument("--stt-latency", type=float, default=0.5, help="Seconds the fake Deepgram takes per request")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds the fake Gemini takes per request")
+    parser.add_argument("--answer-words", type=int, default=150, help="Length of the fake Gemini answers")
+    parser.add_argument("--audio-bytes-per-second", type=int, default=2000, help="Size of the synthetic audio files")
+    parser.add_argument("--output", type=str, help="Where to write the results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=str, help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="vidly-benchmark-"))
+    print(f"Note: {LLM_TRANSPORT_NOTE}\n")
+
+    deepgram_server = FakeServer(create_fake_deepgram_app(args.stt_latency, args.audio_bytes_per_second))
+    gemini_server = FakeServer(create_fake_gemini_app(args.llm_latency, args.answer_words))
+
+    with deepgram_server, gemini_server:
+        # The services read these when they are first imported
+        os.environ["VIDLY_DATA_DIR"] = str(data_dir)
+        os.environ["DEEPGRAM_URL"] = deepgram_server.url
+        os.environ["GEMINI_API_ENDPOINT"] = gemini_server.url
+        os.environ.setdefault("DEEPGRAM_API_KEY", "benchmark")
+        os.chdir(server_dir)
+
+        results = asyncio.run(run_benchmarks(args, data_dir))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "llm_transport": LLM_TRANSPORT_NOTE,
+        "results": results,
+    }
+
+    output_path = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of the similar videos index (IVF over the int8 vectors) against brute-force
+search, on a synthetic catalogue where each video covers one or two of a set of topics.
+
+Usage (from the server directory):
+    python -m benchmarks.similar_videos --videos 20000 --queries 200 --nprobe 1 4 8 16
+"""
+
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+from pathlib import Path
+from typing import Dict, Any, List
+
+server_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(server_dir))
+
+from services.similar_service import SimilarVideoIndex, embed_sections
+from benchmarks.run_benchmarks import RESULTS_DIR, percentile, get_git_commit
+
+
+def make_catalogue(videos: int, topics: int, seed: int = 0) -> List[List[Dict[str, Any]]]:
+    """
+    The sections of every video: titles and summary points drawn mostly from the words of the
+    video's topics, the rest from words shared by all videos.
+    """
+    rng = random.Random(seed)
+    common = [f"common{i}" for i in range(2000)]
+    topic_words = [[f"topic{t}word{i}" for i in range(40)] for t in range(topics)]
+
+    def sentence(words: List[str], length: int) -> str:
+        return " ".join(rng.choice(words) if rng.random() < 0.6 else rng.choice(common) for _ in range(length))
+
+    catalogue = []
+    for _ in range(videos):
+        words = [word for topic in rng.sample(range(topics), rng.choice([1, 2])) for word in topic_words[topic]]
+        catalogue.append([
+            {"title": sentence(words, 4), "summary": [sentence(words, 10) for _ in range(3)]}
+            for _ in range(rng.randint(4, 12))
+        ])
+    return catalogue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the similar videos index against brute force")
+    parser.add_argument("--videos", type=int, default=20000, help="Videos in the catalogue")
+    parser.add_argument("--topics", type=int, default=500, help="Topics the videos are drawn from")
+    parser.add_argument("--queries", type=int, default=200, help="Videos queried for their neighbours")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16], help="Lists searched per query")
+    parser.add_argument("--output", type=str, help="Where to write the results (default: benchmarks/results/similar-<timestamp>.json)")
+    args = parser.parse_args()
+
+    index_dir = Path(tempfile.mkdtemp(prefix="vidly-similar-"))
+    try:
+        started_at = time.perf_counter()
+        vectors = [embed_sections(sections) for sections in make_catalogue(args.videos, args.topics)]
+        embed_seconds = time.perf_counter() - started_at
+
+        index = SimilarVideoIndex(index_dir)
+        insert_latencies = []
+        started_at = time.perf_counter()
+        for i, vector in enumerate(vectors):
+            insert_started_at = time.perf_counter()
+            index.add(f"v{i:010d}", vector)
+            insert_latencies.append(time.perf_counter() - insert_started_at)
+        # The lists are rebuilt in the background
+        index.wait_for_training()
+        build_seconds = time.perf_counter() - started_at
+        index_bytes = sum(path.stat().st_size for path in index_dir.iterdir())
+        print(
+            f"Indexed {len(index)} videos in {build_seconds:.1f}s ({len(index.lists)} lists, {index_bytes / 1024 / 1024:.1f} MB), "
+            f"insert p50 {percentile(insert_latencies, 50) * 1e3:.2f} ms, max {max(insert_latencies):.2f} s",
+            flush=True
+        )
+
+        rng = random.Random(1)
+        queries = rng.sample(range(len(vectors)), min(args.queries, len(vectors)))
+        truth, brute_latencies = {}, []
+        for query in queries:
+            started_at = time.perf_counter()
+            truth[query] = {video_id for video_id, _ in index.brute_force(vectors[query], args.k, exclude=f"v{query:010d}")}
+            brute_latencies.append(time.perf_counter() - started_at)
+        results = [{
+            "method": "brute_force",
+            "recall": 1.0,
+            "latency_ms": {"p50": round(percentile(brute_latencies, 50) * 1e3, 2), "p99": round(percentile(brute_latencies, 99) * 1e3, 2)},
+        }]
+        print(f"brute force    recall 1.000, p50 {results[0]['latency_ms']['p50']} ms, p99 {results[0]['latency_ms']['p99']} ms", flush=True)
+
+        for nprobe in args.nprobe:
+            latencies, recalls = [], []
+            for query in queries:
+                started_at = time.perf_counter()
+                found = index.search(vectors[query], args.k, nprobe=nprobe, exclude=f"v{query:010d}")
+                latencies.append(time.perf_counter() - started_at)
+                recalls.append(len(truth[query] & {video_id for video_id, _ in found}) / max(1, len(truth[query])))
+            result = {
+                "method": "ivf",
+                "nprobe": nprobe,
+                "recall": round(sum(recalls) / len(recalls), 4),
+                "latency_ms": {"p50": round(percentile(latencies, 50) * 1e3, 2), "p99": round(percentile(latencies, 99) * 1e3, 2)},
+            }
+            results.append(result)
+            print(
+                f"ivf nprobe={nprobe:<3} recall {result['recall']:.3f}, p50 {result['latency_ms']['p50']} ms, "
+                f"p99 {result['latency_ms']['p99']} ms",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "index": {
+            "lists": len(index.lists),
+            "bytes": index_bytes,
+            "embed_seconds": round(embed_seconds, 2),
+            "build_seconds": round(build_seconds, 2),
+            "insert_ms_p50": round(percentile(insert_latencies, 50) * 1e3, 3),
+        },
+        "results": results,
+    }
+    output_path = Path(args.output) if args.output else RESULTS_DIR / f"similar-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
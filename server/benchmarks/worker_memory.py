@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Memory of N uvicorn-like worker processes that all serve the same hot videos, with every
+worker parsing its own copy of the JSON artifacts ("json") or mapping the shared transcript
+cache ("shared"). Memory is the proportional set size (PSS) summed over the workers, so pages
+shared by several workers are counted once, minus the PSS of the same workers idle.
+
+Linux only (reads /proc/<pid>/smaps_rollup).
+
+Usage (from the server directory):
+    python -m benchmarks.worker_memory --workers 1 2 4 8 16 --videos 8 --duration 3600
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List
+
+server_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(server_dir))
+
+from benchmarks.fake_providers import make_transcription
+from benchmarks.run_benchmarks import RESULTS_DIR, percentile, get_git_commit
+
+# Runs in every worker: load the videos, time section text lookups, report, then stay alive until stdin closes
+WORKER_CODE = """
+import sys, json, time, random
+mode, video_ids, lookups = sys.argv[1], sys.argv[2].split(","), int(sys.argv[3])
+import services.llm_service as llm_service
+from services.utils.storage import load_json_artifact
+
+contexts = []
+if mode == "json":
+    # What every worker held before the shared cache: the parsed transcription and sections
+    for video_id in video_ids:
+        words = load_json_artifact(video_id, "transcription.json")["results"]["channels"][0]["alternatives"][0]["words"]
+        sections = [
+            {"start": llm_service.convert_timestamp_to_seconds(s["start"]), "end": llm_service.convert_timestamp_to_seconds(s["end"])}
+            for s in load_json_artifact(video_id, "sections.json")
+        ]
+        contexts.append((words, sections))
+
+    def section_text(context, index):
+        words, sections = context
+        return " ".join(w["word"] for w in words if sections[index]["start"] <= w["start"] <= sections[index]["end"])
+elif mode == "shared":
+    contexts = [llm_service.load_video_context(video_id) for video_id in video_ids]
+
+    def section_text(context, index):
+        return context.get_section_text(index)
+
+rng = random.Random(0)
+latencies = []
+for _ in range(lookups if contexts else 0):
+    context = rng.choice(contexts)
+    index = rng.randrange(len(context[1]) if mode == "json" else len(context.sections))
+    started_at = time.perf_counter()
+    section_text(context, index)
+    latencies.append(time.perf_counter() - started_at)
+
+print(json.dumps(latencies), flush=True)
+sys.stdin.read()
+"""
+
+
+def get_pss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def write_video(data_dir: Path, video_id: str, duration: int):
+    video_dir = data_dir / video_id
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "transcription.json", "w") as f:
+        json.dump(make_transcription(duration, seed=duration), f)
+    # Sections of 5 minutes
+    sections = [
+        {
+            "title": f"Section {start // 300 + 1}",
+            "start": time.strftime('%H:%M:%S', time.gmtime(start)),
+            "end": time.strftime('%H:%M:%S', time.gmtime(min(start + 299, duration))),
+            "summary": ["A point"],
+        }
+        for start in range(0, duration, 300)
+    ]
+    with open(video_dir / "sections.json", "w") as f:
+        json.dump(sections, f)
+
+
+def run_workers(mode: str, workers: int, video_ids: List[str], lookups: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Start the workers, wait until all have loaded the videos and measured their lookups, then sum their PSS.
+    """
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER_CODE, mode, ",".join(video_ids), str(lookups)],
+            cwd=server_dir, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    try:
+        latencies = []
+        for process in processes:
+            latencies.extend(json.loads(process.stdout.readline()))
+        pss_bytes = sum(get_pss_bytes(process.pid) for process in processes)
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+    return {
+        "pss_mb": round(pss_bytes / 1024 / 1024, 1),
+        "lookup_us": {
+            "p50": round(percentile(latencies, 50) * 1e6, 1),
+            "p99": round(percentile(latencies, 99) * 1e6, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of several workers with and without the shared transcript cache")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Worker counts to measure")
+    parser.add_argument("--videos", type=int, default=8, help="Hot videos loaded by every worker")
+    parser.add_argument("--duration", type=int, default=3600, help="Transcript duration of each video in seconds")
+    parser.add_argument("--lookups", type=int, default=2000, help="Section text lookups timed in every worker")
+    parser.add_argument("--output", type=str, help="Where to write the results (default: benchmarks/results/workers-<timestamp>.json)")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="vidly-workers-"))
+    cache_dir = Path(tempfile.mkdtemp(prefix="vidly-shm-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None))
+    video_ids = [f"w{args.duration:06d}{i:04d}"[:11] for i in range(args.videos)]
+    for video_id in video_ids:
+        write_video(data_dir, video_id, args.duration)
+
+    env = {
+        **os.environ,
+        "VIDLY_DATA_DIR": str(data_dir),
+        "SHARED_CACHE_DIR": str(cache_dir),
+        "DEEPGRAM_API_KEY": os.getenv("DEEPGRAM_API_KEY", "benchmark"),
+    }
+
+    results = []
+    try:
+        for workers in args.workers:
+            idle = run_workers("idle", workers, video_ids, 0, env)
+            for mode in ("json", "shared"):
+                result = run_workers(mode, workers, video_ids, args.lookups, env)
+                result["transcripts_mb"] = round(result["pss_mb"] - idle["pss_mb"], 1)
+                results.append({"mode": mode, "workers": workers, **result})
+                print(
+                    f"{mode:6} x{workers:<3} transcripts {result['transcripts_mb']:8.1f} MB "
+                    f"(total PSS {result['pss_mb']:.1f} MB), lookup p50 {result['lookup_us']['p50']} us, "
+                    f"p99 {result['lookup_us']['p99']} us",
+                    flush=True
+                )
+    finally:
+        # The cache lives in RAM
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    output_path = Path(args.output) if args.output else RESULTS_DIR / f"workers-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
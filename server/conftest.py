@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Fixtures shared by all tests.
+"""
+
+import pytest
+import services.utils.shared_cache as shared_cache
+
+
+@pytest.fixture(autouse=True)
+def shared_cache_dir(tmp_path, monkeypatch):
+    # Shared copies of the transcripts a test reads stay in its own directory instead of /dev/shm
+    cache_dir = tmp_path / "shared_cache"
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(shared_cache, "_attached", type(shared_cache._attached)())
+    return cache_dir
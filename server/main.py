@@ -3,16 +3,28 @@
 Simple FastAPI server that transcribes audio from a URL using Deepgram.
 """
 
+import time
+_import_started_at = time.perf_counter()
+
 import os
+import asyncio
 import traceback
 import logging
 from pathlib import Path
-from typing import Optional, List
-from pydantic import BaseModel, HttpUrl
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Union, Literal
+from pydantic import BaseModel, HttpUrl, Field, ValidationError
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Match
 from dotenv import load_dotenv
-from services.models import Section
+from services.models import Section, BatchReport, VideoInsights, DerivedArtifacts, SimilarVideo
+from services.utils.metrics import render_metrics, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from services.utils.tracing import start_span, format_traceparent, get_recent_spans
+from services.startup_service import warm_up, record_phase, startup_report
+from services.utils.admission import priority_class, INTERACTIVE, SECTIONING, TRANSCRIPTION, BATCH
+from services.utils.profiling import Capture, get_trigger as get_profile_trigger, can_access_profiles, save_capture, list_profiles, get_profile
 # Load environment variables from server/.env file
 server_dir = Path(__file__).parent
 env_path = server_dir / '.env'
@@ -27,8 +39,19 @@ if not DEEPGRAM_API_KEY:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Warm up SDKs, clients and caches before serving traffic (disable for faster reloads in development)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        await warm_up()
+    yield
+
+
 # Create FastAPI app
-app = FastAPI(title="Simple Transcription API")
+app = FastAPI(title="Simple Transcription API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -39,6 +62,82 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+
+def _get_route_path(request: Request) -> str:
+    # Label metrics by route template (/videos/batch/{batch_id}) rather than the raw path to bound cardinality
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+async def _save_profile(capture: Capture, request: Request, endpoint: str, status: int) -> Optional[str]:
+    from services.utils.tracing import run_in_thread
+
+    details = {"method": request.method, "path": request.url.path, "route": endpoint, "status": status}
+    try:
+        return await run_in_thread(save_capture, capture, details)
+    except Exception as e:
+        logger.warning(f"Could not save the profile of {request.url.path}: {str(e)}")
+        return None
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Record latency and in-flight requests per endpoint and start the root span of the request's trace.
+
+    Also samples the stacks of requests that ask for it (X-Profile: 1 or ?profile=1), are picked
+    at random (PROFILE_SAMPLE_RATE) or, on the routes that do real work, take longer than
+    PROFILE_SLOW_SECONDS, and saves them for /profiles. Done here rather than in a middleware
+    of its own, which would cost every request.
+    """
+    endpoint = _get_route_path(request)
+    HTTP_REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+    trigger = get_profile_trigger(request.headers, request.query_params, endpoint)
+    capture = Capture(trigger) if trigger and not endpoint.startswith("/profiles") else None
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        with start_span(f"{request.method} {endpoint}", {"http.method": request.method, "http.route": endpoint},
+                        traceparent=request.headers.get("traceparent")) as span:
+            response = await call_next(request)
+            status = response.status_code
+            span.set_attribute("http.status_code", status)
+            response.headers["traceparent"] = format_traceparent(span)
+            if capture and capture.finish():
+                profile_id = await _save_profile(capture, request, endpoint, status)
+                if profile_id:
+                    response.headers["X-Profile-Id"] = profile_id
+        return response
+    finally:
+        if capture and capture.ended_at is None and capture.finish():
+            # Failed requests are profiled too
+            await _save_profile(capture, request, endpoint, status)
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started_at, method=request.method, endpoint=endpoint, status=str(status))
+        HTTP_REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+
+# Priority class of the work each endpoint starts, for admission control of the LLM, STT and downloads.
+# Other endpoints run as batch work, like everything else that is not classified (see admission.py).
+ROUTE_PRIORITIES = {
+    "/videos/answer_question": INTERACTIVE,
+    "/videos/create_sections": SECTIONING,
+    # Deriving the artifacts (POST); the GET only reads them and derives in the background as batch work
+    "/videos/{video_id}/artifacts": SECTIONING,
+    "/videos/live/start": SECTIONING,
+    "/videos/extract_audio": TRANSCRIPTION,
+    "/videos/transcribe": TRANSCRIPTION,
+    "/videos/batch": BATCH,
+}
+
+
+@app.middleware("http")
+async def assign_priority_class(request: Request, call_next):
+    with priority_class(ROUTE_PRIORITIES.get(_get_route_path(request), BATCH)):
+        return await call_next(request)
+
+
 # Models
 class TranscriptionRequest(BaseModel):
     audio_url: HttpUrl
@@ -48,6 +147,9 @@ class TranscriptionResponse(BaseModel):
 
 class YouTubeRequest(BaseModel):
     youtube_url: str
+    # Use the video's own captions instead of downloading audio when they are good enough.
+    # Defaults to the USE_YOUTUBE_CAPTIONS environment variable.
+    use_captions: Optional[bool] = None
 
 class SuccessResponse(BaseModel):
     success: bool
@@ -59,10 +161,91 @@ class AnswerQuestionRequest(BaseModel):
     timestamp: str
 
 
+class ChatMessage(BaseModel):
+    type: Literal["question", "cancel"] = "question"
+    id: Optional[Union[str, int]] = None
+    question: Optional[str] = None
+    position: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    timestamp: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    youtube_urls: List[str] = []
+    playlist_url: Optional[str] = None
+    concurrency: Optional[Dict[str, int]] = None
+    use_captions: bool = False
+
+
+# Keep references to running batches so they are not garbage collected
+_batch_tasks = set()
+
+
 @app.get("/")
 async def root():
     return {"status": "running"}
 
+
+@app.get("/startup")
+async def startup():
+    """
+    How long each startup phase took and whether the warm-up has finished.
+    """
+    return startup_report
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Latency histograms, counters and gauges in the Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/fingerprints/stats")
+async def fingerprint_stats():
+    """
+    How often new audio matched an already transcribed video, and the speech-to-text time saved by reusing transcripts.
+    """
+    from services.fingerprint_service import get_dedup_stats
+    return get_dedup_stats()
+
+
+@app.get("/traces")
+async def traces(trace_id: Optional[str] = None, limit: int = 100):
+    """
+    The most recently finished trace spans, for debugging without an OpenTelemetry collector.
+    """
+    return get_recent_spans(trace_id=trace_id, limit=limit)
+
+@app.get("/profiles")
+async def profiles(request: Request):
+    """
+    The saved request profiles, newest first, with the frames that ran in the most samples.
+    Requires the X-Profile-Token header if PROFILE_TOKEN is set.
+    """
+    from services.utils.tracing import run_in_thread
+
+    if not can_access_profiles(request.headers):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    return await run_in_thread(list_profiles)
+
+
+@app.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def profile(request: Request, profile_id: str):
+    """
+    A saved request profile as folded stacks, ready for flamegraph.pl or speedscope.
+    Requires the X-Profile-Token header if PROFILE_TOKEN is set.
+    """
+    from services.utils.tracing import run_in_thread
+
+    if not can_access_profiles(request.headers):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    saved = await run_in_thread(get_profile, profile_id)
+    if not saved:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(saved["folded"])
+
+
 @app.post("/audios/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(request: TranscriptionRequest):
     """
@@ -116,7 +299,14 @@ async def extract_audio_from_youtube_video(request: YouTubeRequest):
     Download audio from a YouTube video.
     """
     try:
-        from services.youtube_service import download_youtube_audio
+        from services.youtube_service import download_youtube_audio, fetch_youtube_captions, USE_YOUTUBE_CAPTIONS
+        
+        use_captions = USE_YOUTUBE_CAPTIONS if request.use_captions is None else request.use_captions
+        if use_captions and await fetch_youtube_captions(request.youtube_url):
+            logger.info("Transcription created from captions, skipping audio download")
+            return {
+                "success": True,
+            }
         
         logger.info(f"Downloading audio from YouTube URL: {request.youtube_url}")
         
@@ -128,6 +318,9 @@ async def extract_audio_from_youtube_video(request: YouTubeRequest):
             "success": True,
         }
         
+    except HTTPException:
+        # e.g. 429 from admission control
+        raise
     except Exception as e:
         logger.error(f"Error downloading YouTube audio: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error downloading YouTube audio: {str(e)}")
@@ -153,6 +346,8 @@ async def transcribe_youtube(request: YouTubeRequest):
             "success": True,
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error transcribing YouTube video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error transcribing YouTube video: {str(e)}")
@@ -170,8 +365,20 @@ async def create_sections(request: YouTubeRequest):
         logger.info(f"Creating sections for YouTube URL: {request.youtube_url}")
         
         sections = await divide_video_into_sections(request.youtube_url)
+
+        # Use spare LLM capacity to prepare what the user is likely to ask next
+        from services.insights_service import schedule_section_insights
+        from services.utils.youtube_utils import extract_youtube_video_id
+        schedule_section_insights(extract_youtube_video_id(request.youtube_url))
+
+        # Frames at the section boundaries, attached to later questions about the video
+        from services.keyframe_service import schedule_keyframe_extraction
+        schedule_keyframe_extraction(request.youtube_url)
+
         return sections
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating sections: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating sections: {str(e)}")
@@ -208,12 +415,374 @@ async def answer_question_endpoint(request: AnswerQuestionRequest):
         response = await answer_question(youtube_url, question, timestamp)
         return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         logger.error(f"Error answering question: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error answering question: {str(e)}")
 
 
+@app.get("/videos/{video_id}/transcript")
+async def get_transcript(request: Request, video_id: str, start: float = 0, end: Optional[float] = None):
+    """
+    Get the words spoken between start and end (in seconds) of a transcribed video.
+    Only the part of the transcript covering the window is read. Supports If-None-Match.
+    """
+    from services.transcript_service import get_transcript_window
+    from services.utils.storage import get_artifact_version
+    from services.utils.http_utils import not_modified_response, cached_json_response
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+    from services.utils.tracing import run_in_thread
+
+    if not is_valid_youtube_video_id(video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+    if end is not None and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    try:
+        # The window is part of the ETag so that every window is cached separately
+        etag = f"{get_artifact_version(video_id, 'transcription.json')}-{start:g}-{end if end is not None else 'end'}"
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+
+    try:
+        window = await run_in_thread(get_transcript_window, video_id, start, end)
+        return cached_json_response(request, etag, window)
+
+    except Exception as e:
+        logger.error(f"Error getting transcript: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting transcript: {str(e)}")
+
+
+@app.get("/videos/{video_id}/sections", response_model=List[Section])
+async def get_sections(request: Request, video_id: str):
+    """
+    Get the sections created for a video by /videos/create_sections. Supports If-None-Match.
+    """
+    from services.utils.storage import get_artifact_version, load_json_artifact
+    from services.utils.http_utils import not_modified_response, cached_json_response
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+
+    if not is_valid_youtube_video_id(video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+
+    try:
+        etag = get_artifact_version(video_id, "sections.json")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Sections not found")
+
+    return not_modified_response(request, etag) or cached_json_response(
+        request, etag, load_json_artifact(video_id, "sections.json")
+    )
+
+
+def _get_requested_artifacts(video_id: str, names: Optional[str]) -> List[str]:
+    from services.artifact_service import ARTIFACT_TYPES
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+
+    if not is_valid_youtube_video_id(video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+
+    requested = [name.strip() for name in names.split(",") if name.strip()] if names else list(ARTIFACT_TYPES)
+    unknown = [name for name in requested if name not in ARTIFACT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown artifacts: {', '.join(unknown)}")
+    return requested
+
+
+@app.get("/videos/{video_id}/artifacts", response_model=DerivedArtifacts, response_model_exclude_none=True)
+async def get_artifacts(video_id: str, names: Optional[str] = None):
+    """
+    Get the summary, actionables and mindmap of a video (or only the comma-separated names),
+    as far as they are stored. Missing ones are derived from the sections in the background;
+    POST to the same path to derive them and wait for the result.
+    """
+    from services.artifact_service import load_derived_artifact, schedule_derivation
+    from services.utils.storage import has_artifact
+
+    requested = _get_requested_artifacts(video_id, names)
+    if not has_artifact(video_id, "sections.json"):
+        raise HTTPException(status_code=404, detail="Sections not found. Please create the sections first.")
+
+    artifacts = {name: load_derived_artifact(video_id, name) for name in requested}
+    if any(data is None for data in artifacts.values()):
+        schedule_derivation(video_id)
+    if all(data is None for data in artifacts.values()):
+        raise HTTPException(status_code=404, detail="Artifacts not available yet")
+    return DerivedArtifacts(video_id=video_id, **artifacts)
+
+
+@app.post("/videos/{video_id}/artifacts", response_model=DerivedArtifacts, response_model_exclude_none=True)
+async def derive_artifacts(video_id: str, names: Optional[str] = None):
+    """
+    Get the summary, actionables and mindmap of a video (or only the comma-separated names).
+    Artifacts not generated with the sections are derived from them in one LLM call and cached.
+    """
+    from services.artifact_service import get_derived_artifacts
+
+    requested = _get_requested_artifacts(video_id, names)
+    try:
+        artifacts = await get_derived_artifacts(video_id, requested)
+        return DerivedArtifacts(video_id=video_id, **artifacts)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Sections not found. Please create the sections first.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deriving artifacts: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error deriving artifacts: {str(e)}")
+
+
+@app.get("/videos/{video_id}/similar", response_model=List[SimilarVideo])
+async def get_similar_videos(video_id: str, k: int = 10):
+    """
+    Get the k videos whose sections are most similar to those of a video, from the
+    approximate nearest-neighbour index over every sectioned video.
+    """
+    from services.similar_service import find_similar_videos
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+    from services.utils.tracing import run_in_thread
+
+    if not is_valid_youtube_video_id(video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+
+    try:
+        return await run_in_thread(find_similar_videos, video_id, k)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Sections not found. Please create the sections first.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding similar videos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error finding similar videos: {str(e)}")
+
+
+@app.get("/videos/{video_id}/insights", response_model=VideoInsights)
+async def get_section_insights(request: Request, video_id: str):
+    """
+    Get the expanded summaries, takeaways and suggested questions (with answers) precomputed
+    for the sections of a video. Generation continues in the background if it was paused.
+    Supports If-None-Match.
+    """
+    from services.insights_service import schedule_section_insights, get_insights, INSIGHTS_ARTIFACT
+    from services.utils.storage import get_artifact_version, has_artifact
+    from services.utils.http_utils import not_modified_response, cached_json_response
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+
+    if not is_valid_youtube_video_id(video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+
+    if has_artifact(video_id, "sections.json"):
+        schedule_section_insights(video_id)
+
+    try:
+        etag = get_artifact_version(video_id, INSIGHTS_ARTIFACT)
+        # None for insights of the video's earlier sections
+        insights = get_insights(video_id)
+    except FileNotFoundError:
+        insights = None
+    if insights is None:
+        raise HTTPException(status_code=404, detail="Insights not available yet")
+
+    return not_modified_response(request, etag) or cached_json_response(request, etag, insights)
+
+
+@app.post("/videos/batch", response_model=BatchReport)
+async def create_batch(request: BatchRequest):
+    """
+    Start extracting, transcribing and sectioning a list of videos and/or a playlist in the background.
+    Poll /videos/batch/{batch_id} for progress; the final report is also saved under data/batches/.
+    """
+    try:
+        from services.batch_service import process_videos, get_batch_report
+        import uuid
+
+        if not request.youtube_urls and not request.playlist_url:
+            raise HTTPException(status_code=400, detail="Missing required fields: youtube_urls or playlist_url")
+
+        batch_id = uuid.uuid4().hex[:12]
+        logger.info(f"Starting batch {batch_id}")
+
+        task = asyncio.create_task(process_videos(
+            request.youtube_urls,
+            playlist_url=request.playlist_url,
+            concurrency=request.concurrency,
+            batch_id=batch_id,
+            use_captions=request.use_captions
+        ))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+        # Let the batch register itself before reporting on it
+        await asyncio.sleep(0)
+        return get_batch_report(batch_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting batch: {str(e)}")
+
+
+@app.get("/videos/batch/{batch_id}", response_model=BatchReport)
+async def get_batch(batch_id: str):
+    """
+    Get the progress and throughput of a batch started with /videos/batch.
+    """
+    from services.batch_service import get_batch_report
+
+    report = get_batch_report(batch_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return report
+
+@app.post("/videos/live/start")
+async def start_live_transcription(request: YouTubeRequest):
+    """
+    Start transcribing a YouTube live stream or premiere as it plays.
+    Follow the transcript and sections with the /ws/videos/{video_id}/live websocket.
+    """
+    try:
+        from services.live_service import start_live_session
+
+        logger.info(f"Starting live transcription for YouTube URL: {request.youtube_url}")
+        session = start_live_session(request.youtube_url)
+        return {"video_id": session.video_id, "status": session.status}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting live transcription: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting live transcription: {str(e)}")
+
+
+@app.post("/videos/live/stop", response_model=SuccessResponse)
+async def stop_live_transcription(request: YouTubeRequest):
+    """
+    Stop a live transcription. What was transcribed so far is saved like a regular transcription.
+    """
+    from services.live_service import stop_live_session
+    from services.utils.youtube_utils import extract_youtube_video_id
+
+    stopped = await stop_live_session(extract_youtube_video_id(request.youtube_url))
+    if not stopped:
+        raise HTTPException(status_code=404, detail="No live transcription running for this video")
+    return {"success": True}
+
+
+@app.websocket("/ws/videos/{video_id}/live")
+async def follow_live_transcription(websocket: WebSocket, video_id: str):
+    """
+    Push the live transcript to the client: a snapshot first, then "words", "sections"
+    and "status" messages until the stream ends, or an "error" if the client falls too far behind.
+    """
+    from services.live_service import get_live_session
+
+    await websocket.accept()
+    session = get_live_session(video_id)
+    if not session:
+        await websocket.close(code=4404, reason="No live transcription running for this video")
+        return
+
+    queue = session.subscribe()
+    try:
+        while True:
+            message = await queue.get()
+            await websocket.send_json(message)
+            if message["type"] == "error" or message["type"] == "status" and message["status"] in ("completed", "stopped", "failed"):
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.unsubscribe(queue)
+
+
+@app.websocket("/ws/videos/{video_id}/chat")
+async def chat(websocket: WebSocket, video_id: str):
+    """
+    Chat about a video over one connection. The video's transcription and sections are
+    loaded once; every question only carries the current playback position:
+
+        {"type": "question", "id": "1", "question": "...", "position": 93.5}
+        (or "timestamp": "HH:MM:SS" instead of "position")
+        {"type": "cancel"}
+
+    The answer is streamed back as "token" messages followed by "done" (with the full
+    answer). A new question cancels the answer in progress, which ends with "cancelled".
+    """
+    from services.llm_service import load_video_context, convert_timestamp_to_seconds
+    from services.chat_service import ChatSession
+    from services.utils.youtube_utils import is_valid_youtube_video_id
+    from services.utils.tracing import run_in_thread
+    from services.utils.metrics import CHAT_CONNECTIONS
+
+    await websocket.accept()
+    if not is_valid_youtube_video_id(video_id):
+        await websocket.close(code=4400, reason="Invalid video ID")
+        return
+
+    try:
+        context = await run_in_thread(load_video_context, video_id)
+    except HTTPException as e:
+        await websocket.close(code=4404, reason=e.detail)
+        return
+
+    session = ChatSession(context, send=websocket.send_json)
+    CHAT_CONNECTIONS.inc()
+    try:
+        await websocket.send_json({"type": "ready", "video_id": video_id, "sections": len(context.sections)})
+        while True:
+            # Malformed messages are answered with an error and the connection stays open
+            try:
+                message = ChatMessage.model_validate(await websocket.receive_json())
+            except (ValueError, KeyError) as e:
+                detail = "Invalid message: " + (
+                    "; ".join(f"{'.'.join(map(str, error['loc'])) or 'message'}: {error['msg']}" for error in e.errors())
+                    if isinstance(e, ValidationError) else "expected a JSON object"
+                )
+                await websocket.send_json({"type": "error", "id": None, "detail": detail})
+                continue
+
+            if message.type == "cancel":
+                await session.cancel()
+                continue
+
+            position = message.position
+            if position is None and message.timestamp:
+                try:
+                    position = convert_timestamp_to_seconds(message.timestamp)
+                except ValueError:
+                    await websocket.send_json({
+                        "type": "error", "id": message.id, "detail": f"Invalid timestamp: {message.timestamp}"
+                    })
+                    continue
+
+            if not message.question or position is None:
+                await websocket.send_json({
+                    "type": "error", "id": message.id, "detail": "Missing required fields: question, and position or timestamp"
+                })
+                continue
+            # Chat answers go ahead of sectioning, transcription and batch work
+            with priority_class(INTERACTIVE):
+                await session.ask(message.question, position, message.id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.cancel()
+        context.close()
+        CHAT_CONNECTIONS.dec()
+
+
+record_phase("import_app", time.perf_counter() - _import_started_at)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,238 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Tuple, Type
+from pydantic import BaseModel, Field, ValidationError, WrapValidator, create_model
+from services.utils.storage import get_artifact_path, get_artifact_version, has_artifact, load_json_artifact
+from services.utils.json_utils import dump_file
+from services.utils.metrics import timed_stage, DERIVED_ARTIFACTS_TOTAL
+from services.utils.admission import priority_class, BATCH
+from services.models import Mindmap
+logger = logging.getLogger(__name__)
+
+# Generate the derived artifacts in the same LLM call as the sections when a video is sectioned
+# in one call; otherwise (and for videos sectioned before) they are derived from the sections
+DERIVE_IN_SECTIONING_PASS = os.getenv("DERIVE_IN_SECTIONING_PASS", "true").lower() == "true"
+
+
+class ArtifactType:
+    """
+    A video-level artifact derived from a video's sections. Bump the version when the
+    instruction or the type changes, so that artifacts cached with the old one are regenerated.
+    """
+
+    def __init__(self, name: str, annotation: Any, instruction: str, version: int = 1, output_tokens: int = 200):
+        self.name = name
+        self.annotation = annotation
+        self.instruction = instruction
+        self.version = version
+        # Rough size of the artifact in the LLM's response
+        self.output_tokens = output_tokens
+
+    @property
+    def artifact_name(self) -> str:
+        return f"derived_{self.name}.json"
+
+
+ARTIFACT_TYPES: Dict[str, ArtifactType] = {artifact.name: artifact for artifact in [
+    ArtifactType(
+        "summary", str,
+        "A summary of the whole video in one paragraph",
+        output_tokens=200,
+    ),
+    ArtifactType(
+        "actionables", List[str],
+        "Concrete actions a viewer can take based on the video, as short imperative sentences (an empty list if there are none)",
+        output_tokens=200,
+    ),
+    ArtifactType(
+        "mindmap", Mindmap,
+        "A mindmap of the video: its central topic, the main topics in the order they appear, and 2 to 5 subtopics for each",
+        output_tokens=400,
+    ),
+]}
+
+DERIVE_SYSTEM_PROMPT = """You are an expert video content analyzer. You will be given the sections of a video in order, each with its timestamps, title and summary points. Based only on these sections, produce:
+{artifacts}
+
+    Return your response as a valid JSON object with one key for each item above.
+
+    Make sure your JSON is properly formatted and valid."""
+
+# video_id -> (lock, derivations holding or waiting for it); dropped when the last one finishes
+_derive_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+# video_id -> derivation running in the background
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+@asynccontextmanager
+async def _derive_lock(video_id: str):
+    """
+    Derive the artifacts of a video one request at a time, without keeping a lock for every video ever requested.
+    """
+    lock, users = _derive_locks.get(video_id, (None, 0))
+    lock = lock or asyncio.Lock()
+    _derive_locks[video_id] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _derive_locks[video_id]
+        if users == 1:
+            del _derive_locks[video_id]
+        else:
+            _derive_locks[video_id] = (lock, users - 1)
+
+
+def describe_artifacts(names: Sequence[str]) -> str:
+    return "\n".join(f'- "{name}": {ARTIFACT_TYPES[name].instruction}' for name in names)
+
+
+def _none_if_invalid(value: Any, handler) -> Any:
+    try:
+        return handler(value)
+    except ValidationError:
+        return None
+
+
+def get_response_model(names: Sequence[str], base: Type[BaseModel] = BaseModel, optional: bool = False) -> Type[BaseModel]:
+    """
+    Build the structured output of an LLM call that produces the given artifacts (on top of base).
+    All missing artifacts are requested in one call, so a new artifact type adds fields to the
+    response rather than another pass over the video.
+
+    Args:
+        optional: Accept a response without some of the artifacts (missing or malformed ones are
+            None), so that they can't fail the call they are generated in along with base
+    """
+    fields = {}
+    for name in names:
+        artifact_type = ARTIFACT_TYPES[name]
+        if optional:
+            annotation = Annotated[Optional[artifact_type.annotation], WrapValidator(_none_if_invalid)]
+            fields[name] = (annotation, Field(None, description=artifact_type.instruction))
+        else:
+            fields[name] = (artifact_type.annotation, Field(..., description=artifact_type.instruction))
+    return create_model(f"{base.__name__}With{''.join(name.title() for name in names)}", __base__=base, **fields)
+
+
+def estimate_output_tokens(names: Sequence[str]) -> int:
+    return sum(ARTIFACT_TYPES[name].output_tokens for name in names)
+
+
+def load_derived_artifact(video_id: str, name: str) -> Optional[Any]:
+    """
+    Get a cached artifact, if it was derived from the current sections with the current version of its type.
+    """
+    artifact_type = ARTIFACT_TYPES[name]
+    if not has_artifact(video_id, artifact_type.artifact_name) or not has_artifact(video_id, "sections.json"):
+        return None
+    cached = load_json_artifact(video_id, artifact_type.artifact_name)
+    if cached["version"] != artifact_type.version or cached["sections_version"] != get_artifact_version(video_id, "sections.json"):
+        return None
+    return cached["data"]
+
+
+def save_derived_artifacts(video_id: str, artifacts: Dict[str, Any], source: str, sections_version: str):
+    """
+    Cache artifacts with the version of their type and of the sections they were derived from.
+
+    Args:
+        source: "sectioning" if generated with the sections, "sections" if derived from them afterwards
+    """
+    for name, data in artifacts.items():
+        artifact_type = ARTIFACT_TYPES[name]
+        dump_file({
+            "artifact": name,
+            "version": artifact_type.version,
+            "sections_version": sections_version,
+            "source": source,
+            "data": data,
+        }, get_artifact_path(video_id, artifact_type.artifact_name))
+        DERIVED_ARTIFACTS_TOTAL.inc(artifact=name, source=source)
+
+
+def _format_sections(sections: List[Dict[str, Any]]) -> str:
+    return "\n\n".join(
+        f"[{section['start']} - {section['end']}] {section['title']}\n" + "\n".join(f"- {point}" for point in section['summary'])
+        for section in sections
+    )
+
+
+async def _derive_from_sections(sections: List[Dict[str, Any]], names: List[str]) -> Dict[str, Any]:
+    from services.llm_service import call_llm_with_instructor
+    from services.utils.llm_planner import SMALL_MODEL
+
+    response = await call_llm_with_instructor(
+        messages=[
+            {"role": "system", "content": DERIVE_SYSTEM_PROMPT.format(artifacts=describe_artifacts(names))},
+            {"role": "user", "content": f"Here are the sections of the video:\n\n{_format_sections(sections)}"},
+        ],
+        # The sections are a small fraction of the transcript
+        model=SMALL_MODEL,
+        model_provider="google",
+        params={"temperature": 0.2, "max_tokens": 2 * estimate_output_tokens(names) + 512},
+        response_model=get_response_model(names)
+    )
+    return response.model_dump()
+
+
+@timed_stage("derive_artifacts")
+async def get_derived_artifacts(video_id: str, names: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Get the derived artifacts of a video, generating the missing or outdated ones in one LLM
+    call from the section titles and summaries (without reading the transcript).
+
+    Args:
+        video_id: The YouTube video ID
+        names: The artifacts to get (default: all of ARTIFACT_TYPES)
+
+    Raises:
+        FileNotFoundError: If the video has no sections
+    """
+    names = list(names or ARTIFACT_TYPES)
+    async with _derive_lock(video_id):
+        artifacts = {name: load_derived_artifact(video_id, name) for name in names}
+        missing = [name for name, data in artifacts.items() if data is None]
+        if missing:
+            sections_version = get_artifact_version(video_id, "sections.json")
+            derived = await _derive_from_sections(load_json_artifact(video_id, "sections.json"), missing)
+            save_derived_artifacts(video_id, derived, "sections", sections_version)
+            artifacts.update(derived)
+            logger.info(f"Derived {', '.join(missing)} for {video_id} from its sections")
+        else:
+            for name in names:
+                DERIVED_ARTIFACTS_TOTAL.inc(artifact=name, source="cache")
+    return artifacts
+
+
+def schedule_derivation(video_id: str) -> Optional[asyncio.Task]:
+    """
+    Start deriving the missing or outdated artifacts of a video in the background, in the batch
+    priority class. Does nothing if the video has no sections or its artifacts are up to date.
+
+    Returns:
+        The background task, or None if nothing needs to run
+    """
+    task = _tasks.get(video_id)
+    if task and not task.done():
+        return task
+    if not has_artifact(video_id, "sections.json"):
+        return None
+    if all(load_derived_artifact(video_id, name) is not None for name in ARTIFACT_TYPES):
+        return None
+
+    async def run():
+        try:
+            await get_derived_artifacts(video_id)
+        except Exception as e:
+            # Retried the next time the artifacts are requested
+            logger.warning(f"Deriving the artifacts of {video_id} failed: {str(e)}")
+        finally:
+            _tasks.pop(video_id, None)
+
+    with priority_class(BATCH):
+        task = asyncio.create_task(run())
+    _tasks[video_id] = task
+    return task
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import subprocess
+from typing import Dict, List, Optional
+from services.utils.youtube_utils import extract_youtube_video_id
+from services.utils.storage import DATA_DIR, has_artifact, find_audio_file
+from services.utils.admission import priority_class, BATCH
+from services.models import BatchReport, BatchFailure
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = DATA_DIR / "batches"
+
+# Maximum number of videos in flight per pipeline stage. Each stage is bound by a
+# different quota (YouTube bandwidth, Deepgram concurrency, Gemini requests per minute)
+# so they are sized independently.
+DEFAULT_CONCURRENCY = {
+    "extract_audio": int(os.getenv("BATCH_EXTRACT_CONCURRENCY", 4)),
+    "transcribe": int(os.getenv("BATCH_TRANSCRIBE_CONCURRENCY", 8)),
+    "create_sections": int(os.getenv("BATCH_SECTIONS_CONCURRENCY", 4)),
+}
+
+# Reports of batches started by this process, keyed by batch ID
+_batches: Dict[str, BatchReport] = {}
+
+
+def _expand_playlist(playlist_url: str) -> List[str]:
+    """
+    Internal function to list the videos of a playlist using yt-dlp without downloading anything.
+    This runs in a separate thread.
+    """
+    cmd = [
+        "yt-dlp",
+        "--flat-playlist",
+        "--print", "id",
+        playlist_url
+    ]
+
+    try:
+        result = subprocess.run(cmd, text=True, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"yt-dlp error: {e.stderr}")
+        raise ValueError(f"Failed to list playlist videos: {str(e)}")
+
+    video_ids = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+    return [f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids]
+
+
+async def expand_playlist(playlist_url: str) -> List[str]:
+    """
+    Get the URLs of all the videos in a YouTube playlist.
+
+    Args:
+        playlist_url: The URL of the YouTube playlist
+
+    Returns:
+        The list of video URLs in playlist order
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _expand_playlist, playlist_url)
+
+
+def _save_report(report: BatchReport):
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    with open(BATCH_DIR / f"{report.batch_id}.json", 'w') as f:
+        f.write(report.model_dump_json())
+
+
+def get_batch_report(batch_id: str) -> Optional[BatchReport]:
+    """
+    Get the report of a batch, whether it is still running in this process or finished earlier.
+    """
+    if batch_id in _batches:
+        return _batches[batch_id]
+
+    report_path = BATCH_DIR / f"{batch_id}.json"
+    if not report_path.exists():
+        return None
+
+    with open(report_path, 'r') as f:
+        return BatchReport.model_validate(json.load(f))
+
+
+async def _process_video(
+    youtube_url: str,
+    video_id: str,
+    semaphores: Dict[str, asyncio.Semaphore],
+    report: BatchReport,
+    started_at: float,
+    use_captions: bool
+):
+    from services.youtube_service import download_youtube_audio, fetch_youtube_captions
+    from services.transcription_service import transcribe
+    from services.llm_service import divide_video_into_sections
+
+    if has_artifact(video_id, "sections.json"):
+        report.skipped += 1
+        return
+
+    stage = "extract_audio"
+    try:
+        if not has_artifact(video_id, "transcription.json") and not find_audio_file(video_id):
+            async with semaphores["extract_audio"]:
+                if not (use_captions and await fetch_youtube_captions(youtube_url)):
+                    await download_youtube_audio(youtube_url)
+
+        stage = "transcribe"
+        if not has_artifact(video_id, "transcription.json"):
+            async with semaphores["transcribe"]:
+                await transcribe(youtube_url)
+
+        stage = "create_sections"
+        async with semaphores["create_sections"]:
+            await divide_video_into_sections(youtube_url)
+
+        report.processed += 1
+    except Exception as e:
+        logger.error(f"Batch {report.batch_id}: {stage} failed for {youtube_url}: {str(e)}")
+        report.failed += 1
+        report.failures.append(BatchFailure(
+            youtube_url=youtube_url,
+            video_id=video_id,
+            stage=stage,
+            error=str(e)
+        ))
+    finally:
+        elapsed = time.monotonic() - started_at
+        report.elapsed_seconds = round(elapsed, 2)
+        report.videos_per_hour = round(report.processed * 3600 / elapsed, 2) if elapsed > 0 else 0.0
+
+
+async def process_videos(
+    youtube_urls: List[str],
+    playlist_url: Optional[str] = None,
+    concurrency: Optional[Dict[str, int]] = None,
+    batch_id: Optional[str] = None,
+    use_captions: bool = False
+) -> BatchReport:
+    """
+    Run the extract audio -> transcribe -> create sections pipeline for many videos.
+
+    Each stage has its own bounded pool so that, for example, slow Deepgram uploads
+    don't stop audio downloads for the next videos. Videos whose artifacts already
+    exist are skipped, and the report (including failures) is saved to data/batches/.
+
+    Args:
+        youtube_urls: The URLs of the YouTube videos
+        playlist_url: Optional URL of a playlist whose videos are added to the batch
+        concurrency: Optional per-stage overrides of DEFAULT_CONCURRENCY
+        batch_id: Optional ID of the batch (generated if not given)
+        use_captions: Whether to use existing YouTube captions instead of speech-to-text when possible
+
+    Returns:
+        The final report of the batch
+    """
+    batch_id = batch_id or uuid.uuid4().hex[:12]
+    report = BatchReport(batch_id=batch_id, status="running")
+    _batches[batch_id] = report
+
+    urls = list(youtube_urls)
+    if playlist_url:
+        try:
+            urls.extend(await expand_playlist(playlist_url))
+        except Exception as e:
+            report.failures.append(BatchFailure(youtube_url=playlist_url, stage="resolve", error=str(e)))
+            report.failed += 1
+
+    # Resolve the video IDs up front so the same video is never processed twice in one batch
+    videos = {}
+    for youtube_url in urls:
+        video_id = extract_youtube_video_id(youtube_url)
+        if not video_id:
+            report.failures.append(BatchFailure(
+                youtube_url=youtube_url,
+                stage="resolve",
+                error="Could not extract video ID from URL"
+            ))
+            report.failed += 1
+            continue
+        videos.setdefault(video_id, youtube_url)
+
+    # Inputs that could not be resolved are counted as failed videos, so that total = processed + skipped + failed
+    report.total = len(videos) + len(report.failures)
+    logger.info(f"Starting batch {batch_id} with {report.total} videos")
+
+    limits = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+    semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in limits.items()}
+
+    started_at = time.monotonic()
+    # Batch work yields the shared LLM, STT and download capacity to every other request
+    with priority_class(BATCH):
+        await asyncio.gather(*[
+            _process_video(youtube_url, video_id, semaphores, report, started_at, use_captions)
+            for video_id, youtube_url in videos.items()
+        ])
+
+    report.status = "completed"
+    _save_report(report)
+
+    logger.info(
+        f"Batch {batch_id} completed: {report.processed} processed, {report.skipped} skipped, "
+        f"{report.failed} failed in {report.elapsed_seconds}s ({report.videos_per_hour} videos/hour)"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract, transcribe and section many YouTube videos")
+    parser.add_argument("--urls", type=str, nargs="*", default=[], help="YouTube video URLs")
+    parser.add_argument("--file", type=str, help="A file with one YouTube video URL per line")
+    parser.add_argument("--playlist", type=str, help="A YouTube playlist URL")
+    parser.add_argument("--extract-concurrency", type=int, default=DEFAULT_CONCURRENCY["extract_audio"])
+    parser.add_argument("--transcribe-concurrency", type=int, default=DEFAULT_CONCURRENCY["transcribe"])
+    parser.add_argument("--sections-concurrency", type=int, default=DEFAULT_CONCURRENCY["create_sections"])
+    parser.add_argument("--use-captions", action="store_true", help="Use YouTube captions instead of Deepgram when they are good enough")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, 'r') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+    report = asyncio.run(process_videos(
+        urls,
+        playlist_url=args.playlist,
+        concurrency={
+            "extract_audio": args.extract_concurrency,
+            "transcribe": args.transcribe_concurrency,
+            "create_sections": args.sections_concurrency,
+        },
+        use_captions=args.use_captions
+    ))
+    print(report.model_dump_json(indent=4))
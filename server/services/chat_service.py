@@ -0,0 +1,91 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable, Awaitable
+from services.utils.metrics import CHAT_TURNS_TOTAL, CHAT_FIRST_TOKEN_SECONDS
+from services.utils.tracing import start_span
+logger = logging.getLogger(__name__)
+
+# Earlier turns sent to the LLM with every question
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 6))
+
+# Takes the video context, question, position (seconds) and history and yields the answer's text
+Answerer = Callable[[Any, str, float, List[Dict[str, str]]], AsyncIterator[str]]
+Sender = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ChatSession:
+    """
+    A conversation about one video over a single connection. The video's context is
+    resolved once when the connection opens; every question then only needs the
+    current playback position.
+
+    Answers are streamed as "token" messages followed by "done". Asking a new question
+    while an answer is being streamed cancels that answer ("cancelled").
+    """
+
+    def __init__(self, context: Any, send: Sender, answerer: Optional[Answerer] = None):
+        self.context = context
+        self.send = send
+        if answerer is None:
+            from services.llm_service import stream_answer
+            answerer = stream_answer
+        self.answerer = answerer
+        self.history: List[Dict[str, str]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def ask(self, question: str, timestamp_seconds: float, question_id: Optional[str] = None):
+        """
+        Start answering a question, cancelling the answer in progress if there is one.
+        Returns once the answer has started; it is streamed in the background.
+        """
+        await self.cancel()
+        self._task = asyncio.create_task(self._answer(question, timestamp_seconds, question_id))
+
+    async def cancel(self):
+        """
+        Cancel the answer in progress, if any, and wait until its "cancelled" message has been sent.
+        """
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def wait(self):
+        if self._task:
+            await asyncio.shield(self._task)
+
+    async def _answer(self, question: str, timestamp_seconds: float, question_id: Optional[str]):
+        started_at = time.perf_counter()
+        chunks = []
+        try:
+            with start_span("chat_answer", {"video_id": self.context.video_id}):
+                async for text in self.answerer(self.context, question, timestamp_seconds, self.history[-CHAT_HISTORY_TURNS:]):
+                    if not chunks:
+                        CHAT_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started_at)
+                    chunks.append(text)
+                    await self.send({"type": "token", "id": question_id, "text": text})
+        except asyncio.CancelledError:
+            CHAT_TURNS_TOTAL.inc(status="cancelled")
+            # The connection may already be closed if the answer was cancelled because the client left
+            with suppress(Exception):
+                await self.send({"type": "cancelled", "id": question_id})
+            raise
+        except Exception as e:
+            logger.error(f"Error answering chat question for {self.context.video_id}: {str(e)}")
+            CHAT_TURNS_TOTAL.inc(status="failed")
+            message = {"type": "error", "id": question_id, "detail": getattr(e, "detail", None) or str(e)}
+            if getattr(e, "retry_after", None):
+                message["retry_after"] = e.retry_after
+            await self.send(message)
+            return
+
+        answer = "".join(chunks)
+        self.history.append({"question": question, "answer": answer})
+        CHAT_TURNS_TOTAL.inc(status="completed")
+        await self.send({"type": "done", "id": question_id, "answer": answer})
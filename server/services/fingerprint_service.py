@@ -0,0 +1,317 @@
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the stats are only safe within one worker
+    fcntl = None
+
+from services.utils.storage import DATA_DIR, get_artifact_path, has_artifact
+from services.utils.json_utils import loads, load_file, dump_file
+from services.utils.metrics import timed_stage, FINGERPRINT_LOOKUPS_TOTAL, STT_SECONDS_SAVED_TOTAL
+logger = logging.getLogger(__name__)
+
+SOURCE_FINGERPRINT_MATCH = "fingerprint_match"
+FINGERPRINT_ARTIFACT = "fingerprint.json"
+STATS_FILE = "fingerprint_stats.json"
+
+# Reuse transcripts of already processed videos whose audio matches (requires Chromaprint's fpcalc)
+USE_AUDIO_FINGERPRINTS = os.getenv("USE_AUDIO_FINGERPRINTS", "true").lower() == "true"
+FPCALC_PATH = os.getenv("FPCALC_PATH", "fpcalc")
+
+# Chromaprint emits one 32-bit value per 4096-sample frame with 2/3 overlap at 11025 Hz
+ITEM_SECONDS = 4096 / 3 / 11025
+# Only values whose low bits are zero are indexed. The choice depends on the value and not
+# on its position, so a clip and its original keep the same subset.
+INDEX_SAMPLE_MASK = 0x3
+# Values shared by this many positions (e.g. silence) say nothing about where a match is
+MAX_POSTINGS_PER_VALUE = 2000
+
+# Share of differing bits over the overlap below which audio counts as the same recording
+EXACT_BIT_ERROR_RATE = 0.02
+NEAR_BIT_ERROR_RATE = 0.15
+# Share of the new audio that must be covered by the matched video
+MIN_COVERAGE = 0.9
+MIN_VOTES = 8
+
+
+@lru_cache(maxsize=None)
+def is_fpcalc_available() -> bool:
+    if shutil.which(FPCALC_PATH):
+        return True
+    logger.warning(f"{FPCALC_PATH} not found; install Chromaprint to reuse transcripts of matching audio")
+    return False
+
+
+def compute_fingerprint(audio_path: str) -> Optional[List[int]]:
+    """
+    Compute the raw Chromaprint fingerprint of a whole audio file with fpcalc.
+
+    Returns:
+        One 32-bit value per ITEM_SECONDS of audio, or None if fpcalc is not installed
+    """
+    if not is_fpcalc_available():
+        return None
+    result = subprocess.run(
+        [FPCALC_PATH, "-raw", "-json", "-length", "0", audio_path],
+        capture_output=True,
+        check=True,
+    )
+    return [value & 0xFFFFFFFF for value in loads(result.stdout)["fingerprint"]]
+
+
+def bit_error_rate(query: List[int], reference: List[int], offset: int) -> Tuple[float, int]:
+    """
+    Compare query against reference shifted by offset items.
+
+    Returns:
+        The share of differing bits over the overlap and the length of the overlap
+    """
+    start = max(0, -offset)
+    end = min(len(query), len(reference) - offset)
+    if end <= start:
+        return 1.0, 0
+    differing = sum((query[i] ^ reference[i + offset]).bit_count() for i in range(start, end))
+    return differing / (32 * (end - start)), end - start
+
+
+class FingerprintIndex:
+    """
+    An inverted index from fingerprint values to (video, position), to find already processed
+    videos that contain the same audio. Candidates are found by voting on the offset between
+    positions with equal values and then verified by the bit error rate over the overlap, so
+    re-encodes match and clips are aligned with the offset at which they start.
+    """
+
+    def __init__(self):
+        self.video_ids: List[str] = []
+        self._video_id_set: Set[str] = set()
+        self.fingerprints: List[List[int]] = []
+        # value -> postings encoded as (video index << 32) | position
+        self.postings: Dict[int, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def add(self, video_id: str, fingerprint: List[int]):
+        with self._lock:
+            if video_id in self._video_id_set:
+                return
+            video_index = len(self.video_ids)
+            self.video_ids.append(video_id)
+            self._video_id_set.add(video_id)
+            self.fingerprints.append(fingerprint)
+            for position, value in enumerate(fingerprint):
+                if value & INDEX_SAMPLE_MASK == 0:
+                    postings = self.postings[value]
+                    if len(postings) < MAX_POSTINGS_PER_VALUE:
+                        postings.append((video_index << 32) | position)
+
+    def refresh(self, data_dir: Path) -> int:
+        """
+        Add the fingerprints of the transcribed videos that are not indexed yet, including the
+        ones other workers transcribed since this index was built.
+
+        Returns:
+            The number of videos added
+        """
+        added = 0
+        for path in sorted(data_dir.glob(f"*/{FINGERPRINT_ARTIFACT}")):
+            video_id = path.parent.name
+            if video_id not in self._video_id_set and (path.parent / "transcription.json").exists():
+                self.add(video_id, load_file(path)["fingerprint"])
+                added += 1
+        return added
+
+    def match(self, fingerprint: List[int], exclude_video_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find an indexed video whose audio contains the given audio.
+
+        Returns:
+            The match as {"video_id", "offset_seconds", "bit_error_rate", "exact"}, or None
+        """
+        votes: Dict[int, int] = defaultdict(int)
+        for position, value in enumerate(fingerprint):
+            if value & INDEX_SAMPLE_MASK:
+                continue
+            for posting in self.postings.get(value, ()):
+                video_index, reference_position = posting >> 32, posting & 0xFFFFFFFF
+                # Offsets are non-negative for clips; pack (video, offset) into one key
+                votes[(video_index << 32) | ((reference_position - position) & 0xFFFFFFFF)] += 1
+
+        candidates = sorted(votes.items(), key=lambda item: item[1], reverse=True)[:5]
+        best = None
+        for key, count in candidates:
+            if count < MIN_VOTES:
+                break
+            video_index, offset = key >> 32, key & 0xFFFFFFFF
+            if offset >= 1 << 31:
+                offset -= 1 << 32
+            if self.video_ids[video_index] == exclude_video_id:
+                continue
+
+            error_rate, overlap = bit_error_rate(fingerprint, self.fingerprints[video_index], offset)
+            if error_rate > NEAR_BIT_ERROR_RATE or overlap < MIN_COVERAGE * len(fingerprint):
+                continue
+            if not best or error_rate < best["bit_error_rate"]:
+                best = {
+                    "video_id": self.video_ids[video_index],
+                    "offset_seconds": round(offset * ITEM_SECONDS, 3),
+                    "bit_error_rate": round(error_rate, 4),
+                    "exact": error_rate <= EXACT_BIT_ERROR_RATE,
+                }
+        return best
+
+
+_index: Optional[FingerprintIndex] = None
+_index_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+
+def get_fingerprint_index() -> FingerprintIndex:
+    """
+    Load the fingerprints of every processed video into the index on first use.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = FingerprintIndex()
+            index.refresh(DATA_DIR)
+            logger.info(f"Loaded {len(index)} audio fingerprints")
+            _index = index
+        return _index
+
+
+def align_words(words: List[Dict[str, Any]], offset_seconds: float, duration: float) -> List[Dict[str, Any]]:
+    """
+    Take the words spoken in [offset_seconds, offset_seconds + duration] and shift them to start at 0.
+    """
+    end = offset_seconds + duration
+    return [
+        {**word, "start": round(word["start"] - offset_seconds, 3), "end": round(word["end"] - offset_seconds, 3)}
+        for word in words
+        if offset_seconds - 0.5 <= word["start"] < end
+    ]
+
+
+def _load_stats() -> Dict[str, Any]:
+    path = DATA_DIR / STATS_FILE
+    return load_file(path) if path.exists() else {"lookups": 0, "matches": {}, "saved_stt_seconds": 0.0}
+
+
+@contextmanager
+def _locked_stats():
+    """
+    Hold the stats file for a read-modify-write, across the threads of this worker and across workers.
+    """
+    with _stats_lock:
+        if fcntl is None:
+            yield
+            return
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        # The lock is released when the file is closed
+        with open(DATA_DIR / f".{STATS_FILE}.lock", 'wb') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+
+def _update_stats(result: str, saved_seconds: float = 0.0):
+    FINGERPRINT_LOOKUPS_TOTAL.inc(result=result)
+    if saved_seconds:
+        STT_SECONDS_SAVED_TOTAL.inc(saved_seconds)
+
+    # Kept on disk too so the match rate survives restarts
+    with _locked_stats():
+        stats = _load_stats()
+        stats["lookups"] += 1
+        if result != "miss":
+            stats["matches"][result] = stats["matches"].get(result, 0) + 1
+        stats["saved_stt_seconds"] = round(stats["saved_stt_seconds"] + saved_seconds, 3)
+        dump_file(stats, DATA_DIR / STATS_FILE)
+
+
+def get_dedup_stats() -> Dict[str, Any]:
+    """
+    Get the match rate of fingerprint lookups and the speech-to-text time saved by reusing transcripts.
+    """
+    stats = _load_stats()
+    matched = sum(stats["matches"].values())
+    return {
+        **stats,
+        "match_rate": round(matched / stats["lookups"], 4) if stats["lookups"] else 0.0,
+        "saved_stt_minutes": round(stats["saved_stt_seconds"] / 60, 2),
+    }
+
+
+@timed_stage("fingerprint_lookup")
+def transcribe_from_fingerprint(video_id: str, audio_path: str) -> bool:
+    """
+    Fingerprint a video's audio and, if an already transcribed video contains the same audio,
+    create the video's transcription.json from that transcript instead of calling Deepgram.
+    Clips get the words of the matching part of the original, shifted to start at 0.
+
+    Returns:
+        True if the transcription was created from a match, False if the audio has to be
+        transcribed (no match, or the audio could not be fingerprinted)
+    """
+    if not USE_AUDIO_FINGERPRINTS:
+        return False
+
+    try:
+        fingerprint = compute_fingerprint(audio_path)
+    except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as e:
+        # e.g. fpcalc cannot decode the audio; Deepgram may still be able to
+        logger.warning(f"Could not fingerprint the audio of {video_id}, transcribing it instead: {str(e)}")
+        return False
+    if fingerprint is None:
+        return False
+
+    duration = len(fingerprint) * ITEM_SECONDS
+    dump_file(
+        {"item_seconds": ITEM_SECONDS, "duration": round(duration, 3), "fingerprint": fingerprint},
+        get_artifact_path(video_id, FINGERPRINT_ARTIFACT)
+    )
+
+    index = get_fingerprint_index()
+    # Videos transcribed by other workers only show up as files
+    index.refresh(DATA_DIR)
+    match = index.match(fingerprint, exclude_video_id=video_id)
+    if not match:
+        _update_stats("miss")
+        return False
+
+    from services.utils.caption_utils import build_transcription
+    from services.utils.storage import load_json_artifact
+
+    source = load_json_artifact(match["video_id"], "transcription.json")
+    words = align_words(source['results']['channels'][0]['alternatives'][0]['words'], match["offset_seconds"], duration)
+    dump_file(
+        build_transcription(words, source=SOURCE_FINGERPRINT_MATCH, metadata={"duration": round(duration, 3), "match": match}),
+        get_artifact_path(video_id, "transcription.json")
+    )
+
+    kind = "exact" if match["exact"] and match["offset_seconds"] == 0 else ("clip" if match["offset_seconds"] else "near")
+    _update_stats(kind, saved_seconds=duration)
+    logger.info(
+        f"Reused the transcript of {match['video_id']} for {video_id} ({kind} match at {match['offset_seconds']}s, "
+        f"bit error rate {match['bit_error_rate']})"
+    )
+    return True
+
+
+def add_to_fingerprint_index(video_id: str):
+    """
+    Make a newly transcribed video available for matching, if its fingerprint was computed.
+    """
+    if has_artifact(video_id, FINGERPRINT_ARTIFACT):
+        get_fingerprint_index().add(video_id, load_file(get_artifact_path(video_id, FINGERPRINT_ARTIFACT))["fingerprint"])
@@ -0,0 +1,220 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List
+from services.utils.storage import get_artifact_path, get_artifact_version, has_artifact, load_json_artifact
+from services.utils.json_utils import dump_file
+from services.utils.admission import priority_class, SPECULATIVE
+from services.utils.llm_planner import estimate_tokens
+from services.utils.metrics import timed_stage
+from services.utils.tracing import run_in_thread
+from services.models import SectionInsightsLLM, SectionInsights, VideoInsights
+logger = logging.getLogger(__name__)
+
+INSIGHTS_ARTIFACT = "section_insights.json"
+
+# Precompute section insights in the background once a video has sections
+PRECOMPUTE_INSIGHTS = os.getenv("PRECOMPUTE_INSIGHTS", "false").lower() == "true"
+# Budget per video: sections covered (in video order) and estimated tokens spent
+INSIGHTS_MAX_SECTIONS = int(os.getenv("INSIGHTS_MAX_SECTIONS", 20))
+INSIGHTS_TOKEN_BUDGET = int(os.getenv("INSIGHTS_TOKEN_BUDGET", 60000))
+# Failed runs per video before generation is given up until the video is re-sectioned
+INSIGHTS_MAX_ATTEMPTS = int(os.getenv("INSIGHTS_MAX_ATTEMPTS", 3))
+
+# Statuses after which there is nothing left to do for a video
+FINAL_STATUSES = ("completed", "budget_exhausted")
+
+INSIGHTS_SYSTEM_PROMPT = """You are an expert video content analyzer. You will be given one section of a video: its title, its summary points and its transcript. Prepare what a viewer opening this section is most likely to want: a paragraph explaining what the section is about, its key takeaways, and the 3 questions a viewer is most likely to ask about it (such as "What is this part about?") with concise answers based only on the section.
+
+    Return your response as a valid JSON object with the following structure:
+    {
+        "expanded_summary": str,
+        "takeaways": List[str],
+        "suggested_questions": [
+            {
+                "question": str,
+                "answer": str
+            }
+        ]
+    }
+
+    Make sure your JSON is properly formatted and valid."""
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r'[^a-z0-9 ]', '', ' '.join(question.lower().split()))
+
+
+def get_insights(video_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the insights precomputed for a video so far, or None if there are none for its current
+    sections (e.g. the video was re-sectioned since). The returned data is shared and must not be modified.
+    """
+    if not has_artifact(video_id, INSIGHTS_ARTIFACT) or not has_artifact(video_id, "sections.json"):
+        return None
+    insights = load_json_artifact(video_id, INSIGHTS_ARTIFACT)
+    if insights.get('sections_version') != get_artifact_version(video_id, "sections.json"):
+        return None
+    return insights
+
+
+def is_finished(insights: Dict[str, Any]) -> bool:
+    """
+    Whether there is nothing left to generate for a video: the insights are done, out of budget,
+    or failed too many times.
+    """
+    if insights['status'] == "failed":
+        return insights.get('attempts', 0) >= INSIGHTS_MAX_ATTEMPTS
+    return insights['status'] in FINAL_STATUSES
+
+
+def find_suggested_answer(video_id: str, section_index: int, question: str) -> Optional[str]:
+    """
+    Get the precomputed answer if the question is one of the suggested questions of the section.
+    """
+    insights = get_insights(video_id)
+    if not insights:
+        return None
+
+    normalized = normalize_question(question)
+    for section in insights['sections']:
+        if section['index'] != section_index:
+            continue
+        for suggested in section['suggested_questions']:
+            if normalize_question(suggested['question']) == normalized:
+                return suggested['answer']
+    return None
+
+
+def _build_messages(section: Dict[str, Any], section_text: str) -> List[Dict[str, str]]:
+    summary = "\n".join(f"- {point}" for point in section['summary'])
+    return [
+        {"role": "system", "content": INSIGHTS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Section title: {section['title']}\nSummary:\n{summary}\nTranscript: {section_text}"},
+    ]
+
+
+def _save(insights: VideoInsights):
+    dump_file(insights.model_dump(), get_artifact_path(insights.video_id, INSIGHTS_ARTIFACT))
+
+
+@timed_stage("section_insights")
+async def generate_section_insights(video_id: str) -> VideoInsights:
+    """
+    Generate an expanded summary, takeaways and suggested questions with answers for each
+    section of a video, one LLM call per section in video order. Progress is saved after
+    every section, so a run that is cancelled (e.g. preempted by interactive traffic) or
+    fails resumes where it stopped.
+
+    Returns:
+        The insights of the video
+    """
+    from services.llm_service import load_video_context
+
+    context = await run_in_thread(load_video_context, video_id)
+    try:
+        return await _generate_section_insights(context)
+    finally:
+        context.close()
+
+
+async def _generate_section_insights(context) -> VideoInsights:
+    from services.llm_service import call_llm_with_instructor, DEFAULT_MODEL
+
+    video_id = context.video_id
+    sections_version = get_artifact_version(video_id, "sections.json")
+    sections = load_json_artifact(video_id, "sections.json")
+
+    # Insights of earlier sections are discarded
+    existing = get_insights(video_id)
+    insights = VideoInsights(**existing) if existing else VideoInsights(video_id=video_id, status="running", sections_version=sections_version)
+    insights.status = "running"
+    done = {section.index for section in insights.sections}
+
+    try:
+        for index, section in enumerate(sections):
+            if index in done:
+                continue
+            if index >= INSIGHTS_MAX_SECTIONS or insights.estimated_tokens >= INSIGHTS_TOKEN_BUDGET:
+                insights.status = "budget_exhausted"
+                break
+
+            messages = _build_messages(section, context.get_section_text(index))
+            prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+            try:
+                result = await call_llm_with_instructor(
+                    messages=messages,
+                    model=DEFAULT_MODEL,
+                    model_provider="google",
+                    params={"temperature": 0.3},
+                    response_model=SectionInsightsLLM
+                )
+            except Exception:
+                # The prompt was sent (and billed) even though no insights came back
+                insights.estimated_tokens += prompt_tokens
+                raise
+
+            insights.estimated_tokens += prompt_tokens + estimate_tokens(result.model_dump_json())
+            insights.sections.append(SectionInsights(
+                index=index, title=section['title'], start=section['start'], end=section['end'], **result.model_dump()
+            ))
+            insights.sections.sort(key=lambda s: s.index)
+            _save(insights)
+        else:
+            insights.status = "completed"
+    except asyncio.CancelledError:
+        insights.status = "paused"
+        _save(insights)
+        logger.info(f"Section insights for {video_id} paused after {len(insights.sections)} sections")
+        raise
+    except Exception as e:
+        insights.attempts += 1
+        logger.error(f"Error generating section insights for {video_id} (attempt {insights.attempts} of {INSIGHTS_MAX_ATTEMPTS}): {str(e)}")
+        insights.status = "failed"
+        _save(insights)
+        raise
+
+    _save(insights)
+    logger.info(f"Section insights for {video_id} {insights.status}: {len(insights.sections)} sections, ~{insights.estimated_tokens} tokens")
+    return insights
+
+
+def schedule_section_insights(video_id: str) -> Optional[asyncio.Task]:
+    """
+    Start (or resume) generating the insights of a video in the background, in the speculative
+    priority class: the LLM calls only use spare capacity and are cancelled when interactive
+    requests need it. Does nothing if precomputation is disabled or the insights are done, out
+    of budget or failed INSIGHTS_MAX_ATTEMPTS times.
+
+    Returns:
+        The background task, or None if nothing needs to run
+    """
+    if not PRECOMPUTE_INSIGHTS:
+        return None
+
+    task = _tasks.get(video_id)
+    if task and not task.done():
+        return task
+
+    insights = get_insights(video_id)
+    if insights and is_finished(insights):
+        return None
+
+    async def run():
+        try:
+            await generate_section_insights(video_id)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Already logged; retried the next time the insights are requested, up to INSIGHTS_MAX_ATTEMPTS
+            pass
+        finally:
+            _tasks.pop(video_id, None)
+
+    with priority_class(SPECULATIVE):
+        task = asyncio.create_task(run())
+    _tasks[video_id] = task
+    return task
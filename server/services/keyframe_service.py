@@ -0,0 +1,343 @@
+import os
+import re
+import shutil
+import asyncio
+import logging
+import tempfile
+import subprocess
+from bisect import bisect_left
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from services.utils.youtube_utils import extract_youtube_video_id
+from services.utils.storage import get_artifact_path, get_artifact_version, get_video_dir, has_artifact, load_json_artifact
+from services.utils.json_utils import dump_file
+from services.utils.metrics import timed_stage, BYTES_TOTAL, KEYFRAMES_TOTAL
+from services.utils.tracing import run_in_thread
+from services.utils.admission import admit, get_executor, priority_class, BATCH
+logger = logging.getLogger(__name__)
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+KEYFRAMES_ARTIFACT = "keyframes.json"
+KEYFRAMES_DIR = "keyframes"
+
+# Extract keyframes in the background once a video has sections (needs ffmpeg)
+EXTRACT_KEYFRAMES = os.getenv("EXTRACT_KEYFRAMES", "false").lower() == "true"
+# Height of the video stream downloaded for the keyframes and width of the stored JPEGs
+KEYFRAME_VIDEO_HEIGHT = int(os.getenv("KEYFRAME_VIDEO_HEIGHT", 360))
+KEYFRAME_WIDTH = int(os.getenv("KEYFRAME_WIDTH", 320))
+# Only this much video around each section boundary is decoded
+KEYFRAME_WINDOW_SECONDS = float(os.getenv("KEYFRAME_WINDOW_SECONDS", 10))
+# ffmpeg scene score (0 to 1) above which a frame starts a new scene
+KEYFRAME_SCENE_THRESHOLD = float(os.getenv("KEYFRAME_SCENE_THRESHOLD", 0.3))
+KEYFRAMES_PER_BOUNDARY = int(os.getenv("KEYFRAMES_PER_BOUNDARY", 3))
+# Frames closer than this to the previous kept frame are dropped
+KEYFRAME_MIN_GAP_SECONDS = 1.0
+# ffmpeg's JPEG quality scale: 2 (best) to 31 (smallest)
+KEYFRAME_JPEG_QUALITY = 6
+# Videos decoded at once; the decodes run after the download slot is released, so this bounds their CPU use
+KEYFRAME_DECODE_CONCURRENCY = int(os.getenv("KEYFRAME_DECODE_CONCURRENCY", 2))
+# A stuck download or decode fails the extraction instead of holding a download slot or decode thread forever
+KEYFRAME_DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("KEYFRAME_DOWNLOAD_TIMEOUT_SECONDS", 600))
+KEYFRAME_FFMPEG_TIMEOUT_SECONDS = float(os.getenv("KEYFRAME_FFMPEG_TIMEOUT_SECONDS", 120))
+
+# Attach the nearest keyframes of the section in focus to questions about a video
+ATTACH_KEYFRAMES = os.getenv("ATTACH_KEYFRAMES", "true").lower() == "true"
+KEYFRAMES_PER_ANSWER = int(os.getenv("KEYFRAMES_PER_ANSWER", 2))
+# Gemini bills each image as a fixed number of prompt tokens
+KEYFRAME_PROMPT_TOKENS = 258
+
+_SHOWINFO_PATTERN = re.compile(r'\bpts_time:\s*(-?[\d.]+)')
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+@lru_cache(maxsize=None)
+def is_ffmpeg_available() -> bool:
+    if shutil.which(FFMPEG_PATH):
+        return True
+    logger.warning(f"{FFMPEG_PATH} not found; install ffmpeg to extract keyframes")
+    return False
+
+
+def get_boundaries(sections: List[Dict[str, Any]]) -> List[float]:
+    """
+    The start of every section in seconds, sorted and without duplicates.
+    """
+    from services.llm_service import convert_timestamp_to_seconds
+
+    return sorted({convert_timestamp_to_seconds(section['start']) for section in sections})
+
+
+def get_windows(boundaries: List[float], window_seconds: float = KEYFRAME_WINDOW_SECONDS) -> List[Tuple[float, float, int]]:
+    """
+    The parts of the video to decode: window_seconds on either side of each boundary,
+    with overlapping windows merged so that no part is decoded twice.
+
+    Returns:
+        (start, end, number of boundaries in the window) in video order
+    """
+    windows: List[Tuple[float, float, int]] = []
+    for boundary in boundaries:
+        start, end = max(0.0, boundary - window_seconds), boundary + window_seconds
+        if windows and start <= windows[-1][1]:
+            previous_start, _, count = windows[-1]
+            windows[-1] = (previous_start, end, count + 1)
+        else:
+            windows.append((start, end, 1))
+    return windows
+
+
+def parse_showinfo(stderr: str) -> List[float]:
+    """
+    The timestamps (relative to the seek position) of the frames written by ffmpeg's showinfo filter.
+    """
+    return [float(match) for match in _SHOWINFO_PATTERN.findall(stderr)]
+
+
+@timed_stage("download_lowres_video")
+def _download_lowres_video(youtube_url: str, video_id: str) -> Path:
+    """
+    Download a low-resolution, video-only stream of a YouTube video with yt-dlp.
+    """
+    output_path = get_video_dir(video_id)
+    existing = [f for f in output_path.glob("video_lowres.*") if f.suffix != ".part"]
+    if existing:
+        return existing[0]
+
+    cmd = [
+        "yt-dlp",
+        # The smallest video-only stream that is still legible, else the smallest stream
+        "-f", f"worstvideo[height>={KEYFRAME_VIDEO_HEIGHT}]/bestvideo[height<={KEYFRAME_VIDEO_HEIGHT}]/worst",
+        "-o", str(output_path / "video_lowres.%(ext)s"),
+        youtube_url
+    ]
+    try:
+        subprocess.run(cmd, text=True, check=True, capture_output=True, timeout=KEYFRAME_DOWNLOAD_TIMEOUT_SECONDS)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Failed to download YouTube video: {e.stderr}")
+    except subprocess.TimeoutExpired:
+        raise ValueError(f"Downloading the video of {video_id} took longer than {KEYFRAME_DOWNLOAD_TIMEOUT_SECONDS:.0f}s")
+
+    downloaded = [f for f in output_path.glob("video_lowres.*") if f.suffix != ".part"]
+    if not downloaded:
+        raise FileNotFoundError(f"Downloaded video not found for video ID: {video_id}")
+    BYTES_TOTAL.inc(downloaded[0].stat().st_size, kind="video_downloaded")
+    return downloaded[0]
+
+
+def _extract_window(video_path: Path, start: float, end: float, max_frames: int) -> List[Tuple[float, bytes]]:
+    """
+    Decode one window of the video, seeking to its start, and keep its first frame and the
+    frames that start a new scene.
+
+    Returns:
+        (timestamp in seconds, JPEG) of the kept frames
+    """
+    with tempfile.TemporaryDirectory(prefix="vidly-keyframes-") as output_dir:
+        cmd = [
+            FFMPEG_PATH, "-hide_banner", "-nostats",
+            # Input seeking jumps to the nearest keyframe instead of decoding from the start
+            "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+            "-i", str(video_path),
+            "-an",
+            "-vf", f"select=eq(n\\,0)+gt(scene\\,{KEYFRAME_SCENE_THRESHOLD}),scale={KEYFRAME_WIDTH}:-2,showinfo",
+            "-vsync", "vfr",
+            "-frames:v", str(max_frames),
+            "-q:v", str(KEYFRAME_JPEG_QUALITY),
+            os.path.join(output_dir, "%04d.jpg"),
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=KEYFRAME_FFMPEG_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            raise ValueError(f"Decoding {start:.0f}s-{end:.0f}s of {video_path.name} took longer than {KEYFRAME_FFMPEG_TIMEOUT_SECONDS:.0f}s")
+        timestamps = parse_showinfo(result.stderr)
+        files = sorted(Path(output_dir).glob("*.jpg"))
+        return [(start + timestamp, path.read_bytes()) for timestamp, path in zip(timestamps, files)]
+
+
+def _get_windows_of_video(video_id: str) -> Tuple[str, List[Tuple[float, float, int]]]:
+    """
+    Returns:
+        The version of the video's sections and the windows around their boundaries
+
+    Raises:
+        FileNotFoundError: If the video has no sections
+    """
+    sections_version = get_artifact_version(video_id, "sections.json")
+    return sections_version, get_windows(get_boundaries(load_json_artifact(video_id, "sections.json")))
+
+
+def _decode_keyframes(
+    video_id: str,
+    video_path: Path,
+    sections_version: str,
+    windows: List[Tuple[float, float, int]]
+) -> Dict[str, Any]:
+    """
+    Decode the windows of a downloaded video, store the frames that start a new scene and
+    write the index. The video is deleted afterwards.
+    """
+    try:
+        frames: List[Tuple[float, bytes]] = []
+        for start, end, boundaries in windows:
+            frames.extend(_extract_window(video_path, start, end, boundaries * KEYFRAMES_PER_BOUNDARY))
+    finally:
+        video_path.unlink(missing_ok=True)
+
+    frames_dir = get_video_dir(video_id) / KEYFRAMES_DIR
+    shutil.rmtree(frames_dir, ignore_errors=True)
+    frames_dir.mkdir(parents=True)
+
+    timestamps, files = [], []
+    for timestamp, jpeg in sorted(frames, key=lambda frame: frame[0]):
+        if timestamps and timestamp - timestamps[-1] < KEYFRAME_MIN_GAP_SECONDS:
+            continue
+        name = f"{round(timestamp * 1000):09d}.jpg"
+        (frames_dir / name).write_bytes(jpeg)
+        timestamps.append(round(timestamp, 3))
+        files.append(name)
+
+    # Parallel lists, so lookups can bisect the timestamps as loaded
+    index = {"sections_version": sections_version, "timestamps": timestamps, "files": files}
+    dump_file(index, get_artifact_path(video_id, KEYFRAMES_ARTIFACT))
+    KEYFRAMES_TOTAL.inc(len(timestamps), event="extracted")
+    logger.info(f"Extracted {len(timestamps)} keyframes for {video_id} from {len(windows)} windows")
+    return index
+
+
+@timed_stage("extract_keyframes")
+def extract_keyframes(youtube_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the keyframe index of a video: download a low-resolution stream once, decode only
+    the windows around the section boundaries, and store the frames that start a new scene
+    as small JPEGs. The video is deleted afterwards.
+
+    Returns:
+        The index, or None if ffmpeg is not installed
+
+    Raises:
+        FileNotFoundError: If the video has no sections
+    """
+    video_id = extract_youtube_video_id(youtube_url)
+    if not is_ffmpeg_available():
+        return None
+
+    sections_version, windows = _get_windows_of_video(video_id)
+    video_path = _download_lowres_video(youtube_url, video_id)
+    return _decode_keyframes(video_id, video_path, sections_version, windows)
+
+
+@lru_cache(maxsize=None)
+def _get_decode_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=KEYFRAME_DECODE_CONCURRENCY, thread_name_prefix="vidly-keyframes")
+
+
+@timed_stage("extract_keyframes")
+async def create_keyframes(youtube_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the keyframe index of a video like extract_keyframes. The download runs in the
+    download thread pool and only it holds a download slot; the decodes run afterwards in a
+    pool of their own, so they don't keep other downloads waiting.
+    """
+    video_id = extract_youtube_video_id(youtube_url)
+    if not is_ffmpeg_available():
+        return None
+
+    sections_version, windows = await run_in_thread(_get_windows_of_video, video_id)
+    async with admit("download"):
+        video_path = await run_in_thread(_download_lowres_video, youtube_url, video_id, executor=get_executor("download"))
+    return await run_in_thread(
+        _decode_keyframes, video_id, video_path, sections_version, windows, executor=_get_decode_executor()
+    )
+
+
+def is_keyframe_index_current(video_id: str) -> bool:
+    if not has_artifact(video_id, KEYFRAMES_ARTIFACT) or not has_artifact(video_id, "sections.json"):
+        return False
+    index = load_json_artifact(video_id, KEYFRAMES_ARTIFACT)
+    return index["sections_version"] == get_artifact_version(video_id, "sections.json")
+
+
+def schedule_keyframe_extraction(youtube_url: str) -> Optional[asyncio.Task]:
+    """
+    Start extracting the keyframes of a video in the background, in the batch priority class.
+    Does nothing if extraction is disabled, ffmpeg is missing or the index is up to date.
+
+    Returns:
+        The background task, or None if nothing needs to run
+    """
+    if not EXTRACT_KEYFRAMES or not is_ffmpeg_available():
+        return None
+
+    video_id = extract_youtube_video_id(youtube_url)
+    task = _tasks.get(video_id)
+    if task and not task.done():
+        return task
+    if is_keyframe_index_current(video_id):
+        return None
+
+    async def run():
+        try:
+            await create_keyframes(youtube_url)
+        except Exception as e:
+            # Retried the next time the video is sectioned
+            logger.warning(f"Keyframe extraction failed for {video_id}: {str(e)}")
+        finally:
+            _tasks.pop(video_id, None)
+
+    with priority_class(BATCH):
+        task = asyncio.create_task(run())
+    _tasks[video_id] = task
+    return task
+
+
+def get_nearest_keyframes(
+    video_id: str,
+    timestamp_seconds: float,
+    limit: int = KEYFRAMES_PER_ANSWER,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> List[Tuple[float, Path]]:
+    """
+    Find the precomputed keyframes closest to a position of the video by binary search.
+
+    Args:
+        video_id: The YouTube video ID
+        timestamp_seconds: The position in the video
+        limit: The most frames to return
+        start, end: Optional bounds (in seconds) of the frames to consider, e.g. the section in focus
+
+    Returns:
+        (timestamp, JPEG path) in video order, or an empty list if the video has no keyframes
+    """
+    if not has_artifact(video_id, KEYFRAMES_ARTIFACT):
+        return []
+    index = load_json_artifact(video_id, KEYFRAMES_ARTIFACT)
+    timestamps = index["timestamps"]
+    lo = bisect_left(timestamps, start) if start is not None else 0
+    hi = bisect_left(timestamps, end + 1e-9) if end is not None else len(timestamps)
+
+    # Expand from the insertion point towards whichever neighbour is closer
+    right = min(max(bisect_left(timestamps, timestamp_seconds), lo), hi)
+    left = right - 1
+    nearest = []
+    while len(nearest) < limit and (left >= lo or right < hi):
+        if right >= hi or (left >= lo and timestamp_seconds - timestamps[left] <= timestamps[right] - timestamp_seconds):
+            nearest.append(left)
+            left -= 1
+        else:
+            nearest.append(right)
+            right += 1
+
+    frames_dir = get_video_dir(video_id) / KEYFRAMES_DIR
+    return [(timestamps[i], frames_dir / index["files"][i]) for i in sorted(nearest)]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract the keyframes of a video that already has sections")
+    parser.add_argument("--url", type=str, default='https://youtu.be/5C_HPTJg5ek')
+    args = parser.parse_args()
+    asyncio.run(create_keyframes(args.url))
@@ -0,0 +1,325 @@
+import os
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Set, AsyncIterator, Callable, Awaitable
+from services.utils.youtube_utils import extract_youtube_video_id
+from services.utils.storage import get_video_dir, get_artifact_path
+from services.utils.caption_utils import build_transcription
+from services.utils.json_utils import dump_file
+from services.utils.metrics import timed_stage, LIVE_SESSIONS, LIVE_SUBSCRIBERS
+from services.utils.admission import admit
+logger = logging.getLogger(__name__)
+
+SOURCE_DEEPGRAM_LIVE = "deepgram_live"
+AUDIO_CHUNK_SIZE = 8192
+# Seconds of newly finalized speech before the tail of the transcript is re-sectioned
+LIVE_RESECTION_INTERVAL = float(os.getenv("LIVE_RESECTION_INTERVAL", 60))
+# Messages a follower can fall behind by before it is dropped (it gets a new snapshot when it reconnects)
+LIVE_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE_SIZE", 1000))
+
+# Takes the tail words and returns sections (title, summary, start, end) for them. A section may
+# also have "start_seconds", its exact start; the HH:MM:SS start is rounded down to the second.
+Sectioner = Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+_sessions: Dict[str, "LiveSession"] = {}
+
+
+async def stream_youtube_audio(youtube_url: str) -> AsyncIterator[bytes]:
+    """
+    Stream the audio of a YouTube live stream (or any video) from yt-dlp's stdout.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "yt-dlp",
+        "-f", "bestaudio/best",
+        "--quiet",
+        "-o", "-",  # Write the stream to stdout
+        youtube_url,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    try:
+        while True:
+            chunk = await process.stdout.read(AUDIO_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+@timed_stage("live_section_tail")
+async def create_sections_for_words(words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The default sectioner: the same prompt as divide_video_into_sections, on the given words only.
+    """
+    from services.llm_service import get_segments_from_words, create_planned_sections, convert_timestamp_to_seconds
+
+    segments, llm_input = get_segments_from_words(words)
+    if not segments:
+        return []
+    sections, _ = await create_planned_sections(segments, llm_input)
+
+    # Sections start at a segment, and segments start at least 10 seconds apart, so exactly
+    # one segment starts within the second a section's start was rounded down to
+    for section in sections:
+        start = convert_timestamp_to_seconds(section['start'])
+        section['start_seconds'] = next((segment['start'] for segment in segments if start <= segment['start'] < start + 1), start)
+    return sections
+
+
+class LiveSession:
+    """
+    Transcribes a live stream with the Deepgram live API, appending finalized words
+    as they arrive and re-sectioning only the tail of the transcript.
+
+    Sections that are followed by a newer section are stable and never re-sent to
+    the LLM; only the words from the start of the last (still growing) section are.
+    """
+
+    def __init__(
+        self,
+        youtube_url: str,
+        audio_source: Optional[AsyncIterator[bytes]] = None,
+        sectioner: Optional[Sectioner] = None,
+        deepgram_client: Any = None,
+        resection_interval: float = LIVE_RESECTION_INTERVAL
+    ):
+        self.youtube_url = youtube_url
+        self.video_id = extract_youtube_video_id(youtube_url)
+        self.audio_source = audio_source
+        self.sectioner = sectioner or create_sections_for_words
+        self.deepgram_client = deepgram_client
+        self.resection_interval = resection_interval
+
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.words: List[Dict[str, Any]] = []
+        self.stable_sections: List[Dict[str, Any]] = []
+        self.tail_sections: List[Dict[str, Any]] = []
+        # Start (in seconds) of the part of the transcript that is still re-sectioned
+        self.tail_start = 0.0
+        self._sectioned_until = 0.0
+        self._sectioning_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def sections(self) -> List[Dict[str, Any]]:
+        return self.stable_sections + self.tail_sections
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": "snapshot",
+            "video_id": self.video_id,
+            "status": self.status,
+            "words": self.words,
+            "sections": self.sections,
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Follow the session. The queue receives a snapshot first, then "words",
+        "sections" and "status" updates.
+        """
+        queue = asyncio.Queue(maxsize=LIVE_SUBSCRIBER_QUEUE_SIZE)
+        queue.put_nowait(self.snapshot())
+        self._subscribers.add(queue)
+        LIVE_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.discard(queue)
+            LIVE_SUBSCRIBERS.dec()
+
+    def _publish(self, message: Dict[str, Any]):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled follower would otherwise hold every update in memory
+                logger.warning(f"Dropping a follower of the live transcription of {self.video_id} that fell behind")
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "error", "error": "Fell too far behind the live transcription, reconnect to catch up"})
+
+    def _set_status(self, status: str):
+        self.status = status
+        self._publish({"type": "status", "status": status, "error": self.error})
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # The re-sectioning of the tail would otherwise keep calling the LLM after the session ended
+        for task in (self._task, self._sectioning_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def wait(self):
+        if self._task:
+            await asyncio.shield(self._task)
+
+    def add_words(self, words: List[Dict[str, Any]]):
+        """
+        Append finalized words and schedule a re-sectioning of the tail once enough new speech has arrived.
+        """
+        if not words:
+            return
+        self.words.extend(words)
+        self._publish({"type": "words", "words": words})
+
+        newest = self.words[-1]['end']
+        sectioning = self._sectioning_task and not self._sectioning_task.done()
+        if newest - self._sectioned_until >= self.resection_interval and not sectioning:
+            self._sectioning_task = asyncio.create_task(self.resection_tail())
+
+    async def resection_tail(self):
+        """
+        Section the words from tail_start onwards. All but the last resulting section
+        become stable; the last one keeps growing and is re-sectioned next time.
+        """
+        tail_words = [word for word in self.words if word['start'] >= self.tail_start]
+        if not tail_words:
+            return
+        sectioned_until = tail_words[-1]['end']
+
+        try:
+            sections = await self.sectioner(tail_words)
+        except Exception as e:
+            # Try again with more words next time
+            logger.error(f"Live sectioning failed for {self.video_id}: {str(e)}")
+            return
+
+        if not sections:
+            return
+
+        from services.llm_service import convert_timestamp_to_seconds
+
+        # The words of the last stable section from the rounded start onwards must not be re-sectioned
+        starts = [section.pop('start_seconds', None) for section in sections]
+        tail_start = starts[-1] if starts[-1] is not None else convert_timestamp_to_seconds(sections[-1]['start'])
+
+        self.stable_sections.extend(sections[:-1])
+        self.tail_sections = sections[-1:]
+        self.tail_start = max(self.tail_start, tail_start)
+        self._sectioned_until = sectioned_until
+        self._publish({"type": "sections", "sections": self.sections})
+
+    def _on_result(self, result: Any):
+        if not getattr(result, "is_final", False):
+            return
+        alternatives = result.channel.alternatives
+        if not alternatives:
+            return
+        self.add_words([
+            {
+                'word': word.word,
+                'start': word.start,
+                'end': word.end,
+                'confidence': word.confidence,
+                'punctuated_word': word.punctuated_word or word.word,
+            }
+            for word in alternatives[0].words or []
+        ])
+
+    async def _run(self):
+        from deepgram import LiveOptions, LiveTranscriptionEvents
+        from services.transcription_service import get_deepgram_client
+
+        client = self.deepgram_client or get_deepgram_client()
+        connection = client.listen.asyncwebsocket.v("1")
+
+        async def on_transcript(_connection, result, **kwargs):
+            self._on_result(result)
+
+        async def on_error(_connection, error, **kwargs):
+            logger.error(f"Deepgram live error for {self.video_id}: {error}")
+
+        connection.on(LiveTranscriptionEvents.Transcript, on_transcript)
+        connection.on(LiveTranscriptionEvents.Error, on_error)
+
+        LIVE_SESSIONS.inc()
+        options = LiveOptions(model="nova-3", language="en", punctuate=True, smart_format=True)
+        audio_source = self.audio_source or stream_youtube_audio(self.youtube_url)
+
+        try:
+            # The session uses a speech-to-text slot for as long as it streams, so the STT
+            # budgets and the interactive reserve account for it like for file transcriptions
+            async with admit("stt"):
+                if not await connection.start(options):
+                    raise ConnectionError("Could not connect to the Deepgram live API")
+                self._set_status("live")
+
+                async for chunk in audio_source:
+                    await connection.send(chunk)
+
+                # Flush the words Deepgram is still holding back before closing
+                await connection.finalize()
+                await connection.finish()
+
+            if self._sectioning_task:
+                await self._sectioning_task
+            await self.resection_tail()
+            self._save()
+            self._set_status("completed")
+        except asyncio.CancelledError:
+            await connection.finish()
+            self._save()
+            self._set_status("stopped")
+            raise
+        except Exception as e:
+            logger.error(f"Live transcription failed for {self.video_id}: {str(e)}")
+            self.error = str(e)
+            await connection.finish()
+            self._set_status("failed")
+        finally:
+            LIVE_SESSIONS.dec()
+            _sessions.pop(self.video_id, None)
+
+    def _save(self):
+        """
+        Save the transcript and sections like the batch pipeline does, so Q&A works on the recording.
+        """
+        if not self.words:
+            return
+        get_video_dir(self.video_id).mkdir(parents=True, exist_ok=True)
+        dump_file(build_transcription(self.words, source=SOURCE_DEEPGRAM_LIVE), get_artifact_path(self.video_id, "transcription.json"))
+        if self.sections:
+            dump_file(self.sections, get_artifact_path(self.video_id, "sections.json"))
+
+
+def start_live_session(youtube_url: str, **kwargs) -> LiveSession:
+    """
+    Start transcribing a YouTube live stream, or return the session already running for it.
+    Keyword arguments are passed to LiveSession.
+    """
+    video_id = extract_youtube_video_id(youtube_url)
+    if not video_id:
+        raise ValueError("Could not extract video ID from URL")
+
+    if video_id in _sessions:
+        return _sessions[video_id]
+
+    session = LiveSession(youtube_url, **kwargs)
+    _sessions[video_id] = session
+    session.start()
+    return session
+
+
+def get_live_session(video_id: str) -> Optional[LiveSession]:
+    return _sessions.get(video_id)
+
+
+async def stop_live_session(video_id: str) -> bool:
+    session = _sessions.get(video_id)
+    if not session:
+        return False
+    await session.stop()
+    return True
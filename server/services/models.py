@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -26,3 +26,81 @@ class Section(BaseModel):
 class AnswerQuestionLLM(BaseModel):
     """A response to a question from the user."""
     response: str = Field(..., description="The response to the question")
+
+
+class BatchFailure(BaseModel):
+    """A video that failed during batch ingestion."""
+    youtube_url: str = Field(..., description="The URL of the YouTube video")
+    video_id: Optional[str] = Field(None, description="The YouTube video ID, if it could be extracted")
+    stage: str = Field(..., description="The pipeline stage that failed (resolve, extract_audio, transcribe or create_sections)")
+    error: str = Field(..., description="The error message")
+
+
+class BatchReport(BaseModel):
+    """Progress and throughput of a batch ingestion run."""
+    batch_id: str = Field(..., description="The ID of the batch")
+    status: str = Field(..., description="Either 'running' or 'completed'")
+    total: int = Field(0, description="The number of unique videos in the batch, including inputs that could not be resolved")
+    processed: int = Field(0, description="The number of videos that went through the pipeline successfully")
+    skipped: int = Field(0, description="The number of videos skipped because their artifacts already existed")
+    failed: int = Field(0, description="The number of videos that failed")
+    elapsed_seconds: float = Field(0.0, description="Wall-clock time spent on the batch so far")
+    videos_per_hour: float = Field(0.0, description="Throughput of processed videos")
+    failures: List[BatchFailure] = Field(default_factory=list, description="Details of every failed video")
+
+
+class SuggestedQuestion(BaseModel):
+    """A question a viewer is likely to ask about a section, with its answer."""
+    question: str = Field(..., description="The question, as a viewer would ask it")
+    answer: str = Field(..., description="The answer to the question based on the section")
+
+
+class SectionInsightsLLM(BaseModel):
+    """Precomputed content for one section of a video."""
+    expanded_summary: str = Field(..., description="A paragraph explaining what the section is about")
+    takeaways: List[str] = Field(..., description="The key takeaways of the section")
+    suggested_questions: List[SuggestedQuestion] = Field(..., description="Questions a viewer is likely to ask about the section, with answers")
+
+
+class SectionInsights(SectionInsightsLLM):
+    """Precomputed content for one section of a video, with the section it belongs to."""
+    index: int = Field(..., description="The index of the section in sections.json")
+    title: str = Field(..., description="The title of the section")
+    start: str = Field(..., description="The start timestamp of the section (format: HH:MM:SS)")
+    end: str = Field(..., description="The end timestamp of the section (format: HH:MM:SS)")
+
+
+class VideoInsights(BaseModel):
+    """Per-section summaries, takeaways and suggested questions precomputed for a video."""
+    video_id: str = Field(..., description="The YouTube video ID")
+    status: str = Field(..., description="One of 'running', 'completed', 'paused', 'budget_exhausted' or 'failed'")
+    sections: List[SectionInsights] = Field(default_factory=list, description="The sections done so far, in video order")
+    estimated_tokens: int = Field(0, description="Estimated tokens spent on this video so far, including failed calls")
+    attempts: int = Field(0, description="Failed runs so far; generation stops after INSIGHTS_MAX_ATTEMPTS")
+    sections_version: Optional[str] = Field(None, description="Version of the sections the insights were generated from")
+
+
+class MindmapBranch(BaseModel):
+    """A main topic of a video's mindmap with its subtopics."""
+    title: str = Field(..., description="The main topic")
+    children: List[str] = Field(..., description="The subtopics of the main topic")
+
+
+class Mindmap(BaseModel):
+    """A mindmap of a video: the central topic, its main topics and their subtopics."""
+    root: str = Field(..., description="The central topic of the video")
+    branches: List[MindmapBranch] = Field(..., description="The main topics, in the order they appear in the video")
+
+
+class DerivedArtifacts(BaseModel):
+    """Artifacts derived from a video's sections, as returned by /videos/{video_id}/artifacts."""
+    video_id: str = Field(..., description="The YouTube video ID")
+    summary: Optional[str] = Field(None, description="A summary of the whole video")
+    actionables: Optional[List[str]] = Field(None, description="Concrete actions a viewer can take based on the video")
+    mindmap: Optional[Mindmap] = Field(None, description="A mindmap of the video's topics")
+
+
+class SimilarVideo(BaseModel):
+    """A video similar to another one, as returned by /videos/{video_id}/similar."""
+    video_id: str = Field(..., description="The YouTube video ID")
+    score: float = Field(..., description="Cosine similarity of the two videos' section embeddings")
@@ -0,0 +1,516 @@
+import os
+import re
+import math
+import zlib
+import heapq
+import random
+import struct
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+from fastapi import HTTPException
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where workers could not share the index files safely
+    fcntl = None
+
+from services.utils import storage
+from services.utils.storage import has_artifact, load_json_artifact
+from services.utils.metrics import timed_stage, SIMILAR_INDEX_OPERATIONS_TOTAL
+logger = logging.getLogger(__name__)
+
+# Add videos to the similar videos index once they have sections
+SIMILAR_INDEX = os.getenv("SIMILAR_INDEX", "true").lower() == "true" and fcntl is not None
+SIMILAR_INDEX_DIR = "similar_index"
+EMBEDDING_DIM = 256
+# Inverted lists searched per query: higher finds more of the true neighbours but scores more vectors
+SIMILAR_NPROBE = int(os.getenv("SIMILAR_NPROBE", 8))
+# Below this many videos every query scores all of them
+SIMILAR_MIN_TRAIN = int(os.getenv("SIMILAR_MIN_TRAIN", 1024))
+# The lists are re-clustered when the catalogue has grown this much since they were built
+RETRAIN_GROWTH = 4
+KMEANS_ITERATIONS = 5
+# Vectors sampled per list to cluster
+KMEANS_SAMPLE_PER_LIST = 32
+
+VIDEO_ID_BYTES = 16
+# Vectors are unit length, stored as int8 scaled by this
+QUANTIZATION_SCALE = 127
+TITLE_WEIGHT = 2
+
+STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out his has how its may new now see two who did get "
+    "him let say she too use this that with from they will have what when your about into more than then them these "
+    "there their which would could should other some such only also been being over just like very most each".split()
+)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 2 and token not in STOPWORDS]
+
+
+def quantize(vector: Sequence[float]) -> array:
+    """
+    Normalise a vector to unit length and store it as int8.
+    """
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array('b', (max(-QUANTIZATION_SCALE, min(QUANTIZATION_SCALE, round(x / norm * QUANTIZATION_SCALE))) for x in vector))
+
+
+def embed_sections(sections: List[Dict[str, Any]], dim: int = EMBEDDING_DIM) -> array:
+    """
+    Embed a video from the titles and summaries of its sections: words and word pairs are
+    hashed into dim signed buckets with sublinear counts (titles count double).
+    """
+    counts: Dict[str, float] = {}
+    for section in sections:
+        for text, weight in [(section['title'], TITLE_WEIGHT), *((point, 1) for point in section['summary'])]:
+            tokens = _tokens(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                counts[feature] = counts.get(feature, 0) + weight
+
+    vector = [0.0] * dim
+    for feature, count in counts.items():
+        # Deterministic across processes, unlike hash()
+        hashed = zlib.crc32(feature.encode())
+        vector[hashed % dim] += (1 + math.log(count)) * (1 if hashed & 0x80000000 else -1)
+    return quantize(vector)
+
+
+# Bits per vector in a packed column: enough for the dot product of two offset int8 vectors
+FIELD_BITS = 24
+FIELD_BYTES = FIELD_BITS // 8
+OFFSET = 128
+
+
+class PackedVectors:
+    """
+    int8 vectors stored by column to score them in bulk: column i is one big int holding entry
+    i of every vector (offset to be non-negative) in a FIELD_BITS-bit field of its own.
+    Multiplying each column by the query's entry and summing yields every dot product in its
+    own field, so scoring n vectors takes dim big-int operations instead of n * dim Python ones.
+    """
+
+    def __init__(self, dim: int, vectors: Sequence[array] = ()):
+        assert dim * (2 * OFFSET - 1) ** 2 < 1 << FIELD_BITS
+        self.dim = dim
+        self.count = len(vectors)
+        self.sums = [sum(vector) for vector in vectors]
+        padding = b"\0" * (FIELD_BYTES - 1)
+        self.columns = [
+            int.from_bytes(b"".join(bytes((vector[i] + OFFSET,)) + padding for vector in vectors), 'little')
+            for i in range(dim)
+        ]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, vector: array):
+        shift = FIELD_BITS * self.count
+        columns = self.columns
+        for i, value in enumerate(vector):
+            columns[i] += (value + OFFSET) << shift
+        self.sums.append(sum(vector))
+        self.count += 1
+
+    def dot(self, query: array) -> List[int]:
+        """
+        The dot product of the query with every vector, in insertion order.
+        """
+        total = 0
+        for column, value in zip(self.columns, query):
+            total += column * (value + OFFSET)
+        data = total.to_bytes(FIELD_BYTES * self.count + 1, 'little')
+        # Undo the offsets: sum((q + o)(v + o)) = q.v + o * sum(v) + o * sum(q) + dim * o^2
+        bias = OFFSET * sum(query) + self.dim * OFFSET * OFFSET
+        return [
+            int.from_bytes(data[FIELD_BYTES * j:FIELD_BYTES * (j + 1)], 'little') - OFFSET * vector_sum - bias
+            for j, vector_sum in enumerate(self.sums)
+        ]
+
+
+class SimilarVideoIndex:
+    """
+    An inverted file (IVF) index of video embeddings for approximate nearest-neighbour search.
+    The vectors are clustered with spherical k-means into about sqrt(n) lists, and a query only
+    scores the vectors of the SIMILAR_NPROBE lists whose centroids are closest to it.
+
+    On disk, vectors.bin holds fixed-size records (video ID, list, int8 vector) that are
+    appended as videos are added; a later record of a video replaces the earlier one.
+    centroids.bin holds the int8 centroids. Workers share the files: each one reads the
+    records appended by the others before a query, and reloads everything when the lists
+    are rebuilt (the rebuild replaces vectors.bin, which changes its inode). Rebuilds run in
+    a background thread, so the insert that triggers one returns right away.
+    """
+
+    def __init__(self, directory: Path, dim: int = EMBEDDING_DIM):
+        self.directory = directory
+        self.dim = dim
+        # A record is this header followed by the int8 vector
+        self.header = struct.Struct(f"<{VIDEO_ID_BYTES}sH")
+        self.record_size = self.header.size + dim
+        self._lock = threading.RLock()
+        self._training = False
+        self._training_thread: Optional[threading.Thread] = None
+        self._reset()
+
+    def _reset(self):
+        self.video_ids: List[str] = []
+        self.vectors: List[array] = []
+        self.row_lists: List[int] = []
+        self.rows: Dict[str, int] = {}
+        self.centroids = PackedVectors(self.dim)
+        # Rows in each list and their packed vectors (None until the next search after a removal);
+        # a single list until the index is trained
+        self.lists: List[List[int]] = [[]]
+        self.packed: List[Optional[PackedVectors]] = [PackedVectors(self.dim)]
+        self.trained_on = 0
+        self._offset = 0
+        self._inode: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.bin"
+
+    @property
+    def centroids_path(self) -> Path:
+        return self.directory / "centroids.bin"
+
+    def get_vector(self, video_id: str) -> Optional[array]:
+        """
+        The vector of an indexed video, or None if it is not in the index (as of the last refresh).
+        """
+        with self._lock:
+            row = self.rows.get(video_id)
+            return self.vectors[row] if row is not None else None
+
+    def _file_lock(self, operation: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.directory / "index.lock", "a")
+        fcntl.flock(lock_file, operation)
+        return lock_file
+
+    def _pack(self, video_id: str, list_id: int, vector: array) -> bytes:
+        return self.header.pack(video_id.encode(), list_id) + vector.tobytes()
+
+    def _apply(self, video_id: str, list_id: int, vector: array):
+        row = self.rows.get(video_id)
+        if row is None:
+            row = self.rows[video_id] = len(self.video_ids)
+            self.video_ids.append(video_id)
+            self.vectors.append(vector)
+            self.row_lists.append(list_id)
+        else:
+            # Re-sectioned video
+            old_list = self.row_lists[row]
+            self.lists[old_list].remove(row)
+            self.packed[old_list] = None
+            self.vectors[row] = vector
+            self.row_lists[row] = list_id
+        self.lists[list_id].append(row)
+        if self.packed[list_id] is not None:
+            self.packed[list_id].append(vector)
+
+    def _get_packed(self, list_id: int) -> PackedVectors:
+        packed = self.packed[list_id]
+        if packed is None:
+            packed = self.packed[list_id] = PackedVectors(self.dim, [self.vectors[row] for row in self.lists[list_id]])
+        return packed
+
+    def _load_centroids(self):
+        with open(self.centroids_path, 'rb') as f:
+            self.trained_on, count = struct.unpack("<QI", f.read(12))
+            data = f.read(count * self.dim)
+        centroids = []
+        for i in range(count):
+            centroid = array('b')
+            centroid.frombytes(data[i * self.dim:(i + 1) * self.dim])
+            centroids.append(centroid)
+        self.centroids = PackedVectors(self.dim, centroids)
+        self.lists = [[] for _ in range(count)]
+        self.packed = [PackedVectors(self.dim) for _ in range(count)]
+
+    def _refresh(self):
+        """
+        Read what other processes wrote since the last call. Needs the file lock (shared at least).
+        """
+        try:
+            stat = self.vectors_path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode:
+            self._reset()
+            if self.centroids_path.exists():
+                self._load_centroids()
+            self._inode = stat.st_ino
+        if stat.st_size <= self._offset:
+            return
+
+        with open(self.vectors_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # Only whole records, in case a writer died half way through one
+        usable = len(data) - len(data) % self.record_size
+        for position in range(0, usable, self.record_size):
+            video_id, list_id = self.header.unpack_from(data, position)
+            vector = array('b')
+            vector.frombytes(data[position + self.header.size:position + self.record_size])
+            self._apply(video_id.rstrip(b"\0").decode(), list_id, vector)
+        self._offset += usable
+
+    def refresh(self):
+        with self._lock:
+            lock_file = self._file_lock(fcntl.LOCK_SH)
+            try:
+                self._refresh()
+            finally:
+                lock_file.close()
+
+    @staticmethod
+    def _nearest(vector: array, centroids: PackedVectors, count: int) -> List[int]:
+        if not len(centroids):
+            return [0]
+        scores = centroids.dot(vector)
+        if count == 1:
+            return [max(range(len(scores)), key=scores.__getitem__)]
+        return heapq.nlargest(count, range(len(scores)), key=scores.__getitem__)
+
+    def add(self, video_id: str, vector: array):
+        """
+        Insert (or replace) a video's vector, and start rebuilding the lists in the background
+        once the catalogue has outgrown them.
+        """
+        with self._lock:
+            lock_file = self._file_lock(fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                list_id = self._nearest(vector, self.centroids, 1)[0]
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(self._pack(video_id, list_id, vector))
+                    self._offset = f.tell()
+                self._inode = self.vectors_path.stat().st_ino
+                self._apply(video_id, list_id, vector)
+                SIMILAR_INDEX_OPERATIONS_TOTAL.inc(operation="insert")
+
+                if not self._training and len(self) >= SIMILAR_MIN_TRAIN and len(self) >= RETRAIN_GROWTH * self.trained_on:
+                    self._training = True
+                    # The snapshot the lists are built from: the catalogue as of this insert
+                    snapshot = (list(self.vectors), self._inode)
+                    self._training_thread = threading.Thread(
+                        target=self._train_in_background, args=snapshot, name="vidly-similar-train", daemon=True
+                    )
+                    self._training_thread.start()
+            finally:
+                lock_file.close()
+
+    def _train_in_background(self, vectors: List[array], inode: Optional[int]):
+        try:
+            self._train(vectors, inode)
+        except Exception as e:
+            # Retried by the next insert
+            logger.error(f"Error clustering the similar videos index: {str(e)}")
+        finally:
+            self._training = False
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """
+        Wait for a rebuild of the lists started by add() to finish, if one is running.
+        """
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def train(self, seed: int = 0):
+        """
+        Rebuild the lists from the current vectors. See _train.
+        """
+        with self._lock:
+            vectors, inode = list(self.vectors), self._inode
+        self._train(vectors, inode, seed)
+
+    def _train(self, vectors: List[array], inode: Optional[int], seed: int = 0):
+        """
+        Cluster the vectors into about sqrt(n) lists with spherical k-means on a sample, assign
+        every video to its closest centroid and rewrite both files. Runs when the catalogue has
+        grown RETRAIN_GROWTH times, so its cost per insert stays small. The clustering works on
+        a snapshot without holding the locks, so searches and inserts carry on meanwhile.
+        """
+        count = max(1, int(math.sqrt(len(vectors))))
+        rng = random.Random(seed)
+        sample = rng.sample(vectors, min(len(vectors), KMEANS_SAMPLE_PER_LIST * count))
+        centroids = rng.sample(sample, count)
+        for _ in range(KMEANS_ITERATIONS):
+            packed = PackedVectors(self.dim, centroids)
+            sums = [[0] * self.dim for _ in centroids]
+            for vector in sample:
+                total = sums[self._nearest(vector, packed, 1)[0]]
+                for i, value in enumerate(vector):
+                    total[i] += value
+            # Empty clusters are dropped
+            centroids = [quantize(total) for total in sums if any(total)]
+        packed = PackedVectors(self.dim, centroids)
+        assignments = [self._nearest(vector, packed, 1)[0] for vector in vectors]
+
+        with self._lock:
+            lock_file = self._file_lock(fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self._inode != inode:
+                    # Another worker rebuilt the lists in the meantime
+                    return
+                # Videos added or re-sectioned since the snapshot
+                for row, vector in enumerate(self.vectors):
+                    if row >= len(vectors):
+                        assignments.append(self._nearest(vector, packed, 1)[0])
+                    elif vector is not vectors[row]:
+                        assignments[row] = self._nearest(vector, packed, 1)[0]
+
+                centroids_tmp = self.centroids_path.with_suffix(".tmp")
+                with open(centroids_tmp, 'wb') as f:
+                    f.write(struct.pack("<QI", len(vectors), len(centroids)))
+                    for centroid in centroids:
+                        f.write(centroid.tobytes())
+                vectors_tmp = self.vectors_path.with_suffix(".tmp")
+                with open(vectors_tmp, 'wb') as f:
+                    for row, video_id in enumerate(self.video_ids):
+                        f.write(self._pack(video_id, assignments[row], self.vectors[row]))
+                os.replace(centroids_tmp, self.centroids_path)
+                # Last, so other workers only reload once both files are in place
+                os.replace(vectors_tmp, self.vectors_path)
+                # Picked up like any other worker would
+                self._refresh()
+            finally:
+                lock_file.close()
+        SIMILAR_INDEX_OPERATIONS_TOTAL.inc(operation="train")
+        logger.info(f"Clustered {len(vectors)} videos into {len(centroids)} lists for similar video search")
+
+    def search(self, vector: array, k: int = 10, nprobe: int = SIMILAR_NPROBE, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Find the k videos whose vectors are closest (by cosine similarity) to the given one,
+        among those in the nprobe lists with the closest centroids.
+
+        Returns:
+            (video ID, similarity) from most to least similar
+        """
+        self.refresh()
+        with self._lock:
+            return self._top(vector, self._nearest(vector, self.centroids, nprobe), k, exclude)
+
+    def brute_force(self, vector: array, k: int = 10, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Exact search over every list, as a baseline for search().
+        """
+        self.refresh()
+        with self._lock:
+            return self._top(vector, range(len(self.lists)), k, exclude)
+
+    def _top(self, vector: array, list_ids, k: int, exclude: Optional[str]) -> List[Tuple[str, float]]:
+        video_ids = self.video_ids
+        scored = (
+            (score, row)
+            for list_id in list_ids
+            for score, row in zip(self._get_packed(list_id).dot(vector), self.lists[list_id])
+            if video_ids[row] != exclude
+        )
+        scale = QUANTIZATION_SCALE * QUANTIZATION_SCALE
+        return [(video_ids[row], round(score / scale, 4)) for score, row in heapq.nlargest(k, scored)]
+
+
+class SimilarIndexUnavailable(HTTPException):
+    """
+    Raised when the similar videos index can't be used on this platform. Served as 501.
+    """
+
+    def __init__(self):
+        super().__init__(
+            status_code=501,
+            detail="The similar videos index needs fcntl, which is not available on this platform",
+        )
+
+
+_index: Optional[SimilarVideoIndex] = None
+_index_lock = threading.Lock()
+# Adds the videos sectioned before the index existed
+_backfill_thread: Optional[threading.Thread] = None
+
+
+def get_similar_index_dir() -> Path:
+    # Resolved on every use so the index follows the data directory
+    return storage.DATA_DIR / SIMILAR_INDEX_DIR
+
+
+def _backfill(index: SimilarVideoIndex):
+    added = 0
+    try:
+        for path in sorted(index.directory.parent.glob("*/sections.json")):
+            video_id = path.parent.name
+            if index.get_vector(video_id) is None:
+                index.add(video_id, embed_sections(load_json_artifact(video_id, "sections.json")))
+                added += 1
+    except Exception as e:
+        # The remaining videos are added the next time they are sectioned
+        logger.error(f"Error adding earlier videos to the similar videos index: {str(e)}")
+    logger.info(f"Loaded {len(index)} videos into the similar videos index ({added} added)")
+
+
+def get_similar_index() -> SimilarVideoIndex:
+    """
+    Open the index on first use. The videos that were sectioned before it existed are added
+    in a background thread, so they show up in the results as they are added.
+
+    Raises:
+        SimilarIndexUnavailable: If fcntl is not available to share the index files between workers
+    """
+    global _index, _backfill_thread
+    if fcntl is None:
+        raise SimilarIndexUnavailable()
+
+    directory = get_similar_index_dir()
+    with _index_lock:
+        if _index is None or _index.directory != directory:
+            index = SimilarVideoIndex(directory)
+            index.refresh()
+            _backfill_thread = threading.Thread(target=_backfill, args=(index,), name="vidly-similar-backfill", daemon=True)
+            _backfill_thread.start()
+            _index = index
+        return _index
+
+
+def add_to_similar_index(video_id: str):
+    """
+    Make a newly sectioned video searchable and findable as similar.
+    """
+    if SIMILAR_INDEX:
+        get_similar_index().add(video_id, embed_sections(load_json_artifact(video_id, "sections.json")))
+
+
+@timed_stage("find_similar_videos")
+def find_similar_videos(video_id: str, k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Find the videos whose sections are most similar to those of a video.
+
+    Returns:
+        {"video_id", "score"} from most to least similar
+
+    Raises:
+        FileNotFoundError: If the video has no sections
+        SimilarIndexUnavailable: If the index is not available on this platform
+    """
+    if not has_artifact(video_id, "sections.json"):
+        raise FileNotFoundError(f"Sections not found for video ID: {video_id}")
+
+    index = get_similar_index()
+    index.refresh()
+    vector = index.get_vector(video_id)
+    if vector is None:
+        vector = embed_sections(load_json_artifact(video_id, "sections.json"))
+    SIMILAR_INDEX_OPERATIONS_TOTAL.inc(operation="query")
+    return [{"video_id": similar_id, "score": score} for similar_id, score in index.search(vector, k, exclude=video_id)]
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any
+from services.utils.storage import get_recent_video_ids, has_artifact, load_json_artifact
+from services.utils.metrics import STARTUP_SECONDS
+logger = logging.getLogger(__name__)
+
+# Number of most recently used videos whose artifacts are loaded into memory on startup
+WARMUP_VIDEOS = int(os.getenv("WARMUP_VIDEOS", 8))
+
+# Filled in by main.py (import time) and warm_up (everything else)
+startup_report: Dict[str, Any] = {"phases": {}, "warmed_up": False}
+
+
+def record_phase(phase: str, seconds: float):
+    startup_report["phases"][phase] = round(seconds, 4)
+    STARTUP_SECONDS.set(seconds, phase=phase)
+
+
+def _import_services():
+    import services.youtube_service  # noqa: F401
+    import services.transcription_service  # noqa: F401
+    import services.llm_service  # noqa: F401
+    import services.batch_service  # noqa: F401
+
+
+def _build_clients():
+    from services.llm_service import get_instructor_client
+    from services.utils.llm_planner import SMALL_MODEL, LARGE_MODEL
+    from services.transcription_service import get_deepgram_client
+
+    get_deepgram_client()
+    # The models the planner picks from for sectioning and answers
+    for model in (SMALL_MODEL, LARGE_MODEL):
+        get_instructor_client(model)
+
+
+def _preload_artifacts() -> int:
+    from services.utils.shared_cache import acquire_transcript, release_transcript
+
+    loaded = 0
+    for video_id in get_recent_video_ids(WARMUP_VIDEOS):
+        if has_artifact(video_id, "sections.json"):
+            load_json_artifact(video_id, "sections.json")
+            loaded += 1
+            if has_artifact(video_id, "transcription.json"):
+                # Maps the copy shared by all workers (the first worker to start builds it)
+                release_transcript(acquire_transcript(video_id))
+                loaded += 1
+    return loaded
+
+
+async def warm_up():
+    """
+    Pay the one-off costs (SDK imports, client construction, loading hot artifacts)
+    before serving traffic, so the first request after a scale-up isn't slow.
+    Each phase runs in a thread to keep the event loop responsive.
+    """
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+
+    for phase, func in (
+        ("import_services", _import_services),
+        ("build_clients", _build_clients),
+        ("preload_artifacts", _preload_artifacts),
+    ):
+        phase_started_at = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(None, func)
+            if phase == "preload_artifacts":
+                startup_report["preloaded_artifacts"] = result
+        except Exception as e:
+            # A failed warm-up only costs latency later; never block startup on it
+            logger.warning(f"Warm-up phase {phase} failed: {str(e)}")
+        record_phase(phase, time.perf_counter() - phase_started_at)
+
+    record_phase("warm_up", time.perf_counter() - started_at)
+    startup_report["warmed_up"] = True
+    logger.info(f"Startup report: {startup_report}")
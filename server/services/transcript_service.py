@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+from services.utils.storage import get_artifact_path, get_artifact_version, load_json_artifact
+from services.utils.json_utils import dumps, loads, load_file, dump_file, get_temp_path
+from services.utils.metrics import timed_stage
+logger = logging.getLogger(__name__)
+
+# Words are stored in one JSON line per bucket of this many seconds
+INDEX_BUCKET_SECONDS = int(os.getenv("TRANSCRIPT_INDEX_BUCKET_SECONDS", 30))
+INDEX_VERSION = 1
+
+WORDS_ARTIFACT = "transcript_words.jsonl"
+INDEX_ARTIFACT = "transcript_index.json"
+
+_index_locks: Dict[str, threading.Lock] = {}
+_index_locks_lock = threading.Lock()
+
+
+def _get_index_lock(video_id: str) -> threading.Lock:
+    with _index_locks_lock:
+        return _index_locks.setdefault(video_id, threading.Lock())
+
+
+@timed_stage("build_transcript_index")
+def build_transcript_index(video_id: str) -> Dict[str, Any]:
+    """
+    Split the words of transcription.json into fixed time buckets, one compact JSON line
+    per bucket, and record the byte offset of every line. A time window can then be
+    served by reading and parsing only the lines it overlaps.
+
+    Returns:
+        The index
+    """
+    version = get_artifact_version(video_id, "transcription.json")
+    transcription_data = load_file(get_artifact_path(video_id, "transcription.json"))
+    words = transcription_data['results']['channels'][0]['alternatives'][0]['words']
+
+    buckets: List[List[List[Any]]] = []
+    for word in words:
+        bucket = int(word['start'] // INDEX_BUCKET_SECONDS)
+        while len(buckets) <= bucket:
+            buckets.append([])
+        buckets[bucket].append([word['start'], word['end'], word.get('punctuated_word') or word['word']])
+
+    offsets = []
+    position = 0
+    words_path = get_artifact_path(video_id, WORDS_ARTIFACT)
+    temp_path = get_temp_path(words_path)
+    try:
+        with open(temp_path, 'wb') as f:
+            for bucket in buckets:
+                line = dumps(bucket) + b'\n'
+                offsets.append(position)
+                f.write(line)
+                position += len(line)
+        temp_path.replace(words_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    # One extra offset so that bucket i spans offsets[i]:offsets[i + 1]
+    offsets.append(position)
+
+    index = {
+        "version": INDEX_VERSION,
+        "transcription_version": version,
+        "bucket_seconds": INDEX_BUCKET_SECONDS,
+        "duration": words[-1]['end'] if words else 0,
+        "word_count": len(words),
+        "offsets": offsets,
+    }
+    dump_file(index, get_artifact_path(video_id, INDEX_ARTIFACT))
+    logger.info(f"Built transcript index for {video_id}: {len(buckets)} buckets, {len(words)} words")
+    return index
+
+
+def get_transcript_index(video_id: str) -> Dict[str, Any]:
+    """
+    Load the time index of a transcript, building it if it is missing or older than transcription.json.
+
+    Raises:
+        FileNotFoundError: If the video has no transcription
+    """
+    version = get_artifact_version(video_id, "transcription.json")
+    index_path = get_artifact_path(video_id, INDEX_ARTIFACT)
+
+    if index_path.exists():
+        index = load_json_artifact(video_id, INDEX_ARTIFACT)
+        if index.get("version") == INDEX_VERSION and index.get("transcription_version") == version:
+            return index
+
+    with _get_index_lock(video_id):
+        # Another request may have rebuilt it while we waited
+        if index_path.exists():
+            index = load_file(index_path)
+            if index.get("version") == INDEX_VERSION and index.get("transcription_version") == version:
+                return index
+        return build_transcript_index(video_id)
+
+
+def get_transcript_window(video_id: str, start: float = 0, end: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Get the words spoken between start and end (in seconds) without parsing the whole transcript.
+
+    Returns:
+        The window with its words as {"start", "end", "word"} (the punctuated word) and its text
+    """
+    index = get_transcript_index(video_id)
+    offsets = index["offsets"]
+    bucket_count = len(offsets) - 1
+
+    if end is None:
+        end = index["duration"]
+    start = max(start, 0)
+
+    first_bucket = min(int(start // index["bucket_seconds"]), bucket_count)
+    last_bucket = min(int(end // index["bucket_seconds"]), bucket_count - 1)
+
+    words = []
+    if first_bucket <= last_bucket:
+        with open(get_artifact_path(video_id, WORDS_ARTIFACT), 'rb') as f:
+            f.seek(offsets[first_bucket])
+            chunk = f.read(offsets[last_bucket + 1] - offsets[first_bucket])
+
+        for line in chunk.splitlines():
+            for word_start, word_end, word in loads(line):
+                if start <= word_start <= end:
+                    words.append({"start": word_start, "end": word_end, "word": word})
+
+    return {
+        "video_id": video_id,
+        "start": start,
+        "end": end,
+        "duration": index["duration"],
+        "words": words,
+        "text": " ".join(word["word"] for word in words),
+    }
@@ -4,20 +4,21 @@ from os.path import join
 import asyncio
 from glob import glob
 import logging
+from functools import lru_cache
+from contextlib import ExitStack
 from typing import List, Dict, Any, Optional
 from pathlib import Path
-from deepgram import (
-    DeepgramClient,
-    PrerecordedOptions,
-    FileSource,
-    LiveOptions,
-    LiveTranscriptionEvents,
-)
 from services.utils.youtube_utils import extract_youtube_video_id
+from services.utils.storage import get_artifact_path, find_audio_file
+from services.utils.metrics import timed_stage, BYTES_TOTAL
+from services.utils.tracing import start_span, run_in_thread
+from services.utils.admission import admit, get_executor
+from services.utils.json_utils import dump_file
+from services.transcript_service import build_transcript_index
+from services.fingerprint_service import transcribe_from_fingerprint, add_to_fingerprint_index
 # from settings import settings
 
 logger = logging.getLogger(__name__)
-root_dir = Path(__file__).parent
 
 # Initialize Deepgram client
 # DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
@@ -27,57 +28,134 @@ if not DEEPGRAM_API_KEY:
     logger.error("DEEPGRAM_API_KEY not found in environment variables. Please check your server/.env file.")
     logger.error("Make sure you have a line like: DEEPGRAM_API_KEY=your_deepgram_api_key_here")
 
-deepgram = DeepgramClient(DEEPGRAM_API_KEY) if DEEPGRAM_API_KEY else None
+# Optional base URL of a Deepgram-compatible API (e.g. the fake provider used by benchmarks/)
+DEEPGRAM_URL = os.getenv("DEEPGRAM_URL", "")
+
+
+@lru_cache(maxsize=None)
+def get_deepgram_client():
+    """
+    Import the Deepgram SDK and build the client on first use, so importing this module stays cheap.
+    """
+    from deepgram import DeepgramClient, DeepgramClientOptions
+
+    if DEEPGRAM_URL:
+        return DeepgramClient(DEEPGRAM_API_KEY, DeepgramClientOptions(url=DEEPGRAM_URL))
+    return DeepgramClient(DEEPGRAM_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_upload_timing_transport_class():
+    """
+    An httpx transport for the Deepgram SDK, whose single blocking call hides how long the
+    upload took. Within the current span it times the upload of the request body as
+    deepgram_upload (until the last byte is handed to the connection) and the wait for the
+    response as deepgram_processing.
+    """
+    import httpx
+
+    class IteratorStream(httpx.SyncByteStream):
+        def __init__(self, iterator):
+            self._iterator = iterator
+
+        def __iter__(self):
+            return self._iterator
+
+    class UploadTimingTransport(httpx.BaseTransport):
+        def __init__(self, transport: Optional[httpx.BaseTransport] = None):
+            self._transport = transport or httpx.HTTPTransport()
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            spans = ExitStack()
+            body = request.stream
+
+            def timed_body():
+                yield from body
+                # The connection asks for more only once everything before was sent
+                spans.close()
+                spans.enter_context(start_span("deepgram_processing"))
+
+            spans.enter_context(start_span("deepgram_upload", {"bytes": int(request.headers.get("Content-Length", 0))}))
+            request.stream = IteratorStream(timed_body())
+            try:
+                return self._transport.handle_request(request)
+            finally:
+                spans.close()
+
+        def close(self):
+            self._transport.close()
+
+    return UploadTimingTransport
+
+
+def _transcribe_file(audio_file_path: str, transcription_path: str):
+    """
+    Internal function to send an audio file to Deepgram and save the response.
+    This runs in a separate thread since the Deepgram REST client is blocking.
+    """
+    # Check file size before processing
+    file_size = os.path.getsize(audio_file_path)
+    logger.info(f"Processing file of size: {file_size / (1024 * 1024):.2f} MB")
+    
+    from deepgram import PrerecordedOptions, FileSource
+
+    with open(audio_file_path, "rb") as file:
+        buffer_data = file.read()
+    
+    deepgram = get_deepgram_client()
+
+    options = PrerecordedOptions(
+        model="nova-3",
+        language="en",
+        # Add timeout parameter (in seconds)
+        
+    )
+
+    payload: FileSource = {
+        "buffer": buffer_data,
+    }
+    
+    # Add logging to track request progress
+    logger.debug("Sending transcription request to Deepgram...")
+    
+    # STEP 3: Call the transcribe_file method with the text payload and options
+    with start_span("deepgram_request", {"bytes": len(buffer_data)}):
+        response = deepgram.listen.rest.v("1").transcribe_file(
+            payload, options, timeout=300, transport=get_upload_timing_transport_class()()
+        )
+    BYTES_TOTAL.inc(len(buffer_data), kind="stt_uploaded")
+
+    # STEP 4: Save the response
+    with start_span("write_transcription"):
+        dump_file(response.to_dict(), transcription_path)
 
+
+@timed_stage("transcribe")
 async def transcribe(youtube_url: str):
     video_id = extract_youtube_video_id(youtube_url)
 
-    transcription_path = f"{root_dir}/data/{video_id}/transcription.json"
+    transcription_path = get_artifact_path(video_id, "transcription.json")
     if os.path.exists(transcription_path):
         return
 
     # Path to the audio file
-    audio_file_dir = f"{root_dir}/data/{video_id}"
-    
-    files = glob(join(audio_file_dir, 'audio.*'))
+    audio_file_path = find_audio_file(video_id)
 
-    if not files:
+    if not audio_file_path:
         raise ValueError('No file found')
-    
-    audio_file_path = files[0]
 
     try:
-        # Check file size before processing
-        file_size = os.path.getsize(audio_file_path)
-        print(f"Processing file of size: {file_size / (1024 * 1024):.2f} MB")
-        
-        with open(audio_file_path, "rb") as file:
-            buffer_data = file.read()
-        
-        deepgram = DeepgramClient(DEEPGRAM_API_KEY)
-
-        options = PrerecordedOptions(
-            model="nova-3",
-            language="en",
-            # Add timeout parameter (in seconds)
-            
-        )
-
-        payload: FileSource = {
-            "buffer": buffer_data,
-        }
-        
-        # Add logging to track request progress
-        print("Sending transcription request to Deepgram...")
-        
-        # STEP 3: Call the transcribe_file method with the text payload and options
-        response = deepgram.listen.rest.v("1").transcribe_file(payload, options, timeout=300)
+        # Re-uploads, mirrors and clips of a transcribed video reuse its transcript
+        matched = await run_in_thread(transcribe_from_fingerprint, video_id, str(audio_file_path))
 
-        # STEP 4: Print the response
-        print(response.to_json(indent=4))
+        if not matched:
+            # Run the upload in a thread pool so that concurrent transcriptions don't block the event loop
+            async with admit("stt"):
+                await run_in_thread(_transcribe_file, str(audio_file_path), str(transcription_path), executor=get_executor("stt"))
+            await run_in_thread(add_to_fingerprint_index, video_id)
 
-        with open(transcription_path, 'w') as f:
-            f.write(response.to_json(indent=4))
+        # Build the time index now so the first /transcript request doesn't pay for it
+        await run_in_thread(build_transcript_index, video_id)
 
     except Exception as e:
         logger.info(f"Exception: {e}")
@@ -89,4 +167,4 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--url", type=str, default='https://youtu.be/5C_HPTJg5ek')
     args = parser.parse_args()
-    transcribe(args.url)
\ No newline at end of file
+    asyncio.run(transcribe(args.url))
\ No newline at end of file
@@ -0,0 +1,253 @@
+import os
+import math
+import time
+import asyncio
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Dict, Deque, Tuple
+from fastapi import HTTPException
+from services.utils.metrics import (
+    ADMISSION_QUEUE_WAIT_SECONDS,
+    ADMISSION_QUEUED,
+    ADMISSION_IN_USE,
+    ADMISSION_REJECTED_TOTAL,
+    ADMISSION_PREEMPTED_TOTAL,
+)
+
+# Priority classes, highest first
+INTERACTIVE = "interactive"
+SECTIONING = "sectioning"
+TRANSCRIPTION = "transcription"
+BATCH = "batch"
+# Precomputation of results users are likely to ask for; only runs on spare capacity
+SPECULATIVE = "speculative"
+PRIORITY_CLASSES = [INTERACTIVE, SECTIONING, TRANSCRIPTION, BATCH, SPECULATIVE]
+# Calls of these classes are cancelled when an interactive call would otherwise have to wait
+PREEMPTIBLE_CLASSES = {SPECULATIVE}
+
+# Shared resources and how many calls may use each at once
+RESOURCE_CAPACITY = {
+    "llm": int(os.getenv("LLM_CONCURRENCY", 8)),
+    "stt": int(os.getenv("STT_CONCURRENCY", 8)),
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", 4)),
+}
+
+# Slots of each resource only interactive calls may use. The budgets below cap each lower class,
+# but together they could still take every slot and leave Q&A waiting behind long calls.
+INTERACTIVE_RESERVE = {
+    "llm": int(os.getenv("LLM_INTERACTIVE_RESERVE", 2)),
+    "stt": int(os.getenv("STT_INTERACTIVE_RESERVE", 1)),
+    "download": int(os.getenv("DOWNLOAD_INTERACTIVE_RESERVE", 1)),
+}
+
+# (budget, queue limit) of each class on each resource. The budget is the share of a resource
+# the class is guaranteed when other classes are waiting for it too. Beyond its budget, a class
+# may borrow idle slots (up to the interactive reserve) unless a waiting class is still short of
+# its own budget; borrowed slots go back as the calls finish, to the highest waiting class first.
+# A budget of 0 keeps the class off the resource. When the queue is full, new calls are rejected.
+# Batch work is deferred rather than shed, hence its long queues.
+CLASS_LIMITS: Dict[str, Dict[str, Tuple[int, int]]] = {
+    INTERACTIVE: {"llm": (8, 64), "stt": (8, 16), "download": (4, 16)},
+    SECTIONING: {"llm": (4, 16), "stt": (4, 16), "download": (2, 16)},
+    TRANSCRIPTION: {"llm": (2, 16), "stt": (6, 16), "download": (3, 16)},
+    BATCH: {
+        "llm": (int(os.getenv("BATCH_LLM_BUDGET", 2)), 10000),
+        "stt": (int(os.getenv("BATCH_STT_BUDGET", 2)), 10000),
+        "download": (int(os.getenv("BATCH_DOWNLOAD_BUDGET", 1)), 10000),
+    },
+    SPECULATIVE: {"llm": (2, 64), "stt": (0, 0), "download": (0, 0)},
+}
+
+# Unclassified work (endpoints without a class, CLI runs, background tasks) is treated as batch work
+_priority_class = contextvars.ContextVar("priority_class", default=BATCH)
+
+
+class AdmissionRejected(HTTPException):
+    """
+    Raised when a resource's queue for a priority class is full. Served as 429 with Retry-After.
+    """
+
+    def __init__(self, resource: str, priority: str, retry_after: int):
+        self.resource = resource
+        self.priority = priority
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=429,
+            detail=f"Too many {priority} requests waiting for {resource}, retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def get_priority_class() -> str:
+    return _priority_class.get()
+
+
+@contextmanager
+def priority_class(priority: str):
+    """
+    Run the enclosed work (and the tasks and threads it starts) in a priority class.
+
+    Usage:
+        with priority_class(INTERACTIVE):
+            await answer_question(...)
+    """
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    token = _priority_class.set(priority)
+    try:
+        yield
+    finally:
+        _priority_class.reset(token)
+
+
+class _Resource:
+    """
+    A concurrency limit shared by all priority classes. Freed slots go to the highest class
+    with waiting calls that is under its budget, or that may borrow idle capacity because no
+    waiting class is short of its own budget; calls of the same class are served in order.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.in_use = 0
+        self.in_use_by_class = {priority: 0 for priority in PRIORITY_CLASSES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITY_CLASSES}
+        # Tasks holding a slot that may be cancelled to make room for interactive calls
+        self.preemptible: Dict[asyncio.Task, str] = {}
+        # Moving average of how long a call holds a slot, for Retry-After
+        self.average_hold_seconds = 1.0
+
+    def _can_grant(self, priority: str) -> bool:
+        budget, _ = CLASS_LIMITS[priority][self.name]
+        capacity = self.capacity if priority == INTERACTIVE else self.capacity - INTERACTIVE_RESERVE[self.name]
+        if self.in_use >= capacity or budget <= 0:
+            return False
+        if self.in_use_by_class[priority] < budget:
+            return True
+        # Over budget: borrow the slot unless a waiting class is still short of its budget
+        return not any(
+            self.waiters[p] and self.in_use_by_class[p] < CLASS_LIMITS[p][self.name][0]
+            for p in PRIORITY_CLASSES if p != priority
+        )
+
+    def _grant(self, priority: str):
+        self.in_use += 1
+        self.in_use_by_class[priority] += 1
+        ADMISSION_IN_USE.inc(resource=self.name, priority=priority)
+
+    def _dispatch(self):
+        for priority in PRIORITY_CLASSES:
+            waiters = self.waiters[priority]
+            while waiters and self._can_grant(priority):
+                future = waiters.popleft()
+                ADMISSION_QUEUED.dec(resource=self.name, priority=priority)
+                if not future.done():
+                    self._grant(priority)
+                    future.set_result(None)
+
+    def retry_after(self, priority: str) -> int:
+        ahead = sum(len(self.waiters[p]) for p in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+        return max(1, math.ceil(self.average_hold_seconds * (ahead + 1) / self.capacity))
+
+    async def acquire(self, priority: str):
+        # Earlier calls of the same or a higher class go first
+        queued_ahead = any(self.waiters[p] for p in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+        if not queued_ahead and self._can_grant(priority):
+            self._grant(priority)
+            ADMISSION_QUEUE_WAIT_SECONDS.observe(0, resource=self.name, priority=priority)
+            return
+
+        _, queue_limit = CLASS_LIMITS[priority][self.name]
+        if len(self.waiters[priority]) >= queue_limit:
+            ADMISSION_REJECTED_TOTAL.inc(resource=self.name, priority=priority)
+            raise AdmissionRejected(self.name, priority, self.retry_after(priority))
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(future)
+        ADMISSION_QUEUED.inc(resource=self.name, priority=priority)
+        if priority == INTERACTIVE:
+            self._preempt()
+        started_at = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up
+                self.release(priority, 0)
+            elif future in self.waiters[priority]:
+                self.waiters[priority].remove(future)
+                ADMISSION_QUEUED.dec(resource=self.name, priority=priority)
+            raise
+        ADMISSION_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started_at, resource=self.name, priority=priority)
+
+    def _preempt(self):
+        """
+        Cancel a preemptible call of the lowest class; its slot goes to the waiting interactive call.
+        """
+        holders = [(PRIORITY_CLASSES.index(priority), task) for task, priority in self.preemptible.items() if not task.done()]
+        if not holders:
+            return
+        # The most recently started call of the lowest class has done the least work
+        _, task = max(reversed(holders), key=lambda holder: holder[0])
+        priority = self.preemptible.pop(task)
+        ADMISSION_PREEMPTED_TOTAL.inc(resource=self.name, priority=priority)
+        task.cancel()
+
+    def release(self, priority: str, held_seconds: float):
+        self.in_use -= 1
+        self.in_use_by_class[priority] -= 1
+        ADMISSION_IN_USE.dec(resource=self.name, priority=priority)
+        if held_seconds:
+            self.average_hold_seconds = 0.8 * self.average_hold_seconds + 0.2 * held_seconds
+        self._dispatch()
+
+
+_resources: Dict[str, _Resource] = {}
+
+
+def _get_resource(name: str) -> _Resource:
+    if name not in _resources:
+        _resources[name] = _Resource(name, RESOURCE_CAPACITY[name])
+    return _resources[name]
+
+
+@asynccontextmanager
+async def admit(resource: str):
+    """
+    Wait for a slot of a shared resource ("llm", "stt" or "download") in the current priority class.
+
+    Calls in PREEMPTIBLE_CLASSES may be cancelled (with asyncio.CancelledError) while they
+    hold the slot, when an interactive call would otherwise have to wait.
+
+    Raises:
+        AdmissionRejected: If too many calls of the class are already waiting
+
+    Usage:
+        async with admit("llm"):
+            response = await client.generate(...)
+    """
+    priority = get_priority_class()
+    state = _get_resource(resource)
+    await state.acquire(priority)
+    task = asyncio.current_task() if priority in PREEMPTIBLE_CLASSES else None
+    if task:
+        state.preemptible[task] = priority
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.preemptible.pop(task, None)
+        state.release(priority, time.perf_counter() - started_at)
+
+
+@lru_cache(maxsize=None)
+def get_executor(resource: str) -> ThreadPoolExecutor:
+    """
+    A thread pool for the blocking calls of a resource, so that they can't fill the default
+    pool that interactive requests use for reading artifacts.
+    """
+    return ThreadPoolExecutor(max_workers=RESOURCE_CAPACITY[resource], thread_name_prefix=f"vidly-{resource}")
@@ -0,0 +1,197 @@
+import re
+from typing import List, Dict, Any, Optional
+
+# Source markers stored in transcription.json metadata so consumers know where the words came from
+SOURCE_DEEPGRAM = "deepgram"
+SOURCE_YOUTUBE_CAPTIONS = "youtube_captions"
+
+_TIMING_LINE = re.compile(r'^\s*((?:\d+:)?\d{1,2}:\d{2}\.\d{3})\s+-->\s+((?:\d+:)?\d{1,2}:\d{2}\.\d{3})')
+_INLINE_TIMESTAMP = re.compile(r'<((?:\d+:)?\d{1,2}:\d{2}\.\d{3})>')
+_TAG = re.compile(r'</?[^>]+>')
+
+
+def _vtt_timestamp_to_seconds(timestamp: str) -> float:
+    parts = timestamp.split(':')
+    seconds = float(parts[-1])
+    minutes = int(parts[-2])
+    hours = int(parts[-3]) if len(parts) == 3 else 0
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _normalize_word(word: str) -> str:
+    # Deepgram's "word" is lowercase without punctuation; "punctuated_word" keeps the original
+    return re.sub(r"[^\w']", '', word).lower()
+
+
+def parse_vtt(vtt_text: str) -> List[Dict[str, Any]]:
+    """
+    Parse a WebVTT subtitle file into cues.
+
+    Args:
+        vtt_text: The contents of the .vtt file
+
+    Returns:
+        A list of cues, each with start, end (in seconds), text and, when the file
+        has inline word timestamps (YouTube auto-captions), the timed words
+    """
+    cues = []
+    # Only truly empty lines separate cues: auto-captions contain lines with a single space inside cues
+    blocks = re.split(r'\n{2,}', vtt_text.replace('\r\n', '\n').strip())
+
+    for block in blocks:
+        lines = block.split('\n')
+        timing_index = next((i for i, line in enumerate(lines) if _TIMING_LINE.match(line)), None)
+        if timing_index is None:
+            # WEBVTT header, NOTE and STYLE blocks
+            continue
+
+        match = _TIMING_LINE.match(lines[timing_index])
+        start = _vtt_timestamp_to_seconds(match.group(1))
+        end = _vtt_timestamp_to_seconds(match.group(2))
+        text_lines = [line.strip() for line in lines[timing_index + 1:] if line.strip()]
+        # In auto-captions the previous line is repeated above the new, word-timed line
+        timed_lines = [line for line in text_lines if _INLINE_TIMESTAMP.search(line)]
+        raw_text = ' '.join(timed_lines or text_lines)
+
+        cue = {
+            'start': start,
+            'end': end,
+            'text': ' '.join(_TAG.sub('', raw_text).split()),
+            'words': None
+        }
+
+        if _INLINE_TIMESTAMP.search(raw_text):
+            # "<00:00:01.500><c> word</c>" marks the start of each following word
+            words = []
+            word_start = start
+            for chunk in re.split(r'(<(?:\d+:)?\d{1,2}:\d{2}\.\d{3}>)', raw_text):
+                timestamp = _INLINE_TIMESTAMP.fullmatch(chunk)
+                if timestamp:
+                    word_start = _vtt_timestamp_to_seconds(timestamp.group(1))
+                    continue
+                for word in _TAG.sub('', chunk).split():
+                    words.append({'word': word, 'start': word_start})
+            for i, word in enumerate(words):
+                word['end'] = words[i + 1]['start'] if i + 1 < len(words) else end
+            cue['words'] = words
+
+        if cue['text']:
+            cues.append(cue)
+
+    return _remove_rolling_duplicates(cues)
+
+
+def _remove_rolling_duplicates(cues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Auto-captions repeat the previous line at the top of every cue ("roll-up" captions),
+    # so only keep the text that is new in each cue
+    deduplicated = []
+    previous_text = ''
+    for cue in cues:
+        text = cue['text']
+        if text == previous_text:
+            continue
+        if previous_text and text.startswith(previous_text) and cue['words'] is None:
+            cue = {**cue, 'text': text[len(previous_text):].strip()}
+        previous_text = text
+        if cue['text']:
+            deduplicated.append(cue)
+    return deduplicated
+
+
+def cues_to_words(cues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert cues into Deepgram-style word timings.
+
+    Cues without inline word timestamps have their duration split between their
+    words in proportion to word length.
+    """
+    words = []
+    for cue in cues:
+        timed_words = cue['words']
+        if timed_words is None:
+            tokens = cue['text'].split()
+            total_length = sum(len(token) + 1 for token in tokens)
+            duration = max(cue['end'] - cue['start'], 0)
+            cursor = cue['start']
+            timed_words = []
+            for token in tokens:
+                word_duration = duration * (len(token) + 1) / total_length
+                timed_words.append({'word': token, 'start': cursor, 'end': cursor + word_duration})
+                cursor += word_duration
+
+        for word in timed_words:
+            normalized = _normalize_word(word['word'])
+            if not normalized:
+                continue
+            words.append({
+                'word': normalized,
+                'start': round(word['start'], 3),
+                'end': round(word['end'], 3),
+                'confidence': 1.0,
+                'punctuated_word': word['word']
+            })
+    return words
+
+
+def get_caption_quality(cues: List[Dict[str, Any]], duration: Optional[float] = None) -> Dict[str, float]:
+    """
+    Compute the metrics used to decide whether captions are good enough to skip speech-to-text.
+
+    Args:
+        cues: The parsed cues
+        duration: The duration of the video in seconds, if known
+
+    Returns:
+        The word count, the fraction of the video covered by cues and the speaking rate
+    """
+    word_count = sum(len(cue['text'].split()) for cue in cues)
+    covered_seconds = sum(max(cue['end'] - cue['start'], 0) for cue in cues)
+    if not duration:
+        duration = cues[-1]['end'] if cues else 0
+
+    return {
+        'word_count': word_count,
+        'coverage': min(covered_seconds / duration, 1.0) if duration else 0.0,
+        'words_per_minute': word_count * 60 / covered_seconds if covered_seconds else 0.0
+    }
+
+
+def is_caption_quality_acceptable(
+    quality: Dict[str, float],
+    min_words: int = 20,
+    min_coverage: float = 0.5,
+    min_words_per_minute: float = 40,
+    max_words_per_minute: float = 300
+) -> bool:
+    """
+    Check caption quality metrics against thresholds. Sparse captions (music videos,
+    partial subtitles) and implausible speaking rates (broken timings) fail.
+    """
+    return (
+        quality['word_count'] >= min_words
+        and quality['coverage'] >= min_coverage
+        and min_words_per_minute <= quality['words_per_minute'] <= max_words_per_minute
+    )
+
+
+def build_transcription(
+    words: List[Dict[str, Any]],
+    source: str = SOURCE_YOUTUBE_CAPTIONS,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Wrap words in the same structure as a Deepgram prerecorded response so that
+    every consumer of transcription.json can read it unchanged.
+    """
+    return {
+        'metadata': {'source': source, **(metadata or {})},
+        'results': {
+            'channels': [{
+                'alternatives': [{
+                    'transcript': ' '.join(word['punctuated_word'] for word in words),
+                    'confidence': 1.0,
+                    'words': words
+                }]
+            }]
+        }
+    }
@@ -0,0 +1,107 @@
+import gzip
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from services.utils.json_utils import dumps
+
+try:
+    # Optional: brotli compresses JSON transcripts noticeably better than gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _quality(params: str) -> float:
+    """
+    The q value of an Accept-Encoding entry's parameters (1 if absent, 0 if malformed).
+    """
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def _accepts_encoding(request: Request, encoding: str) -> bool:
+    for value in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = value.strip().partition(";")
+        if name.strip().lower() == encoding:
+            # "q=0", "q=0.0" and "q=0.000" all refuse the encoding
+            return _quality(params) > 0
+    return False
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {
+        # Weak, since the gzip, brotli and identity representations share the tag: they are
+        # the same content, but not byte for byte as a strong tag (e.g. for ranges) would promise
+        "ETag": f"W/{etag}",
+        # Clients may store the response but must revalidate it, which is cheap thanks to the ETag
+        "Cache-Control": "public, no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def not_modified_response(request: Request, etag: str) -> Optional[Response]:
+    """
+    Check If-None-Match before doing any work for a cacheable response.
+
+    Args:
+        request: The incoming request
+        etag: An identifier of the content's version, e.g. derived from the artifact's mtime and size
+
+    Returns:
+        A 304 Not Modified response if the client already has this version, otherwise None
+    """
+    etag = f'"{etag}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+def cached_json_response(request: Request, etag: str, content: Any) -> Response:
+    """
+    Build a compact JSON response with an ETag, compressed with brotli or gzip depending on Accept-Encoding.
+    """
+    headers = _cache_headers(f'"{etag}"')
+
+    body = dumps(content)
+    if len(body) >= MIN_COMPRESS_BYTES:
+        body, encoding = compress(request, body)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def compress(request: Request, body: bytes) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a response body with the best encoding the client accepts.
+
+    Returns:
+        The (possibly) compressed body and its Content-Encoding, or None if it was not compressed
+    """
+    if brotli and _accepts_encoding(request, "br"):
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if _accepts_encoding(request, "gzip"):
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
@@ -0,0 +1,54 @@
+import os
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    # orjson is several times faster than the standard library for our large transcripts
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serialize data to compact JSON bytes.
+    """
+    if orjson:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def get_temp_path(path: Path) -> Path:
+    """
+    A temporary path next to the given one, unique to this write so that threads and workers
+    writing the same file at once don't truncate each other's data before the rename.
+    """
+    return path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def dump_file(data: Any, path: Union[str, Path]):
+    """
+    Write data as compact JSON. The file is written next to its destination and renamed into
+    place so readers never see a partially written artifact.
+    """
+    path = Path(path)
+    temp_path = get_temp_path(path)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(dumps(data))
+        temp_path.replace(path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def load_file(path: Union[str, Path]) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -0,0 +1,203 @@
+import os
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+from services.utils import storage
+from services.utils.json_utils import dumps, loads
+from services.utils.metrics import LLM_PLANS_TOTAL, LLM_PLAN_DURATION
+logger = logging.getLogger(__name__)
+
+# Strategies
+# The whole input in one call
+DIRECT = "direct"
+# Sectioning only: the transcript is split into windows that are sectioned in parallel
+WINDOWED = "windowed"
+# Answers only: the section in focus and an outline of the video instead of the full transcript
+RETRIEVAL_ONLY = "retrieval_only"
+
+# Model tiers: the small model answers short prompts faster, the large one handles everything else.
+# Both accept far longer prompts than our transcripts; what runs out first is the output limit.
+SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gemini-2.0-flash-lite")
+LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "gemini-2.0-flash")
+MAX_OUTPUT_TOKENS = {SMALL_MODEL: 8192, LARGE_MODEL: 8192}
+
+# Prompts up to this size go to the small model
+SMALL_MODEL_MAX_PROMPT_TOKENS = int(os.getenv("LLM_SMALL_MODEL_MAX_PROMPT_TOKENS", 8000))
+# Answers drop the full transcript above this size
+ANSWER_DIRECT_MAX_PROMPT_TOKENS = int(os.getenv("LLM_ANSWER_DIRECT_MAX_PROMPT_TOKENS", 32000))
+ANSWER_MAX_TOKENS = 1024
+
+# Rough size of the sections response: one section every few minutes, each a title and a few summary points
+SECONDS_PER_SECTION = 180
+TOKENS_PER_SECTION = 120
+# Sectioning is windowed when the response would use more than this share of the model's output limit
+SECTIONS_OUTPUT_HEADROOM = 0.6
+
+# Decisions and their observed latency, one JSON object per line, for tuning the thresholds above
+PLANS_LOG = "llm_plans.jsonl"
+# Above this size the log is moved to llm_plans.jsonl.1 (replacing the previous one) and started over
+PLANS_LOG_MAX_BYTES = int(os.getenv("LLM_PLANS_LOG_MAX_BYTES", 10 * 1024 * 1024))
+
+_log_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    # About 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def _estimate_sections_output_tokens(duration_seconds: float) -> int:
+    return int((duration_seconds / SECONDS_PER_SECTION + 1) * TOKENS_PER_SECTION)
+
+
+def plan_sections(segments: List[Dict[str, Any]], llm_input: str) -> Dict[str, Any]:
+    """
+    Choose the model, strategy and max_tokens for dividing a transcript into sections.
+    Sectioning responses grow with the video, so long videos are split into windows whose
+    responses stay well within the output limit instead of being truncated and retried.
+
+    Returns:
+        The plan, with "windows" as (start, end) segment index ranges (end exclusive)
+    """
+    prompt_tokens = estimate_tokens(llm_input)
+    model = SMALL_MODEL if prompt_tokens <= SMALL_MODEL_MAX_PROMPT_TOKENS else LARGE_MODEL
+    output_limit = int(MAX_OUTPUT_TOKENS.get(model, 8192) * SECTIONS_OUTPUT_HEADROOM)
+
+    duration = segments[-1]['end'] - segments[0]['start'] if segments else 0
+    output_tokens = _estimate_sections_output_tokens(duration)
+    window_count = -(-output_tokens // output_limit)
+
+    window_size = max(1, -(-len(segments) // window_count))
+    windows = [(start, min(start + window_size, len(segments))) for start in range(0, len(segments), window_size)]
+    window_output_tokens = output_tokens // len(windows) if windows else output_tokens
+
+    return {
+        "task": "sections",
+        "strategy": DIRECT if len(windows) <= 1 else WINDOWED,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "estimated_output_tokens": output_tokens,
+        # Twice the estimate, capped at the model's limit
+        "max_tokens": min(MAX_OUTPUT_TOKENS.get(model, 8192), max(1024, 2 * window_output_tokens)),
+        "windows": windows,
+    }
+
+
+def plan_answer(transcript_tokens: int, context_tokens: int) -> Dict[str, Any]:
+    """
+    Choose the model, strategy and max_tokens for answering a question.
+
+    Args:
+        transcript_tokens: Estimated tokens of the full transcript
+        context_tokens: Estimated tokens of everything else (section in focus, history, question)
+    """
+    prompt_tokens = transcript_tokens + context_tokens
+    strategy = DIRECT
+    if prompt_tokens > ANSWER_DIRECT_MAX_PROMPT_TOKENS:
+        strategy = RETRIEVAL_ONLY
+        prompt_tokens = context_tokens
+
+    return {
+        "task": "answer",
+        "strategy": strategy,
+        "model": SMALL_MODEL if prompt_tokens <= SMALL_MODEL_MAX_PROMPT_TOKENS else LARGE_MODEL,
+        "prompt_tokens": prompt_tokens,
+        "max_tokens": ANSWER_MAX_TOKENS,
+    }
+
+
+def get_plans_log_path() -> Path:
+    # Resolved on every use so the log follows the data directory
+    return storage.DATA_DIR / PLANS_LOG
+
+
+def record_plan(plan: Dict[str, Any], video_id: Optional[str], duration: float, status: str):
+    """
+    Export the decision with its latency on /metrics and append it to the plans log.
+    """
+    LLM_PLANS_TOTAL.inc(task=plan["task"], strategy=plan["strategy"], model=plan["model"], status=status)
+    LLM_PLAN_DURATION.observe(duration, task=plan["task"], strategy=plan["strategy"], model=plan["model"])
+    logger.info(
+        f"LLM plan for {plan['task']} of {video_id}: {plan['strategy']} with {plan['model']} "
+        f"(~{plan['prompt_tokens']} prompt tokens, max_tokens {plan['max_tokens']}) {status} in {duration:.2f}s"
+    )
+
+    entry = {
+        "time": round(time.time(), 3),
+        "video_id": video_id,
+        **{key: value for key, value in plan.items() if key != "windows"},
+        "windows": len(plan.get("windows", ())) or None,
+        "duration": round(duration, 3),
+        "status": status,
+    }
+    path = get_plans_log_path()
+    try:
+        with _log_lock:
+            with open(path, 'ab') as f:
+                f.write(dumps(entry) + b"\n")
+                size = f.tell()
+            if size > PLANS_LOG_MAX_BYTES:
+                path.replace(path.with_name(f"{PLANS_LOG}.1"))
+    except OSError as e:
+        logger.warning(f"Could not record the LLM plan: {str(e)}")
+
+
+@asynccontextmanager
+async def recorded_plan(plan: Dict[str, Any], video_id: Optional[str]):
+    """
+    Time the enclosed LLM work and record it with its plan.
+
+    Usage:
+        async with recorded_plan(plan, video_id):
+            response = await call_llm_with_instructor(...)
+    """
+    started_at = time.perf_counter()
+    status = "error"
+    try:
+        yield plan
+        status = "ok"
+    finally:
+        record_plan(plan, video_id, time.perf_counter() - started_at, status)
+
+
+def load_plans(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Read the recorded plans of the current and the previous log, oldest first.
+    """
+    path = get_plans_log_path()
+    lines = []
+    for log_path in [path.with_name(f"{PLANS_LOG}.1"), path]:
+        if log_path.exists():
+            with open(log_path, 'rb') as f:
+                lines.extend(f.read().splitlines())
+    return [loads(line) for line in (lines[-limit:] if limit else lines) if line]
+
+
+def summarize_plans(plans: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+    """
+    Count, errors and mean latency per (task, strategy, model), to tune the thresholds.
+    """
+    summary: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+    for plan in plans:
+        key = (plan["task"], plan["strategy"], plan["model"])
+        stats = summary.setdefault(key, {"count": 0, "errors": 0, "mean_duration": 0.0, "mean_prompt_tokens": 0.0})
+        stats["count"] += 1
+        stats["errors"] += plan["status"] != "ok"
+        stats["mean_duration"] += (plan["duration"] - stats["mean_duration"]) / stats["count"]
+        stats["mean_prompt_tokens"] += (plan["prompt_tokens"] - stats["mean_prompt_tokens"]) / stats["count"]
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize recorded LLM plans")
+    parser.add_argument("--limit", type=int, default=None, help="Only the most recent plans")
+    args = parser.parse_args()
+    for (task, strategy, model), stats in sorted(summarize_plans(load_plans(args.limit)).items()):
+        print(
+            f"{task:8} {strategy:15} {model:24} n={stats['count']:<6} errors={stats['errors']:<4} "
+            f"mean {stats['mean_duration']:.2f}s ~{stats['mean_prompt_tokens']:.0f} prompt tokens"
+        )
@@ -0,0 +1,275 @@
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from functools import wraps
+from typing import Dict, List, Tuple, Optional, Sequence
+from services.utils.tracing import start_span
+
+# Seconds; spans the range from a cached JSON read to a multi-hour transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_registry: List["_Metric"] = []
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing value (e.g. bytes uploaded)."""
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down (e.g. jobs in flight)."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """A distribution of observed values (e.g. latencies) over fixed buckets."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def get_count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, counts[:], self._sums[key]) for key, counts in self._counts.items()]
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': str(bound)})} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    return "\n\n".join(metric.render() for metric in _registry) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "vidly_http_request_duration_seconds", "Latency of HTTP requests", ["method", "endpoint", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "vidly_http_requests_in_flight", "HTTP requests currently being served", ["endpoint"]
+)
+STAGE_DURATION = Histogram(
+    "vidly_stage_duration_seconds", "Latency of pipeline stages", ["stage", "status"]
+)
+STAGE_IN_FLIGHT = Gauge(
+    "vidly_stage_in_flight", "Pipeline stage jobs currently running", ["stage"]
+)
+BYTES_TOTAL = Counter(
+    "vidly_bytes_total", "Bytes moved by the pipeline", ["kind"]
+)
+LLM_TOKENS_TOTAL = Counter(
+    "vidly_llm_tokens_total", "Tokens used by LLM calls", ["model", "type"]
+)
+RETRIES_TOTAL = Counter(
+    "vidly_retries_total", "Retries of failed external calls", ["operation"]
+)
+LIVE_SESSIONS = Gauge(
+    "vidly_live_sessions", "Live transcription sessions in progress"
+)
+LIVE_SUBSCRIBERS = Gauge(
+    "vidly_live_subscribers", "Websocket clients following live sessions"
+)
+CHAT_CONNECTIONS = Gauge(
+    "vidly_chat_connections", "Open chat websocket connections"
+)
+CHAT_TURNS_TOTAL = Counter(
+    "vidly_chat_turns_total", "Chat questions by outcome (completed, cancelled, failed)", ["status"]
+)
+CHAT_FIRST_TOKEN_SECONDS = Histogram(
+    "vidly_chat_first_token_seconds", "Time from a chat question to the first streamed answer token"
+)
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "vidly_admission_queue_wait_seconds", "Time spent waiting for a shared resource", ["resource", "priority"]
+)
+ADMISSION_QUEUED = Gauge(
+    "vidly_admission_queued", "Calls waiting for a shared resource", ["resource", "priority"]
+)
+ADMISSION_IN_USE = Gauge(
+    "vidly_admission_in_use", "Slots of a shared resource in use", ["resource", "priority"]
+)
+ADMISSION_REJECTED_TOTAL = Counter(
+    "vidly_admission_rejected_total", "Calls rejected with 429 because the queue for their class was full", ["resource", "priority"]
+)
+ADMISSION_PREEMPTED_TOTAL = Counter(
+    "vidly_admission_preempted_total", "Preemptible calls cancelled to make room for interactive calls", ["resource", "priority"]
+)
+PRECOMPUTED_ANSWERS_TOTAL = Counter(
+    "vidly_precomputed_answers_total", "Questions answered from the precomputed section insights without an LLM call"
+)
+FINGERPRINT_LOOKUPS_TOTAL = Counter(
+    "vidly_fingerprint_lookups_total", "Audio fingerprint lookups by result (exact, near, clip, miss)", ["result"]
+)
+STT_SECONDS_SAVED_TOTAL = Counter(
+    "vidly_stt_seconds_saved_total", "Seconds of audio not sent to speech-to-text because a matching transcript was reused"
+)
+LLM_PLANS_TOTAL = Counter(
+    "vidly_llm_plans_total", "LLM calls by the planner's choice of strategy and model", ["task", "strategy", "model", "status"]
+)
+LLM_PLAN_DURATION = Histogram(
+    "vidly_llm_plan_duration_seconds", "Latency of planned LLM work by strategy and model", ["task", "strategy", "model"]
+)
+SHARED_CACHE_LOOKUPS_TOTAL = Counter(
+    "vidly_shared_cache_lookups_total", "Shared transcript cache lookups (attached, mapped, built)", ["result"]
+)
+SHARED_CACHE_EVICTIONS_TOTAL = Counter(
+    "vidly_shared_cache_evictions_total", "Transcripts evicted from the shared cache"
+)
+PROFILES_CAPTURED_TOTAL = Counter(
+    "vidly_profiles_captured_total", "Request profiles saved by trigger (request, random, slow)", ["trigger"]
+)
+DERIVED_ARTIFACTS_TOTAL = Counter(
+    "vidly_derived_artifacts_total", "Derived artifacts served by source (sectioning, sections, cache)", ["artifact", "source"]
+)
+KEYFRAMES_TOTAL = Counter(
+    "vidly_keyframes_total", "Keyframes extracted at section boundaries and attached to questions", ["event"]
+)
+SIMILAR_INDEX_OPERATIONS_TOTAL = Counter(
+    "vidly_similar_index_operations_total", "Similar videos index operations (insert, query, train)", ["operation"]
+)
+STARTUP_SECONDS = Gauge(
+    "vidly_startup_seconds", "Time spent in each startup phase", ["phase"]
+)
+
+
+def timed_stage(stage: str):
+    """
+    Decorator that records the latency of a pipeline stage in STAGE_DURATION,
+    tracks it in STAGE_IN_FLIGHT and wraps it in a trace span. Works for both
+    sync and async functions.
+
+    Usage:
+        @timed_stage("transcribe")
+        async def transcribe(youtube_url: str): ...
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                STAGE_IN_FLIGHT.inc(stage=stage)
+                started_at = time.perf_counter()
+                status = "error"
+                try:
+                    with start_span(stage):
+                        result = await func(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    STAGE_DURATION.observe(time.perf_counter() - started_at, stage=stage, status=status)
+                    STAGE_IN_FLIGHT.dec(stage=stage)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            STAGE_IN_FLIGHT.inc(stage=stage)
+            started_at = time.perf_counter()
+            status = "error"
+            try:
+                with start_span(stage):
+                    result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                STAGE_DURATION.observe(time.perf_counter() - started_at, stage=stage, status=status)
+                STAGE_IN_FLIGHT.dec(stage=stage)
+        return wrapper
+
+    return decorator
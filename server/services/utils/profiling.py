@@ -0,0 +1,267 @@
+import os
+import re
+import sys
+import hmac
+import time
+import random
+import logging
+import threading
+from collections import Counter as CountingDict, deque
+from typing import Optional, Dict, Any, List, Tuple
+from services.utils.storage import DATA_DIR
+from services.utils.json_utils import dump_file, load_file
+from services.utils.metrics import PROFILES_CAPTURED_TOTAL
+logger = logging.getLogger(__name__)
+
+# Share of requests profiled at random (0 to disable)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+# Requests slower than this are captured automatically (0 to disable). Enabling it samples
+# stacks whenever a request to one of PROFILE_SLOW_ROUTES is in flight, since a request can't
+# be known to be slow upfront.
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0))
+# The routes that do real work (transcription, the LLM, reading artifacts). Cheap routes such as
+# /metrics and health checks, and paths without a route, are never watched for PROFILE_SLOW_SECONDS.
+PROFILE_SLOW_ROUTES = {
+    "/audios/transcribe",
+    "/videos/extract_audio",
+    "/videos/transcribe",
+    "/videos/create_sections",
+    "/videos/answer_question",
+    "/videos/{video_id}/transcript",
+    "/videos/{video_id}/sections",
+    "/videos/{video_id}/artifacts",
+    "/videos/{video_id}/similar",
+    "/videos/{video_id}/insights",
+    "/videos/batch",
+    "/videos/live/start",
+}
+# Allow clients to profile a request with the X-Profile header or the profile query parameter
+PROFILE_ON_REQUEST = os.getenv("PROFILE_ON_REQUEST", "false").lower() == "true"
+# If set, only clients sending it in the X-Profile-Token header can profile requests and read the profiles
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+# Captures kept on disk; the oldest are deleted first
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", 50))
+MAX_STACK_DEPTH = 64
+# Stacks kept in memory for the requests in flight (a few minutes at the default interval)
+MAX_SAMPLES = 200000
+
+PROFILES_DIR = DATA_DIR / "profiles"
+PROFILE_ID_PATTERN = re.compile(r"\d{8}-\d{6}-\d{9}")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """
+    A thread that records the stack of every other thread at a fixed interval while at least
+    one capture is active. The stacks are process-wide: a capture gets every stack sampled
+    during its request, including those of concurrent requests.
+    """
+
+    def __init__(self):
+        # (perf_counter time, folded stack)
+        self.samples: deque = deque(maxlen=MAX_SAMPLES)
+        self.active = 0
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            self.active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vidly-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.active -= 1
+
+    def _fold(self, thread_name: str, frame) -> str:
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ";".join(reversed(labels))
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                self._fold(names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items() if ident != own_ident
+            ]
+            with self._lock:
+                self.samples.extend((now, stack) for stack in stacks)
+            time.sleep(PROFILE_INTERVAL_SECONDS)
+
+    def get_stacks(self, started_at: float, ended_at: float) -> Dict[str, int]:
+        """
+        Count the stacks sampled between started_at and ended_at (perf_counter times).
+        """
+        with self._lock:
+            samples = list(self.samples)
+        stacks: CountingDict = CountingDict()
+        # Newest first, so only the part of the buffer that overlaps the request is read
+        for sampled_at, stack in reversed(samples):
+            if sampled_at < started_at:
+                break
+            if sampled_at <= ended_at:
+                stacks[stack] += 1
+        return dict(stacks)
+
+
+_sampler = _Sampler()
+
+
+def can_access_profiles(headers: Any) -> bool:
+    """
+    Whether a client may profile its requests and read the saved profiles, which expose the
+    server's code paths: with the right X-Profile-Token if PROFILE_TOKEN is set, or else only
+    if PROFILE_ON_REQUEST is enabled.
+    """
+    if PROFILE_TOKEN:
+        return hmac.compare_digest(headers.get("x-profile-token", "").encode(), PROFILE_TOKEN.encode())
+    return PROFILE_ON_REQUEST
+
+
+def get_trigger(headers: Any, query_params: Any, endpoint: str) -> Optional[str]:
+    """
+    Decide whether to profile a request.
+
+    Args:
+        endpoint: The route template of the request
+
+    Returns:
+        "request" if the client asked for it, "random" if picked by PROFILE_SAMPLE_RATE,
+        "slow" if it is only watched for PROFILE_SLOW_SECONDS, or None
+    """
+    if (PROFILE_ON_REQUEST and (headers.get("x-profile") or query_params.get("profile")) in ("1", "true")
+            and can_access_profiles(headers)):
+        return "request"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "random"
+    if PROFILE_SLOW_SECONDS and endpoint in PROFILE_SLOW_ROUTES:
+        return "slow"
+    return None
+
+
+class Capture:
+    """
+    Sampling of one request. The stacks are only collected (and saved) if the request
+    was profiled on purpose or turned out to be slow.
+    """
+
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+        self.started_at = time.perf_counter()
+        self.ended_at: Optional[float] = None
+        _sampler.start()
+
+    @property
+    def duration_seconds(self) -> float:
+        return (self.ended_at or time.perf_counter()) - self.started_at
+
+    def finish(self) -> bool:
+        """
+        Stop sampling for this request.
+
+        Returns:
+            True if the capture should be saved
+        """
+        self.ended_at = time.perf_counter()
+        _sampler.stop()
+        if self.trigger == "slow":
+            if self.duration_seconds < PROFILE_SLOW_SECONDS:
+                return False
+        return True
+
+    def get_stacks(self) -> Dict[str, int]:
+        return _sampler.get_stacks(self.started_at, self.ended_at or time.perf_counter())
+
+
+def to_folded(stacks: Dict[str, int]) -> str:
+    """
+    Format stacks as "frame;frame;frame count" lines, the input of flamegraph.pl and speedscope.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def save_capture(capture: Capture, details: Dict[str, Any]) -> str:
+    """
+    Write a capture to the ring of profiles on disk, deleting the oldest beyond PROFILE_RING_SIZE.
+
+    Returns:
+        The ID of the profile
+    """
+    stacks = capture.get_stacks()
+    # Sortable by time, so the ring deletes the oldest
+    now_ns = time.time_ns()
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now_ns // 10**9))}-{now_ns % 10**9:09d}"
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    dump_file({
+        "id": profile_id,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "trigger": capture.trigger,
+        "duration_seconds": round(capture.duration_seconds, 6),
+        "interval_seconds": PROFILE_INTERVAL_SECONDS,
+        "samples": sum(stacks.values()),
+        **details,
+        "top_frames": get_top_frames(stacks, limit=10),
+        "folded": to_folded(stacks),
+    }, PROFILES_DIR / f"{profile_id}.json")
+    PROFILES_CAPTURED_TOTAL.inc(trigger=capture.trigger)
+
+    paths = sorted(PROFILES_DIR.glob("*.json"))
+    for path in paths[:max(len(paths) - PROFILE_RING_SIZE, 0)]:
+        path.unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """
+    The captures on disk, newest first, without their stacks.
+    """
+    profiles = []
+    for path in sorted(PROFILES_DIR.glob("*.json"), reverse=True):
+        try:
+            profile = load_file(path)
+        except FileNotFoundError:
+            # Deleted by a newer capture
+            continue
+        profile.pop("folded", None)
+        profiles.append(profile)
+    return profiles
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+        return None
+    path = PROFILES_DIR / f"{profile_id}.json"
+    if not path.exists():
+        return None
+    return load_file(path)
+
+
+def get_top_frames(stacks: Dict[str, int], limit: int = 20) -> List[Tuple[str, int]]:
+    """
+    The frames that were running (the leaf of the stack) in the most samples.
+    """
+    leaves: CountingDict = CountingDict()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(limit)
@@ -0,0 +1,291 @@
+import os
+import mmap
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where every worker keeps its own copy instead
+    fcntl = None
+
+from services.utils.storage import DATA_DIR, get_artifact_path, get_artifact_version
+from services.utils.json_utils import dumps, loads, load_file
+from services.utils.metrics import SHARED_CACHE_LOOKUPS_TOTAL, SHARED_CACHE_EVICTIONS_TOTAL
+logger = logging.getLogger(__name__)
+
+# Keep the words and sections of hot videos in files under a RAM-backed directory that every
+# uvicorn worker maps read-only, instead of each worker parsing its own copy of the JSON
+USE_SHARED_CACHE = os.getenv("SHARED_TRANSCRIPT_CACHE", "true").lower() == "true" and fcntl is not None
+SHARED_CACHE_DIR = Path(os.getenv(
+    "SHARED_CACHE_DIR", "/dev/shm/vidly" if os.path.isdir("/dev/shm") else DATA_DIR / "shared_cache"
+))
+# Total size of the cached transcripts of all workers; the least recently attached unused ones are evicted
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Transcripts each worker keeps mapped after their last user released them
+SHARED_CACHE_ATTACHED = int(os.getenv("SHARED_CACHE_ATTACHED", 16))
+
+MAGIC = b"VIDLYTR1"
+# Magic, word count, bytes of the words' text, of the full transcript and of the sections JSON, duration.
+# The header is followed by the word starts and ends (float64), the offsets of each word in the
+# words' text (uint64, one extra at the end) and the three byte strings. Every array stays 8-byte aligned.
+HEADER = struct.Struct("<8sQQQQd")
+
+
+def encode_transcript(transcription_data: Dict[str, Any], sections: List[Dict[str, Any]]) -> bytes:
+    """
+    Pack the words of a transcription and the video's sections into the shared cache format.
+    """
+    alternative = transcription_data['results']['channels'][0]['alternatives'][0]
+    words = sorted(alternative['words'], key=lambda word: word['start'])
+
+    starts = array('d', (word['start'] for word in words))
+    ends = array('d', (word['end'] for word in words))
+    encoded_words = [word['word'].encode('utf-8') for word in words]
+    # Each word is followed by a space, so any run of words is one slice of the text
+    words_text = b''.join(word + b' ' for word in encoded_words)
+    offsets = array('Q', [0])
+    for word in encoded_words:
+        offsets.append(offsets[-1] + len(word) + 1)
+
+    transcript = alternative['transcript'].encode('utf-8')
+    sections_json = dumps(sections)
+    duration = words[-1]['end'] if words else 0.0
+
+    header = HEADER.pack(MAGIC, len(words), len(words_text), len(transcript), len(sections_json), duration)
+    return b''.join([header, starts.tobytes(), ends.tobytes(), offsets.tobytes(), words_text, transcript, sections_json])
+
+
+class SharedTranscript:
+    """
+    Read-only access to a transcript in the shared cache format, backed either by a file mapped
+    into the process (shared with the other workers) or by bytes of its own. Lookups by time
+    bisect the word starts in place; only the words and text asked for are copied out.
+    """
+
+    def __init__(self, key: str, buffer: Any, file: Any = None):
+        self.key = key
+        # Users in this process; the transcript can only be unmapped when there are none
+        self.refs = 0
+        self._file = file
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+
+        magic, count, text_size, transcript_size, sections_size, self.duration = HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError(f"Not a cached transcript: {key}")
+
+        position = HEADER.size
+        self._starts = self._view[position:position + 8 * count].cast('d')
+        position += 8 * count
+        self._ends = self._view[position:position + 8 * count].cast('d')
+        position += 8 * count
+        self._offsets = self._view[position:position + 8 * (count + 1)].cast('Q')
+        position += 8 * (count + 1)
+        self._words_text = self._view[position:position + text_size]
+        position += text_size
+        self._transcript = self._view[position:position + transcript_size]
+        position += transcript_size
+        # Small next to the words, so every worker parses its own copy
+        self.sections: List[Dict[str, Any]] = loads(bytes(self._view[position:position + sections_size]))
+
+    @property
+    def size(self) -> int:
+        return len(self._view)
+
+    @property
+    def word_count(self) -> int:
+        return len(self._starts)
+
+    def get_transcript(self) -> str:
+        return str(self._transcript, 'utf-8')
+
+    def get_word_range(self, start: float, end: float) -> Tuple[int, int]:
+        """
+        Get the indices [first, last) of the words that start between start and end (in seconds).
+        """
+        return bisect_left(self._starts, start), bisect_right(self._starts, end)
+
+    def get_text(self, start: float, end: float) -> str:
+        """
+        Get the words that start between start and end (in seconds), separated by spaces.
+        """
+        first, last = self.get_word_range(start, end)
+        if first >= last:
+            return ''
+        return str(self._words_text[self._offsets[first]:self._offsets[last] - 1], 'utf-8')
+
+    def get_words(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """
+        Get the words that start between start and end (in seconds) as {"word", "start", "end"}.
+        """
+        first, last = self.get_word_range(start, end)
+        words = str(self._words_text[self._offsets[first]:self._offsets[last]], 'utf-8').split(' ')
+        return [
+            {"word": words[i - first], "start": self._starts[i], "end": self._ends[i]}
+            for i in range(first, last)
+        ]
+
+    def close(self):
+        for view in (self._starts, self._ends, self._offsets, self._words_text, self._transcript, self._view):
+            view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file:
+            # Drops this worker's shared lock, so other workers may evict the file
+            self._file.close()
+
+
+# Transcripts attached by this process, least recently used first
+_attached: "OrderedDict[str, SharedTranscript]" = OrderedDict()
+_attached_lock = threading.Lock()
+
+
+def _get_cache_key(video_id: str) -> str:
+    # A new transcription or new sections get a new file; the old one is evicted once unused
+    return f"{video_id}-{get_artifact_version(video_id, 'transcription.json')}-{get_artifact_version(video_id, 'sections.json')}"
+
+
+def _attach(key: str) -> Optional[SharedTranscript]:
+    """
+    Map an existing cache file. The shared lock held while it is mapped is the file's
+    reference count across workers; the kernel drops it if a worker dies.
+    """
+    path = SHARED_CACHE_DIR / f"{key}.bin"
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_SH)
+        # Marks the file as recently used for eviction
+        os.utime(file.fileno())
+        return SharedTranscript(key, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), file)
+    except Exception:
+        file.close()
+        raise
+
+
+def _evict_shared(incoming_bytes: int):
+    """
+    Delete the least recently attached files that no worker has mapped until the cache fits its budget.
+    """
+    entries = []
+    for path in SHARED_CACHE_DIR.glob("*.bin"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries) + incoming_bytes
+    for _, size, path in sorted(entries):
+        if total <= SHARED_CACHE_MAX_BYTES:
+            break
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            continue
+        with file:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Mapped by a worker
+                continue
+            path.unlink(missing_ok=True)
+        total -= size
+        SHARED_CACHE_EVICTIONS_TOTAL.inc()
+
+
+def _load(video_id: str, key: str) -> SharedTranscript:
+    if not USE_SHARED_CACHE:
+        SHARED_CACHE_LOOKUPS_TOTAL.inc(result="built")
+        return SharedTranscript(key, _encode_artifacts(video_id))
+
+    transcript = _attach(key)
+    if transcript:
+        SHARED_CACHE_LOOKUPS_TOTAL.inc(result="mapped")
+        return transcript
+
+    SHARED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # One worker parses the artifacts; the others wait and map its file
+    with open(SHARED_CACHE_DIR / f".{video_id}.lock", 'wb') as build_lock:
+        fcntl.flock(build_lock.fileno(), fcntl.LOCK_EX)
+        transcript = _attach(key)
+        if transcript:
+            SHARED_CACHE_LOOKUPS_TOTAL.inc(result="mapped")
+            return transcript
+
+        data = _encode_artifacts(video_id)
+        _evict_shared(len(data))
+        path = SHARED_CACHE_DIR / f"{key}.bin"
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        temp_path.replace(path)
+
+        SHARED_CACHE_LOOKUPS_TOTAL.inc(result="built")
+        logger.info(f"Cached the transcript of {video_id} in shared memory ({len(data)} bytes)")
+        return _attach(key)
+
+
+def _encode_artifacts(video_id: str) -> bytes:
+    # Read directly rather than through load_json_artifact, so no parsed copy stays in this worker
+    return encode_transcript(
+        load_file(get_artifact_path(video_id, "transcription.json")),
+        load_file(get_artifact_path(video_id, "sections.json")),
+    )
+
+
+def _evict_attached():
+    # Caller holds _attached_lock
+    unused = [key for key, transcript in _attached.items() if transcript.refs == 0]
+    for key in unused[:max(0, len(_attached) - SHARED_CACHE_ATTACHED)]:
+        _attached.pop(key).close()
+
+
+def acquire_transcript(video_id: str) -> SharedTranscript:
+    """
+    Get the words and sections of a video from the shared cache, loading them into it on first
+    use. Every call must be paired with release_transcript once the transcript is no longer used.
+
+    Raises:
+        FileNotFoundError: If the video has no transcription or sections
+    """
+    key = _get_cache_key(video_id)
+    with _attached_lock:
+        transcript = _attached.get(key)
+        if transcript:
+            transcript.refs += 1
+            _attached.move_to_end(key)
+            SHARED_CACHE_LOOKUPS_TOTAL.inc(result="attached")
+            return transcript
+
+    loaded = _load(video_id, key)
+    with _attached_lock:
+        transcript = _attached.get(key)
+        if transcript:
+            # Another thread attached it first
+            loaded.close()
+        else:
+            transcript = _attached[key] = loaded
+        transcript.refs += 1
+        _evict_attached()
+    return transcript
+
+
+def release_transcript(transcript: SharedTranscript):
+    with _attached_lock:
+        transcript.refs -= 1
+        _evict_attached()
+
+
+def get_attached_keys() -> List[str]:
+    with _attached_lock:
+        return list(_attached)
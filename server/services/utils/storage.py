@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Any, List, Tuple
+from services.utils.json_utils import load_file
+
+# All per-video artifacts live under DATA_DIR/<video_id>/
+DATA_DIR = Path(os.getenv("VIDLY_DATA_DIR", Path(__file__).parent.parent / "data"))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def get_video_dir(video_id: str) -> Path:
+    """
+    Get the directory holding all artifacts for a video.
+
+    Args:
+        video_id: The YouTube video ID
+
+    Returns:
+        The path to the video's artifact directory
+    """
+    return DATA_DIR / video_id
+
+
+def get_artifact_path(video_id: str, name: str) -> Path:
+    """
+    Get the path of a named artifact (e.g. "transcription.json") for a video.
+    """
+    return get_video_dir(video_id) / name
+
+
+def has_artifact(video_id: str, name: str) -> bool:
+    """
+    Check whether a named artifact has already been generated for a video.
+    """
+    return get_artifact_path(video_id, name).exists()
+
+
+def get_artifact_version(video_id: str, name: str) -> str:
+    """
+    Get an identifier of the current contents of an artifact, derived from its mtime and size.
+    Used for ETags and to detect derived artifacts that are older than their source.
+
+    Raises:
+        FileNotFoundError: If the artifact does not exist
+    """
+    stat = get_artifact_path(video_id, name).stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def find_audio_file(video_id: str) -> Optional[Path]:
+    """
+    Find the downloaded audio file for a video (the extension depends on the source format).
+
+    Returns:
+        The path to the audio file, or None if the audio has not been downloaded
+    """
+    files = sorted(get_video_dir(video_id).glob("audio.*"))
+    # yt-dlp leaves "audio.<ext>.part" files behind for interrupted downloads
+    files = [f for f in files if f.suffix != ".part"]
+    return files[0] if files else None
+
+
+# Parsed JSON artifacts of recently used videos, keyed by path and validated against the file's mtime and size
+ARTIFACT_CACHE_SIZE = int(os.getenv("ARTIFACT_CACHE_SIZE", 16))
+_artifact_cache: "OrderedDict[Path, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+_artifact_cache_lock = threading.Lock()
+
+
+def load_json_artifact(video_id: str, name: str) -> Any:
+    """
+    Load a JSON artifact (e.g. "sections.json"), reusing the parsed data while the file is unchanged.
+    The returned data is shared between callers and must not be modified.
+
+    Raises:
+        FileNotFoundError: If the artifact does not exist
+    """
+    path = get_artifact_path(video_id, name)
+    stat = path.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _artifact_cache_lock:
+        cached = _artifact_cache.get(path)
+        if cached and cached[0] == version:
+            _artifact_cache.move_to_end(path)
+            return cached[1]
+
+    data = load_file(path)
+
+    with _artifact_cache_lock:
+        _artifact_cache[path] = (version, data)
+        _artifact_cache.move_to_end(path)
+        while len(_artifact_cache) > ARTIFACT_CACHE_SIZE:
+            _artifact_cache.popitem(last=False)
+
+    return data
+
+
+def get_recent_video_ids(limit: int) -> List[str]:
+    """
+    Get the IDs of the videos whose artifacts were modified most recently.
+    """
+    video_dirs = [d for d in DATA_DIR.iterdir() if d.is_dir() and len(d.name) == 11]
+    video_dirs.sort(key=lambda d: d.stat().st_mtime, reverse=True)
+    return [d.name for d in video_dirs[:limit]]
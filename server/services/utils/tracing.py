@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import asyncio
+import secrets
+import logging
+import threading
+import contextvars
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Executor
+from functools import partial
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "vidly-server")
+# e.g. http://localhost:4318 for a local OpenTelemetry collector; spans are only kept in memory if unset
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+EXPORT_INTERVAL_SECONDS = 5
+RECENT_SPANS_LIMIT = 1000
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+# Most recent finished spans, for inspection without a collector
+_recent_spans: deque = deque(maxlen=RECENT_SPANS_LIMIT)
+_export_queue: List["Span"] = []
+_export_lock = threading.Lock()
+_exporter_thread: Optional[threading.Thread] = None
+
+
+class Span:
+    """A timed operation within a trace, using OpenTelemetry's ID formats."""
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration_seconds(self) -> float:
+        end_time_ns = self.end_time_ns or time.time_ns()
+        return (end_time_ns - self.start_time_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_ns": self.start_time_ns,
+            "duration_seconds": round(self.duration_seconds, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [_to_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _to_otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def parse_traceparent(traceparent: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse a W3C traceparent header ("00-<trace_id>-<span_id>-<flags>") so that our spans
+    join a trace started by the caller.
+    """
+    if not traceparent:
+        return None
+    parts = traceparent.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return {"trace_id": parts[1], "span_id": parts[2]}
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+@contextmanager
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None):
+    """
+    Start a span as a child of the current span (or of the caller's traceparent,
+    or as the root of a new trace) and make it current for the enclosed block.
+
+    Usage:
+        with start_span("transcribe", {"video_id": video_id}) as span:
+            ...
+    """
+    parent = _current_span.get()
+    remote_parent = parse_traceparent(traceparent) if parent is None else None
+
+    if parent:
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+    elif remote_parent:
+        span = Span(name, remote_parent["trace_id"], remote_parent["span_id"], attributes)
+    else:
+        span = Span(name, secrets.token_hex(16), None, attributes)
+
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_time_ns = time.time_ns()
+        _current_span.reset(token)
+        _finish_span(span)
+
+
+def _finish_span(span: Span):
+    _recent_spans.append(span)
+    if OTLP_ENDPOINT:
+        with _export_lock:
+            _export_queue.append(span)
+        _ensure_exporter()
+
+
+def get_recent_spans(trace_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Get the most recently finished spans, optionally only those of one trace.
+    """
+    spans = [span for span in list(_recent_spans) if trace_id is None or span.trace_id == trace_id]
+    return [span.to_dict() for span in spans[-limit:]]
+
+
+def _ensure_exporter():
+    global _exporter_thread
+    if _exporter_thread is None or not _exporter_thread.is_alive():
+        _exporter_thread = threading.Thread(target=_export_loop, name="otlp-exporter", daemon=True)
+        _exporter_thread.start()
+
+
+def _export_loop():
+    while True:
+        time.sleep(EXPORT_INTERVAL_SECONDS)
+        export_spans()
+
+
+def export_spans():
+    """
+    Send the queued spans to the OTLP/HTTP collector at OTEL_EXPORTER_OTLP_ENDPOINT.
+    """
+    with _export_lock:
+        spans = _export_queue[:]
+        _export_queue.clear()
+
+    if not spans or not OTLP_ENDPOINT:
+        return
+
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_to_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "vidly"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+    request = urllib.request.Request(
+        f"{OTLP_ENDPOINT.rstrip('/')}/v1/traces",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        urllib.request.urlopen(request, timeout=5).close()
+    except Exception as e:
+        logger.warning(f"Could not export {len(spans)} spans to {OTLP_ENDPOINT}: {str(e)}")
+
+
+async def run_in_thread(func, *args, executor: Optional[Executor] = None):
+    """
+    Run a blocking function in a thread pool (the default one unless given), keeping the
+    current span so that spans started inside the function join the same trace.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(context.run, func, *args))
@@ -34,4 +34,12 @@ def extract_youtube_video_id(url: str) -> str:
             return query_params['v'][0]
     
     # If all else fails, return None
-    return None 
\ No newline at end of file
+    return None 
+
+
+def is_valid_youtube_video_id(video_id: str) -> bool:
+    """
+    Check that a video ID has the YouTube format (11 characters of [a-zA-Z0-9_-]).
+    Video IDs are used as directory names, so IDs from requests must be checked before use.
+    """
+    return bool(re.fullmatch(r'[a-zA-Z0-9_-]{11}', video_id))
@@ -5,14 +5,32 @@ import subprocess
 from pathlib import Path
 from typing import Optional
 from services.utils.youtube_utils import extract_youtube_video_id
+from services.utils.storage import DATA_DIR, find_audio_file, get_artifact_path
+from services.utils.caption_utils import (
+    SOURCE_YOUTUBE_CAPTIONS,
+    parse_vtt,
+    cues_to_words,
+    get_caption_quality,
+    is_caption_quality_acceptable,
+    build_transcription,
+)
+from services.utils.metrics import timed_stage, BYTES_TOTAL
+from services.utils.json_utils import dump_file
+from services.utils.tracing import run_in_thread
+from services.utils.admission import admit, get_executor
 logger = logging.getLogger(__name__)
 
-# directory path for where the file is
-root_dir = Path(__file__).parent
-TEMP_DIR = root_dir / "data"
-TEMP_DIR.mkdir(exist_ok=True)
+TEMP_DIR = DATA_DIR
 
+# Whether /videos/extract_audio tries existing subtitles before downloading audio
+USE_YOUTUBE_CAPTIONS = os.getenv("USE_YOUTUBE_CAPTIONS", "false").lower() == "true"
+CAPTION_LANGUAGES = os.getenv("CAPTION_LANGUAGES", "en,en-US,en-GB")
+# Below these thresholds the captions are considered unreliable and we fall back to Deepgram
+CAPTION_MIN_WORDS = int(os.getenv("CAPTION_MIN_WORDS", 20))
+CAPTION_MIN_COVERAGE = float(os.getenv("CAPTION_MIN_COVERAGE", 0.5))
 
+
+@timed_stage("download_audio")
 def _download_audio(youtube_url: str) -> str:
     """
     Internal function to download audio from YouTube using yt-dlp.
@@ -24,6 +42,11 @@ def _download_audio(youtube_url: str) -> str:
         if not video_id:
             raise ValueError("Could not extract video ID from URL")
         
+        existing_audio = find_audio_file(video_id)
+        if existing_audio:
+            logger.info(f"Audio already downloaded: {existing_audio}")
+            return str(existing_audio)
+        
         # Define output path and filename template
         output_path = TEMP_DIR / video_id
         output_template = str(output_path / f"audio.%(ext)s")
@@ -49,6 +72,7 @@ def _download_audio(youtube_url: str) -> str:
         # Use the first matching file (should be only one)
         full_path = downloaded_files[0]
         logger.info(f"Downloaded audio file: {full_path}")
+        BYTES_TOTAL.inc(full_path.stat().st_size, kind="audio_downloaded")
         
         return str(full_path)
     except subprocess.CalledProcessError as e:
@@ -59,6 +83,98 @@ def _download_audio(youtube_url: str) -> str:
         raise
 
 
+@timed_stage("download_captions")
+def _download_captions(youtube_url: str) -> bool:
+    """
+    Internal function to fetch the manual subtitles of a video using yt-dlp (without
+    downloading any media) and convert them into transcription.json.
+    This runs in a separate thread.
+
+    Returns:
+        True if transcription.json was written from the captions
+    """
+    video_id = extract_youtube_video_id(youtube_url)
+
+    if not video_id:
+        raise ValueError("Could not extract video ID from URL")
+
+    transcription_path = get_artifact_path(video_id, "transcription.json")
+    if transcription_path.exists():
+        return True
+
+    output_path = TEMP_DIR / video_id
+    output_template = str(output_path / "captions.%(ext)s")
+
+    cmd = [
+        "yt-dlp",
+        "--skip-download",  # Only fetch the subtitles
+        "--no-simulate",  # Still write the subtitles even though we print the duration
+        "--write-subs",  # Manual subtitles only; auto-generated ones are worse than Deepgram
+        "--sub-langs", CAPTION_LANGUAGES,
+        "--sub-format", "vtt",
+        "--print", "duration",
+        "-o", output_template,
+        youtube_url
+    ]
+
+    try:
+        result = subprocess.run(cmd, text=True, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"yt-dlp could not fetch captions: {e.stderr}")
+        return False
+
+    try:
+        duration = float(result.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        duration = None
+
+    caption_files = sorted(output_path.glob("captions.*.vtt"))
+    if not caption_files:
+        logger.info(f"No manual captions available for video ID: {video_id}")
+        return False
+
+    with open(caption_files[0], 'r', encoding='utf-8') as f:
+        cues = parse_vtt(f.read())
+
+    quality = get_caption_quality(cues, duration)
+    if not is_caption_quality_acceptable(quality, min_words=CAPTION_MIN_WORDS, min_coverage=CAPTION_MIN_COVERAGE):
+        logger.info(f"Captions for video ID {video_id} are below the quality thresholds: {quality}")
+        return False
+
+    transcription = build_transcription(
+        cues_to_words(cues),
+        source=SOURCE_YOUTUBE_CAPTIONS,
+        metadata={
+            'caption_file': caption_files[0].name,
+            'duration': duration,
+            'quality': quality,
+        }
+    )
+
+    dump_file(transcription, transcription_path)
+
+    logger.info(f"Created transcription from captions: {caption_files[0]}")
+    return True
+
+
+async def fetch_youtube_captions(youtube_url: str) -> bool:
+    """
+    Try to create the transcription of a YouTube video from its existing captions,
+    so that the audio download and speech-to-text can be skipped.
+    
+    Args:
+        youtube_url: The URL of the YouTube video
+        
+    Returns:
+        True if the transcription was created from captions, False if the video
+        has no usable captions and must go through Deepgram
+    """
+    logger.info(f"Fetching captions for YouTube URL: {youtube_url}")
+    
+    async with admit("download"):
+        return await run_in_thread(_download_captions, youtube_url, executor=get_executor("download"))
+
+
 async def download_youtube_audio(youtube_url: str) -> str:
     """
     Download the audio from a YouTube video and return the path to the audio file.
@@ -71,9 +187,9 @@ async def download_youtube_audio(youtube_url: str) -> str:
     """
     logger.info(f"Downloading audio from YouTube URL: {youtube_url}")
     
-    # Run the download in a thread pool to avoid blocking the event loop
-    loop = asyncio.get_running_loop()
-    audio_path = await loop.run_in_executor(None, _download_audio, youtube_url)
+    # Run the download in its own thread pool to avoid blocking the event loop
+    async with admit("download"):
+        audio_path = await run_in_thread(_download_audio, youtube_url, executor=get_executor("download"))
     
     logger.info(f"Audio downloaded to: {audio_path}")
     return audio_path
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Tests for priority admission control of the shared LLM, STT and download capacity.
+"""
+
+import asyncio
+import pytest
+import services.utils.admission as admission
+from services.utils.admission import (
+    admit,
+    priority_class,
+    AdmissionRejected,
+    INTERACTIVE,
+    SECTIONING,
+    BATCH,
+    SPECULATIVE,
+)
+from services.utils.metrics import ADMISSION_REJECTED_TOTAL, ADMISSION_QUEUE_WAIT_SECONDS, ADMISSION_PREEMPTED_TOTAL
+
+
+@pytest.fixture
+def small_llm(monkeypatch):
+    # Two LLM slots; batch may use one and queue one
+    monkeypatch.setattr(admission, "RESOURCE_CAPACITY", {**admission.RESOURCE_CAPACITY, "llm": 2})
+    limits = {priority: dict(resources) for priority, resources in admission.CLASS_LIMITS.items()}
+    limits[INTERACTIVE]["llm"] = (2, 10)
+    limits[SECTIONING]["llm"] = (2, 10)
+    limits[BATCH]["llm"] = (1, 1)
+    monkeypatch.setattr(admission, "CLASS_LIMITS", limits)
+    # No slot reserved for interactive calls, except in the test of the reserve
+    monkeypatch.setattr(admission, "INTERACTIVE_RESERVE", {**admission.INTERACTIVE_RESERVE, "llm": 0})
+    monkeypatch.setattr(admission, "_resources", {})
+
+
+async def hold(priority, started, release, name):
+    with priority_class(priority):
+        async with admit("llm"):
+            started.append(name)
+            await release.wait()
+
+
+def test_higher_classes_are_served_first(small_llm):
+    async def run():
+        started = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(SECTIONING, started, release, f"sectioning-{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(BATCH, started, release, "batch")))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(INTERACTIVE, started, release, "interactive")))
+        await asyncio.sleep(0)
+        assert started == ["sectioning-0", "sectioning-1"]
+
+        release.set()
+        await asyncio.gather(*tasks)
+        # The interactive call asked last but is admitted before the batch call
+        return started
+
+    assert asyncio.run(run()) == ["sectioning-0", "sectioning-1", "interactive", "batch"]
+
+
+def test_budgets_only_apply_under_contention(small_llm, monkeypatch):
+    limits = {priority: dict(resources) for priority, resources in admission.CLASS_LIMITS.items()}
+    limits[SECTIONING]["llm"] = (1, 10)
+    monkeypatch.setattr(admission, "CLASS_LIMITS", limits)
+
+    async def run():
+        started = []
+        releases = {name: asyncio.Event() for name in ["sectioning-0", "sectioning-1", "sectioning-2", "batch-0"]}
+        tasks = []
+        for name in ["sectioning-0", "sectioning-1", "batch-0", "sectioning-2"]:
+            priority = BATCH if name.startswith("batch") else SECTIONING
+            tasks.append(asyncio.create_task(hold(priority, started, releases[name], name)))
+            await asyncio.sleep(0)
+        # Nothing else was waiting, so sectioning borrowed the slot beyond its budget of one
+        assert started == ["sectioning-0", "sectioning-1"]
+
+        # The batch queue holds one call; the next is shed with a Retry-After
+        with pytest.raises(AdmissionRejected) as rejected:
+            await hold(BATCH, started, asyncio.Event(), "batch-1")
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) >= 1
+
+        # Under contention the budgets apply: the freed slot goes to batch, which is short of its
+        # budget, rather than to the higher class that is already over its own
+        releases["sectioning-0"].set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert started == ["sectioning-0", "sectioning-1", "batch-0"]
+
+        for release in releases.values():
+            release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    rejected_before = ADMISSION_REJECTED_TOTAL.get(resource="llm", priority=BATCH)
+    assert asyncio.run(run()) == ["sectioning-0", "sectioning-1", "batch-0", "sectioning-2"]
+    assert ADMISSION_REJECTED_TOTAL.get(resource="llm", priority=BATCH) == rejected_before + 1
+    assert ADMISSION_QUEUE_WAIT_SECONDS.get_count(resource="llm", priority=BATCH) >= 1
+
+
+def test_idle_capacity_is_lent_to_batch_work_up_to_the_reserve(small_llm, monkeypatch):
+    monkeypatch.setattr(admission, "RESOURCE_CAPACITY", {**admission.RESOURCE_CAPACITY, "llm": 4})
+    monkeypatch.setattr(admission, "INTERACTIVE_RESERVE", {**admission.INTERACTIVE_RESERVE, "llm": 1})
+    limits = {priority: dict(resources) for priority, resources in admission.CLASS_LIMITS.items()}
+    limits[BATCH]["llm"] = (1, 10)
+    monkeypatch.setattr(admission, "CLASS_LIMITS", limits)
+
+    async def run():
+        started = []
+        release = asyncio.Event()
+        # e.g. a pre-warm run sectioning four videos at once while the server is otherwise idle
+        tasks = [asyncio.create_task(hold(BATCH, started, release, f"batch-{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+        assert started == ["batch-0", "batch-1", "batch-2"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(run()) == ["batch-0", "batch-1", "batch-2", "batch-3"]
+
+
+def test_cancelled_waiters_leave_the_queue(small_llm):
+    async def run():
+        started = []
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(SECTIONING, started, release, f"sectioning-{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(SECTIONING, started, release, "cancelled"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        release.set()
+        await asyncio.gather(*holders)
+        resource = admission._get_resource("llm")
+        return started, resource.in_use, len(resource.waiters[SECTIONING])
+
+    assert asyncio.run(run()) == (["sectioning-0", "sectioning-1"], 0, 0)
+
+
+def test_speculative_calls_are_preempted_by_interactive_calls(small_llm, monkeypatch):
+    limits = {priority: dict(resources) for priority, resources in admission.CLASS_LIMITS.items()}
+    limits[SPECULATIVE]["llm"] = (2, 10)
+    monkeypatch.setattr(admission, "CLASS_LIMITS", limits)
+
+    async def run():
+        started = []
+        release = asyncio.Event()
+        speculative = [asyncio.create_task(hold(SPECULATIVE, started, release, f"speculative-{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(hold(INTERACTIVE, started, release, "interactive"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # One speculative call gave up its slot for the interactive call
+        release.set()
+        await interactive
+        results = await asyncio.gather(*speculative, return_exceptions=True)
+        return started, [isinstance(result, asyncio.CancelledError) for result in results]
+
+    preempted_before = ADMISSION_PREEMPTED_TOTAL.get(resource="llm", priority=SPECULATIVE)
+    started, cancelled = asyncio.run(run())
+    assert started == ["speculative-0", "speculative-1", "interactive"]
+    assert cancelled == [False, True]
+    assert ADMISSION_PREEMPTED_TOTAL.get(resource="llm", priority=SPECULATIVE) == preempted_before + 1
+
+
+def test_lower_classes_leave_the_interactive_reserve_free(small_llm, monkeypatch):
+    monkeypatch.setattr(admission, "RESOURCE_CAPACITY", {**admission.RESOURCE_CAPACITY, "llm": 3})
+    monkeypatch.setattr(admission, "INTERACTIVE_RESERVE", {**admission.INTERACTIVE_RESERVE, "llm": 1})
+    limits = {priority: dict(resources) for priority, resources in admission.CLASS_LIMITS.items()}
+    limits[BATCH]["llm"] = (3, 10)
+    monkeypatch.setattr(admission, "CLASS_LIMITS", limits)
+
+    async def run():
+        started = []
+        release = asyncio.Event()
+        # Within their own budgets, but together they would take every slot
+        tasks = [asyncio.create_task(hold(priority, started, release, priority)) for priority in (SECTIONING, BATCH, BATCH)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(INTERACTIVE, started, release, INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert started == [SECTIONING, BATCH, INTERACTIVE]
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_llm_retries_give_up_the_slot_while_backing_off(small_llm, monkeypatch):
+    import services.llm_service as llm_service
+    monkeypatch.setattr(admission, "RESOURCE_CAPACITY", {**admission.RESOURCE_CAPACITY, "llm": 1})
+    attempts = []
+
+    async def call(messages, *args):
+        attempts.append(messages)
+        if messages == "flaky" and attempts.count("flaky") == 1:
+            raise ConnectionError("temporarily unavailable")
+        return messages
+
+    monkeypatch.setattr(llm_service, "_call_llm_with_instructor", call)
+
+    async def run():
+        with priority_class(SECTIONING):
+            flaky = asyncio.create_task(llm_service.call_llm_with_instructor("flaky", "model", "google"))
+            await asyncio.sleep(0)
+            other = asyncio.create_task(llm_service.call_llm_with_instructor("other", "model", "google"))
+            return await asyncio.gather(flaky, other)
+
+    assert asyncio.run(run()) == ["flaky", "other"]
+    # The waiting call ran during the backoff rather than after the retry
+    assert attempts == ["flaky", "other", "flaky"]
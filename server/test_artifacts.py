@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tests for the summary, actionables and mindmap derived from a video's sections.
+"""
+
+import json
+import asyncio
+import pytest
+import services.utils.storage as storage
+import services.llm_service as llm_service
+import services.artifact_service as artifact_service
+
+ARTIFACTS = {
+    "summary": "A video about testing.",
+    "actionables": ["Write a test"],
+    "mindmap": {"root": "Testing", "branches": [{"title": "Tests", "children": ["Unit", "Integration"]}]},
+}
+
+
+def fake_llm(calls):
+    async def call_llm_with_instructor(messages, model, model_provider, params=None, response_model=None):
+        calls.append({"messages": messages, "fields": list(response_model.model_fields)})
+        output = {name: ARTIFACTS[name] for name in response_model.model_fields if name in ARTIFACTS}
+        if "sections" in response_model.model_fields:
+            output["sections"] = [{"title": "Intro", "start_index": 0, "end_index": 1, "summary": ["point"]}]
+        return response_model(**output)
+    return call_llm_with_instructor
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    video_id = "artifacts01"
+    words = [
+        {"word": f"w{i}", "start": i / 2, "end": i / 2 + 0.4, "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(240)
+    ]
+    (tmp_path / video_id).mkdir()
+    with open(tmp_path / video_id / "transcription.json", "w") as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "", "words": words}]}]}}, f)
+    return video_id
+
+
+def test_artifacts_are_generated_in_the_sectioning_pass(video, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+
+    sections = asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+    assert sections[0]["title"] == "Intro"
+    assert len(calls) == 1
+    assert calls[0]["fields"] == ["sections", "summary", "actionables", "mindmap"]
+    assert '"mindmap"' in calls[0]["messages"][0]["content"]
+
+    # Served from the cache without another call
+    assert asyncio.run(artifact_service.get_derived_artifacts(video)) == ARTIFACTS
+    assert len(calls) == 1
+
+
+def test_missing_artifacts_are_derived_from_the_sections_in_one_call(video, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    monkeypatch.setattr(artifact_service, "DERIVE_IN_SECTIONING_PASS", False)
+    asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+    assert calls[0]["fields"] == ["sections"]
+
+    assert asyncio.run(artifact_service.get_derived_artifacts(video, ["mindmap"])) == {"mindmap": ARTIFACTS["mindmap"]}
+    assert asyncio.run(artifact_service.get_derived_artifacts(video)) == ARTIFACTS
+    # The second call only asked for what was not cached, from the section summaries rather than the transcript
+    assert [call["fields"] for call in calls[1:]] == [["mindmap"], ["summary", "actionables"]]
+    assert "[00:00:00 - 00:00:19] Intro\n- point" in calls[2]["messages"][1]["content"]
+    assert "w1 " not in calls[2]["messages"][1]["content"]
+    assert asyncio.run(artifact_service.get_derived_artifacts(video)) == ARTIFACTS
+    assert len(calls) == 3
+
+
+def test_artifacts_are_regenerated_when_outdated(video, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+    assert artifact_service.load_derived_artifact(video, "summary") == ARTIFACTS["summary"]
+
+    # A new version of one artifact type only regenerates that artifact
+    monkeypatch.setattr(artifact_service.ARTIFACT_TYPES["summary"], "version", 2)
+    assert artifact_service.load_derived_artifact(video, "summary") is None
+    asyncio.run(artifact_service.get_derived_artifacts(video))
+    assert calls[-1]["fields"] == ["summary"]
+
+    # New sections outdate every artifact
+    with open(storage.get_artifact_path(video, "sections.json"), "w") as f:
+        json.dump([{"title": "Other", "start": "00:00:00", "end": "00:01:00", "summary": ["new point"]}], f)
+    assert all(artifact_service.load_derived_artifact(video, name) is None for name in ARTIFACTS)
+
+
+def test_concurrent_requests_derive_once_and_release_the_lock(video, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    monkeypatch.setattr(artifact_service, "DERIVE_IN_SECTIONING_PASS", False)
+    asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+
+    async def get_concurrently():
+        return await asyncio.gather(*[artifact_service.get_derived_artifacts(video) for _ in range(3)])
+
+    assert asyncio.run(get_concurrently()) == [ARTIFACTS] * 3
+    assert len(calls) == 2
+    assert video not in artifact_service._derive_locks
+
+
+def test_a_malformed_artifact_does_not_fail_the_sectioning_call(video, monkeypatch):
+    calls = []
+    fake = fake_llm(calls)
+
+    async def call_llm_with_instructor(messages, model, model_provider, params=None, response_model=None):
+        if "sections" in response_model.model_fields:
+            calls.append({"messages": messages, "fields": list(response_model.model_fields)})
+            return response_model(
+                sections=[{"title": "Intro", "start_index": 0, "end_index": 1, "summary": ["point"]}],
+                summary=ARTIFACTS["summary"], actionables=ARTIFACTS["actionables"], mindmap={"root": "Testing"},
+            )
+        return await fake(messages, model, model_provider, params, response_model)
+
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", call_llm_with_instructor)
+
+    async def run():
+        sections = await llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}")
+        # Only the mindmap is derived again, in the background (it may have finished already)
+        task = artifact_service._tasks.get(video)
+        if task:
+            await task
+        return sections
+
+    assert asyncio.run(run())[0]["title"] == "Intro"
+    assert [call["fields"] for call in calls] == [["sections", "summary", "actionables", "mindmap"], ["mindmap"]]
+    assert artifact_service.load_derived_artifact(video, "mindmap") == ARTIFACTS["mindmap"]
+    assert video not in artifact_service._tasks
+
+
+def test_reading_artifacts_never_calls_the_llm_on_the_request(video, monkeypatch):
+    import main
+    from fastapi import HTTPException
+
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    monkeypatch.setattr(artifact_service, "DERIVE_IN_SECTIONING_PASS", False)
+    asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+
+    async def run():
+        with pytest.raises(HTTPException) as not_ready:
+            await main.get_artifacts(video, None)
+        assert not_ready.value.status_code == 404
+        # Nothing was derived on the request; it runs in the background
+        assert len(calls) == 1
+        await artifact_service._tasks[video]
+        return await main.get_artifacts(video, "summary")
+
+    assert asyncio.run(run()).model_dump(exclude_none=True) == {"video_id": video, "summary": ARTIFACTS["summary"]}
+    assert len(calls) == 2
+
+
+def test_posting_derives_the_artifacts_on_the_request(video, monkeypatch):
+    import main
+
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    monkeypatch.setattr(artifact_service, "DERIVE_IN_SECTIONING_PASS", False)
+    asyncio.run(llm_service.divide_video_into_sections(f"https://www.youtube.com/watch?v={video}"))
+
+    artifacts = asyncio.run(main.derive_artifacts(video, "mindmap"))
+    assert artifacts.model_dump(exclude_none=True) == {"video_id": video, "mindmap": ARTIFACTS["mindmap"]}
+    assert [call["fields"] for call in calls[1:]] == [["mindmap"]]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for running the ingestion pipeline over many videos.
+"""
+
+import json
+import asyncio
+import pytest
+import services.utils.storage as storage
+import services.batch_service as batch_service
+import services.youtube_service as youtube_service
+import services.transcription_service as transcription_service
+import services.llm_service as llm_service
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(batch_service, "BATCH_DIR", tmp_path / "batches")
+    calls = {"extract_audio": [], "transcribe": [], "create_sections": []}
+    in_flight = {stage: 0 for stage in calls}
+    peak = {stage: 0 for stage in calls}
+
+    def stage(name, artifact=None, fail_for=()):
+        async def run(youtube_url):
+            video_id = youtube_url.rsplit("=", 1)[-1]
+            calls[name].append(video_id)
+            in_flight[name] += 1
+            peak[name] = max(peak[name], in_flight[name])
+            try:
+                await asyncio.sleep(0.01)
+                if video_id in fail_for:
+                    raise RuntimeError(f"{name} failed")
+                if artifact:
+                    (tmp_path / video_id).mkdir(exist_ok=True)
+                    with open(tmp_path / video_id / artifact, "w") as f:
+                        json.dump([], f)
+            finally:
+                in_flight[name] -= 1
+        return run
+
+    monkeypatch.setattr(youtube_service, "download_youtube_audio", stage("extract_audio"))
+    monkeypatch.setattr(transcription_service, "transcribe", stage("transcribe", "transcription.json", ["failvideo01"]))
+    monkeypatch.setattr(llm_service, "divide_video_into_sections", stage("create_sections", "sections.json"))
+    return tmp_path, calls, peak
+
+
+def url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def test_each_stage_is_bounded_by_its_own_concurrency(pipeline):
+    _, calls, peak = pipeline
+    video_ids = [f"video{i:06d}" for i in range(12)]
+    concurrency = {"extract_audio": 3, "transcribe": 2, "create_sections": 1}
+
+    report = asyncio.run(batch_service.process_videos([url(video_id) for video_id in video_ids], concurrency=concurrency))
+    assert report.processed == report.total == 12
+    assert all(sorted(calls[stage]) == video_ids for stage in calls)
+    assert peak == concurrency
+
+
+def test_videos_with_sections_are_skipped_and_transcripts_reused(pipeline):
+    data_dir, calls, _ = pipeline
+    for video_id, artifact in [("sectioned01", "sections.json"), ("transcribed", "transcription.json")]:
+        (data_dir / video_id).mkdir()
+        (data_dir / video_id / artifact).write_text("[]")
+
+    # The duplicate URL is processed once
+    urls = [url("sectioned01"), url("transcribed"), url("newvideo001"), url("newvideo001") + "&t=10"]
+    report = asyncio.run(batch_service.process_videos(urls))
+    assert (report.total, report.processed, report.skipped, report.failed) == (3, 2, 1, 0)
+    assert calls["transcribe"] == ["newvideo001"]
+    assert sorted(calls["create_sections"]) == ["newvideo001", "transcribed"]
+
+
+def test_failures_are_reported_with_their_stage(pipeline, monkeypatch):
+    data_dir, calls, _ = pipeline
+
+    async def expand_playlist(playlist_url):
+        raise ValueError("Failed to list playlist videos")
+
+    monkeypatch.setattr(batch_service, "expand_playlist", expand_playlist)
+    report = asyncio.run(batch_service.process_videos(
+        [url("goodvideo01"), url("failvideo01"), "https://example.com/not-a-video"],
+        playlist_url="https://www.youtube.com/playlist?list=broken",
+        batch_id="failures"
+    ))
+    assert (report.total, report.processed, report.failed) == (4, 1, 3)
+    assert report.total == report.processed + report.skipped + report.failed
+    assert sorted((failure.stage, failure.video_id) for failure in report.failures) == [
+        ("resolve", None), ("resolve", None), ("transcribe", "failvideo01")
+    ]
+    assert "failvideo01" not in calls["create_sections"]
+
+    # Saved once the batch completes, for other processes
+    batch_service._batches.pop("failures")
+    saved = batch_service.get_batch_report("failures")
+    assert saved.status == "completed" and saved.failed == 3
+    assert (data_dir / "batches" / "failures.json").exists()
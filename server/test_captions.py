@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for converting YouTube captions into transcription.json.
+"""
+
+from pathlib import Path
+from services.utils.caption_utils import (
+    SOURCE_YOUTUBE_CAPTIONS,
+    parse_vtt,
+    cues_to_words,
+    get_caption_quality,
+    is_caption_quality_acceptable,
+    build_transcription,
+)
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def load_cues(name):
+    with open(TEST_DATA_DIR / name, 'r', encoding='utf-8') as f:
+        return parse_vtt(f.read())
+
+
+def test_parse_manual_captions():
+    cues = load_cues("captions_manual.en.vtt")
+
+    assert len(cues) == 5
+    assert cues[0]['start'] == 0.0
+    assert cues[0]['end'] == 4.0
+    assert cues[0]['text'] == "Welcome back to the channel. Today we are talking about gradient descent."
+    # Styling tags are stripped
+    assert cues[3]['text'] == "the update rule and finally at learning rates."
+
+
+def test_manual_captions_to_words():
+    words = cues_to_words(load_cues("captions_manual.en.vtt"))
+
+    assert words[0]['word'] == "welcome"
+    assert words[4]['punctuated_word'] == "channel."
+    assert words[4]['word'] == "channel"
+    # Words are spread over their cue and stay in order
+    assert all(a['start'] <= b['start'] for a, b in zip(words, words[1:]))
+    assert all(word['start'] < word['end'] for word in words)
+    assert words[-1]['end'] == 20.0
+
+
+def test_auto_captions_use_inline_timestamps():
+    cues = load_cues("captions_auto.en.vtt")
+
+    # Roll-up duplicates are dropped
+    assert [cue['text'] for cue in cues] == ["hi everyone welcome back", "today we talk about caching"]
+
+    words = cues_to_words(cues)
+    assert [word['word'] for word in words] == [
+        "hi", "everyone", "welcome", "back", "today", "we", "talk", "about", "caching"
+    ]
+    assert words[1]['start'] == 0.4
+    assert words[1]['end'] == 0.9
+    assert words[4]['start'] == 2.01
+
+
+def test_caption_quality_thresholds():
+    cues = load_cues("captions_manual.en.vtt")
+
+    quality = get_caption_quality(cues, duration=20)
+    assert quality['coverage'] == 1.0
+    assert is_caption_quality_acceptable(quality)
+
+    # Captions that only cover the first 20 seconds of a 10 minute video fall back to speech-to-text
+    sparse_quality = get_caption_quality(cues, duration=600)
+    assert not is_caption_quality_acceptable(sparse_quality)
+
+    assert not is_caption_quality_acceptable(get_caption_quality(load_cues("captions_auto.en.vtt")))
+
+
+def test_build_transcription_matches_deepgram_structure(tmp_path):
+    from services.llm_service import get_transcript_as_segments_from_words_for_llm
+    import json
+
+    words = cues_to_words(load_cues("captions_manual.en.vtt"))
+    transcription = build_transcription(words)
+
+    assert transcription['metadata']['source'] == SOURCE_YOUTUBE_CAPTIONS
+    alternative = transcription['results']['channels'][0]['alternatives'][0]
+    assert alternative['transcript'].startswith("Welcome back to the channel.")
+
+    transcription_path = tmp_path / "transcription.json"
+    with open(transcription_path, 'w') as f:
+        json.dump(transcription, f)
+
+    segments, llm_input = get_transcript_as_segments_from_words_for_llm(str(transcription_path))
+    assert len(segments) == 2
+    assert llm_input.startswith("0: welcome back to the channel")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the chat websocket: streamed answers, cancellation and conversation history.
+"""
+
+import os
+import json
+import asyncio
+import services.utils.storage as storage
+import services.llm_service as llm_service
+from services.utils.metrics import CHAT_CONNECTIONS, CHAT_TURNS_TOTAL
+
+VIDEO_ID = "chatTest123"
+
+
+def write_artifacts(data_dir):
+    words = [
+        {"word": f"w{i}", "start": float(i), "end": i + 0.5, "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(120)
+    ]
+    sections = [
+        {"title": "First", "start": "00:00:00", "end": "00:00:59", "summary": ["a"]},
+        {"title": "Second", "start": "00:01:00", "end": "00:01:59", "summary": ["b"]},
+    ]
+    video_dir = data_dir / VIDEO_ID
+    video_dir.mkdir(parents=True, exist_ok=True)
+    transcript = " ".join(word["word"] for word in words)
+    with open(video_dir / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]}}, f)
+    with open(video_dir / "sections.json", 'w') as f:
+        json.dump(sections, f)
+
+
+def get_client(tmp_path, monkeypatch, calls):
+    os.environ.setdefault("DEEPGRAM_API_KEY", "test")
+    from fastapi.testclient import TestClient
+    from main import app
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    write_artifacts(tmp_path)
+
+    async def fake_stream_answer(context, question, timestamp_seconds, history):
+        messages = llm_service.build_answer_messages(context, question, timestamp_seconds, history)
+        calls.append(messages)
+        for word in ["Answer", " to", f" {question}"]:
+            # "slow" questions take long enough to be interrupted
+            await asyncio.sleep(1 if question == "slow" else 0)
+            yield word
+
+    monkeypatch.setattr(llm_service, "stream_answer", fake_stream_answer)
+    return TestClient(app)
+
+
+def receive_until(websocket, types):
+    messages = []
+    while True:
+        messages.append(websocket.receive_json())
+        if messages[-1]["type"] in types:
+            return messages
+
+
+def test_chat_streams_answers_with_history(tmp_path, monkeypatch):
+    calls = []
+    client = get_client(tmp_path, monkeypatch, calls)
+
+    with client.websocket_connect(f"/ws/videos/{VIDEO_ID}/chat") as websocket:
+        assert websocket.receive_json() == {"type": "ready", "video_id": VIDEO_ID, "sections": 2}
+        assert CHAT_CONNECTIONS.get() == 1
+
+        websocket.send_json({"type": "question", "id": "1", "question": "first", "position": 75})
+        messages = receive_until(websocket, {"done"})
+        assert [m["text"] for m in messages if m["type"] == "token"] == ["Answer", " to", " first"]
+        assert messages[-1] == {"type": "done", "id": "1", "answer": "Answer to first"}
+
+        # The section in focus follows the playback position, and earlier turns are sent as history
+        websocket.send_json({"type": "question", "id": "2", "question": "second", "timestamp": "00:00:10"})
+        assert receive_until(websocket, {"done"})[-1]["answer"] == "Answer to second"
+
+    assert "w60" in calls[0][2]["content"] and "w10 " not in calls[0][2]["content"]
+    assert "w10" in calls[1][2]["content"]
+    assert "User: first\nAssistant: Answer to first" in calls[1][3]["content"]
+    assert CHAT_CONNECTIONS.get() == 0
+
+
+def test_new_question_cancels_answer_in_progress(tmp_path, monkeypatch):
+    client = get_client(tmp_path, monkeypatch, [])
+    cancelled_before = CHAT_TURNS_TOTAL.get(status="cancelled")
+
+    with client.websocket_connect(f"/ws/videos/{VIDEO_ID}/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "question", "id": "1", "question": "slow", "position": 5})
+        websocket.send_json({"type": "question", "id": "2", "question": "fast", "position": 5})
+
+        messages = receive_until(websocket, {"done"})
+        assert {"type": "cancelled", "id": "1"} in messages
+        assert messages[-1] == {"type": "done", "id": "2", "answer": "Answer to fast"}
+
+        # Positions outside every section are reported without closing the connection
+        websocket.send_json({"type": "question", "id": "3", "question": "fast", "position": 500})
+        error = receive_until(websocket, {"error"})[-1]
+        assert error["id"] == "3" and "Section not found" in error["detail"]
+
+    assert CHAT_TURNS_TOTAL.get(status="cancelled") == cancelled_before + 1
+
+
+def test_chat_requires_sections(tmp_path, monkeypatch):
+    client = get_client(tmp_path, monkeypatch, [])
+    os.remove(tmp_path / VIDEO_ID / "sections.json")
+
+    with client.websocket_connect(f"/ws/videos/{VIDEO_ID}/chat") as websocket:
+        message = websocket.receive()
+        assert message["type"] == "websocket.close" and message["code"] == 4404
+
+
+def test_malformed_messages_are_reported_without_closing_the_connection(tmp_path, monkeypatch):
+    client = get_client(tmp_path, monkeypatch, [])
+
+    with client.websocket_connect(f"/ws/videos/{VIDEO_ID}/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "question", "id": "1", "question": "first", "position": "abc"})
+        error = websocket.receive_json()
+        assert error["type"] == "error" and "position" in error["detail"]
+
+        websocket.send_json({"type": "question", "id": "2", "question": "first", "timestamp": "aa:bb"})
+        assert websocket.receive_json() == {"type": "error", "id": "2", "detail": "Invalid timestamp: aa:bb"}
+
+        websocket.send_text("{not json")
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json(["question"])
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_bytes(b"\x00")
+        assert websocket.receive_json()["type"] == "error"
+
+        # Still answering
+        websocket.send_json({"type": "question", "id": "3", "question": "fast", "position": 5})
+        assert receive_until(websocket, {"done"})[-1]["answer"] == "Answer to fast"
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for reusing transcripts of videos with matching audio fingerprints.
+"""
+
+import json
+import random
+import services.utils.storage as storage
+import services.fingerprint_service as fingerprint_service
+from services.fingerprint_service import FingerprintIndex, ITEM_SECONDS, transcribe_from_fingerprint, get_dedup_stats
+
+
+def random_fingerprint(length, seed):
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(length)]
+
+
+def flip_bits(fingerprint, bit_error_rate, seed):
+    # Re-encoding changes a few bits of the fingerprint
+    rng = random.Random(seed)
+    return [
+        value ^ sum(1 << bit for bit in range(32) if rng.random() < bit_error_rate)
+        for value in fingerprint
+    ]
+
+
+def test_index_matches_duplicates_reencodes_and_clips():
+    original = random_fingerprint(3000, seed=1)
+    index = FingerprintIndex()
+    index.add("original123", original)
+    index.add("unrelated12", random_fingerprint(3000, seed=2))
+
+    exact = index.match(original, exclude_video_id="mirror12345")
+    assert exact["video_id"] == "original123" and exact["offset_seconds"] == 0 and exact["exact"]
+
+    near = index.match(flip_bits(original, 0.06, seed=3))
+    assert near["video_id"] == "original123" and not near["exact"]
+
+    clip = index.match(flip_bits(original[1200:1700], 0.03, seed=4))
+    assert clip["video_id"] == "original123"
+    assert clip["offset_seconds"] == round(1200 * ITEM_SECONDS, 3)
+
+    assert index.match(random_fingerprint(500, seed=5)) is None
+    # A video never matches itself
+    assert index.match(original, exclude_video_id="original123") is None
+
+
+def test_clip_reuses_aligned_transcript(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(fingerprint_service, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(fingerprint_service, "_index", None)
+
+    original = random_fingerprint(3000, seed=1)
+    words = [
+        {"word": f"w{i}", "start": float(i), "end": i + 0.5, "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(int(3000 * ITEM_SECONDS))
+    ]
+    (tmp_path / "original123").mkdir()
+    with open(tmp_path / "original123" / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "", "words": words}]}]}}, f)
+    with open(tmp_path / "original123" / "fingerprint.json", 'w') as f:
+        json.dump({"fingerprint": original}, f)
+
+    clip_start = 808  # About 100 seconds into the original
+    monkeypatch.setattr(fingerprint_service, "compute_fingerprint", lambda path: original[clip_start:clip_start + 400])
+    (tmp_path / "clip1234567").mkdir()
+
+    assert transcribe_from_fingerprint("clip1234567", "audio.webm")
+
+    with open(tmp_path / "clip1234567" / "transcription.json") as f:
+        transcription = json.load(f)
+    clip_words = transcription["results"]["channels"][0]["alternatives"][0]["words"]
+    offset = clip_start * ITEM_SECONDS
+    assert transcription["metadata"]["source"] == "fingerprint_match"
+    assert transcription["metadata"]["match"]["video_id"] == "original123"
+    assert clip_words[0]["word"] == "w100" and abs(clip_words[0]["start"] - (100 - offset)) < 0.01
+    assert clip_words[-1]["start"] < 400 * ITEM_SECONDS
+
+    stats = get_dedup_stats()
+    assert stats["lookups"] == 1 and stats["matches"] == {"clip": 1}
+    assert stats["match_rate"] == 1.0
+    assert stats["saved_stt_minutes"] == round(400 * ITEM_SECONDS / 60, 2)
+
+
+def test_fingerprint_errors_fall_back_to_transcription(tmp_path, monkeypatch):
+    import subprocess
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(fingerprint_service, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(fingerprint_service, "is_fpcalc_available", lambda: True)
+    (tmp_path / "broken12345").mkdir()
+
+    def fpcalc_fails(*args, **kwargs):
+        raise subprocess.CalledProcessError(2, args[0], stderr=b"ERROR: Could not decode audio")
+
+    def fpcalc_prints_garbage(*args, **kwargs):
+        return subprocess.CompletedProcess(args[0], 0, stdout=b"not json")
+
+    for run in [fpcalc_fails, fpcalc_prints_garbage]:
+        monkeypatch.setattr(subprocess, "run", run)
+        assert transcribe_from_fingerprint("broken12345", "audio.webm") is False
+    assert not (tmp_path / "broken12345" / "transcription.json").exists()
+
+
+def test_stats_updates_from_several_workers_are_kept(tmp_path, monkeypatch):
+    import multiprocessing
+    monkeypatch.setattr(fingerprint_service, "DATA_DIR", tmp_path)
+
+    def lookups():
+        for _ in range(25):
+            fingerprint_service._update_stats("miss")
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=lookups) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert get_dedup_stats()["lookups"] == 100
+
+
+def test_transcripts_of_other_workers_are_matched(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(fingerprint_service, "DATA_DIR", tmp_path)
+    # This worker's index is built before the other worker transcribes the original
+    this_worker = FingerprintIndex()
+    this_worker.refresh(tmp_path)
+    monkeypatch.setattr(fingerprint_service, "_index", this_worker)
+
+    other_worker = FingerprintIndex()
+    original = random_fingerprint(2000, seed=3)
+    (tmp_path / "original456").mkdir()
+    with open(tmp_path / "original456" / "fingerprint.json", 'w') as f:
+        json.dump({"fingerprint": original}, f)
+    with open(tmp_path / "original456" / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "", "words": []}]}]}}, f)
+    other_worker.add("original456", original)
+    # Fingerprinted but not transcribed yet: not a match candidate
+    (tmp_path / "pending1234").mkdir()
+    with open(tmp_path / "pending1234" / "fingerprint.json", 'w') as f:
+        json.dump({"fingerprint": random_fingerprint(2000, seed=4)}, f)
+
+    monkeypatch.setattr(fingerprint_service, "compute_fingerprint", lambda path: flip_bits(original, 0.01, seed=5))
+    (tmp_path / "reupload123").mkdir()
+    assert transcribe_from_fingerprint("reupload123", "audio.webm")
+    assert this_worker.video_ids == ["original456"]
+    # The re-upload now has a transcript too
+    assert this_worker.refresh(tmp_path) == 1 and this_worker.refresh(tmp_path) == 0
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for speculative precomputation of per-section insights.
+"""
+
+import json
+import asyncio
+import services.utils.storage as storage
+import services.llm_service as llm_service
+import services.insights_service as insights_service
+from services.models import SectionInsightsLLM, SuggestedQuestion
+
+VIDEO_ID = "insightTest"
+YOUTUBE_URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+
+def write_artifacts(data_dir, section_count=3):
+    words = [
+        {"word": f"w{i}", "start": float(i), "end": i + 0.5, "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(section_count * 60)
+    ]
+    sections = [
+        {"title": f"Part {i}", "start": f"00:{i:02d}:00", "end": f"00:{i:02d}:59", "summary": [f"point {i}"]}
+        for i in range(section_count)
+    ]
+    video_dir = data_dir / VIDEO_ID
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "", "words": words}]}]}}, f)
+    with open(video_dir / "sections.json", 'w') as f:
+        json.dump(sections, f)
+
+
+def fake_llm(calls, pause_after=None):
+    async def call_llm_with_instructor(messages, model, model_provider, params=None, response_model=None):
+        if response_model is not SectionInsightsLLM:
+            calls.append("answer")
+            return llm_service.AnswerQuestionLLM(response="from the LLM")
+        calls.append(messages[1]["content"].splitlines()[0])
+        if pause_after is not None and len(calls) > pause_after:
+            # Preempted by an interactive request
+            raise asyncio.CancelledError()
+        title = messages[1]["content"].splitlines()[0].removeprefix("Section title: ")
+        return SectionInsightsLLM(
+            expanded_summary=f"About {title}",
+            takeaways=[f"{title} matters"],
+            suggested_questions=[SuggestedQuestion(question="What is this part about?", answer=f"It is about {title}")],
+        )
+    return call_llm_with_instructor
+
+
+def test_insights_resume_after_preemption_and_answer_instantly(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    write_artifacts(tmp_path)
+    calls = []
+
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls, pause_after=1))
+    try:
+        asyncio.run(insights_service.generate_section_insights(VIDEO_ID))
+    except asyncio.CancelledError:
+        pass
+    insights = insights_service.get_insights(VIDEO_ID)
+    assert insights["status"] == "paused"
+    assert [section["index"] for section in insights["sections"]] == [0]
+
+    # Resuming skips the sections that are already done
+    calls.clear()
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    insights = asyncio.run(insights_service.generate_section_insights(VIDEO_ID))
+    assert calls == ["Section title: Part 1", "Section title: Part 2"]
+    assert insights.status == "completed"
+    assert insights.sections[2].expanded_summary == "About Part 2"
+    assert insights.estimated_tokens > 0
+
+    # A suggested question is answered without calling the LLM; anything else still is
+    calls.clear()
+    answer = asyncio.run(llm_service.answer_question(YOUTUBE_URL, "what is this part about", "00:01:30"))
+    assert answer == "It is about Part 1"
+    assert calls == []
+    assert asyncio.run(llm_service.answer_question(YOUTUBE_URL, "Who is speaking?", "00:01:30")) == "from the LLM"
+
+
+def test_insights_budget_per_video(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(insights_service, "INSIGHTS_MAX_SECTIONS", 2)
+    write_artifacts(tmp_path)
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+
+    insights = asyncio.run(insights_service.generate_section_insights(VIDEO_ID))
+
+    assert len(calls) == 2
+    assert insights.status == "budget_exhausted"
+
+    # Nothing is scheduled for videos that used up their budget
+    monkeypatch.setattr(insights_service, "PRECOMPUTE_INSIGHTS", True)
+
+    async def schedule():
+        return insights_service.schedule_section_insights(VIDEO_ID)
+
+    assert asyncio.run(schedule()) is None
+
+
+def test_insights_failures_are_charged_and_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(insights_service, "INSIGHTS_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(insights_service, "PRECOMPUTE_INSIGHTS", True)
+    write_artifacts(tmp_path)
+
+    async def failing_llm(messages, model, model_provider, params=None, response_model=None):
+        raise ValueError("quota exceeded")
+
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", failing_llm)
+
+    async def schedule_and_wait():
+        task = insights_service.schedule_section_insights(VIDEO_ID)
+        if task:
+            await task
+        return task
+
+    assert asyncio.run(schedule_and_wait()) is not None
+    insights = insights_service.get_insights(VIDEO_ID)
+    assert insights["status"] == "failed" and insights["attempts"] == 1
+    # The prompt of the failed call counts toward the budget
+    assert insights["estimated_tokens"] > 0
+
+    assert asyncio.run(schedule_and_wait()) is not None
+    assert insights_service.get_insights(VIDEO_ID)["attempts"] == 2
+    # Given up: requesting the insights again does not retry
+    assert asyncio.run(schedule_and_wait()) is None
+
+    # Re-sectioning the video discards the insights and starts over
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    write_artifacts(tmp_path, section_count=2)
+    assert insights_service.get_insights(VIDEO_ID) is None
+    assert asyncio.run(schedule_and_wait()) is not None
+    insights = insights_service.get_insights(VIDEO_ID)
+    assert insights["status"] == "completed" and insights["attempts"] == 0
+    assert [section["title"] for section in insights["sections"]] == ["Part 0", "Part 1"]
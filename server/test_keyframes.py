@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for the keyframes extracted at section boundaries and attached to questions.
+"""
+
+import json
+import asyncio
+import pytest
+import services.utils.storage as storage
+import services.utils.shared_cache as shared_cache
+import services.keyframe_service as keyframe_service
+import services.llm_service as llm_service
+
+SECTIONS = [
+    {"title": "Intro", "start": "00:00:00", "end": "00:00:59", "summary": ["point"]},
+    {"title": "Middle", "start": "00:01:00", "end": "00:01:04", "summary": ["point"]},
+    {"title": "Details", "start": "00:01:05", "end": "00:10:00", "summary": ["point"]},
+]
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path / "data")
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_DIR", tmp_path / "shm")
+    video_id = "keyframes01"
+    video_dir = tmp_path / "data" / video_id
+    video_dir.mkdir(parents=True)
+    words = [{"word": f"w{i}", "start": i, "end": i + 0.5, "confidence": 0.9, "punctuated_word": f"w{i}"} for i in range(600)]
+    with open(video_dir / "transcription.json", "w") as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "", "words": words}]}]}}, f)
+    with open(video_dir / "sections.json", "w") as f:
+        json.dump(SECTIONS, f)
+    return video_id
+
+
+def test_only_the_video_around_section_boundaries_is_decoded():
+    boundaries = keyframe_service.get_boundaries(SECTIONS)
+    assert boundaries == [0, 60, 65]
+    # The windows of the two close boundaries are merged
+    assert keyframe_service.get_windows(boundaries, 10) == [(0.0, 10.0, 1), (50.0, 75.0, 2)]
+    stderr = (
+        "[Parsed_showinfo_2 @ 0x1] n:   0 pts:      0 pts_time:0       duration:512\n"
+        "[Parsed_showinfo_2 @ 0x1] n:   1 pts:  55296 pts_time:4.32    duration:512\n"
+    )
+    assert keyframe_service.parse_showinfo(stderr) == [0.0, 4.32]
+
+
+def test_keyframes_are_extracted_once_per_window(video, monkeypatch):
+    downloaded = storage.get_video_dir(video) / "video_lowres.mp4"
+    windows = []
+
+    def download(youtube_url, video_id):
+        downloaded.write_bytes(b"video")
+        return downloaded
+
+    def extract_window(video_path, start, end, max_frames):
+        windows.append((start, end, max_frames))
+        # The first frame of the window and a scene change 0.5s later, dropped as too close
+        return [(start, b"first"), (start + 0.5, b"close"), (start + 5, b"scene")]
+
+    monkeypatch.setattr(keyframe_service, "is_ffmpeg_available", lambda: True)
+    monkeypatch.setattr(keyframe_service, "_download_lowres_video", download)
+    monkeypatch.setattr(keyframe_service, "_extract_window", extract_window)
+    monkeypatch.setattr(keyframe_service, "KEYFRAME_WINDOW_SECONDS", 10)
+
+    index = keyframe_service.extract_keyframes(f"https://www.youtube.com/watch?v={video}")
+    assert windows == [(0.0, 10.0, 3), (50.0, 75.0, 6)]
+    assert index["timestamps"] == [0.0, 5.0, 50.0, 55.0]
+    assert index["files"][1] == "000005000.jpg"
+    assert (storage.get_video_dir(video) / "keyframes" / "000055000.jpg").read_bytes() == b"scene"
+    assert not downloaded.exists()
+    assert keyframe_service.is_keyframe_index_current(video)
+
+
+def test_questions_get_the_nearest_keyframes_of_their_section(video):
+    frames_dir = storage.get_video_dir(video) / "keyframes"
+    frames_dir.mkdir()
+    timestamps = [0.0, 5.0, 58.0, 61.0, 66.0, 120.0, 300.0]
+    files = [f"{round(t * 1000):09d}.jpg" for t in timestamps]
+    for name in files:
+        (frames_dir / name).write_bytes(name.encode())
+    with open(storage.get_artifact_path(video, "keyframes.json"), "w") as f:
+        json.dump({"sections_version": "", "timestamps": timestamps, "files": files}, f)
+
+    nearest = keyframe_service.get_nearest_keyframes(video, 100, limit=2)
+    assert [t for t, _ in nearest] == [66.0, 120.0]
+    # Limited to the section in focus
+    assert [t for t, _ in keyframe_service.get_nearest_keyframes(video, 62, limit=3, start=60, end=64)] == [61.0]
+    assert keyframe_service.get_nearest_keyframes("nokeyframes", 10) == []
+
+    context = llm_service.load_video_context(video)
+    try:
+        _, messages = asyncio.run(llm_service.plan_answer_messages(context, "What is shown here?", 130))
+    finally:
+        context.close()
+    frames_message = messages[-2]["content"]
+    assert frames_message[1:] == [
+        "[00:01:06]", {"mime_type": "image/jpeg", "data": b"000066000.jpg"},
+        "[00:02:00]", {"mime_type": "image/jpeg", "data": b"000120000.jpg"},
+    ]
+    assert messages[-1]["content"].endswith("What is shown here?")
+    assert llm_service._to_gemini_contents(messages)[1][-2]["parts"] == frames_message
+
+
+def test_stuck_ffmpeg_fails_the_extraction(video, monkeypatch):
+    import subprocess
+    downloaded = storage.get_video_dir(video) / "video_lowres.mp4"
+
+    def download(youtube_url, video_id):
+        downloaded.write_bytes(b"video")
+        return downloaded
+
+    def stuck(cmd, **kwargs):
+        assert kwargs["timeout"] == keyframe_service.KEYFRAME_FFMPEG_TIMEOUT_SECONDS
+        raise subprocess.TimeoutExpired(cmd, kwargs["timeout"])
+
+    monkeypatch.setattr(keyframe_service, "is_ffmpeg_available", lambda: True)
+    monkeypatch.setattr(keyframe_service, "_download_lowres_video", download)
+    monkeypatch.setattr(subprocess, "run", stuck)
+
+    with pytest.raises(ValueError, match="took longer than"):
+        keyframe_service.extract_keyframes(f"https://www.youtube.com/watch?v={video}")
+    assert not downloaded.exists()
+    assert not keyframe_service.is_keyframe_index_current(video)
+
+
+def test_the_download_slot_is_released_before_decoding(video, monkeypatch):
+    import services.utils.admission as admission
+    monkeypatch.setattr(admission, "_resources", {})
+    downloaded = storage.get_video_dir(video) / "video_lowres.mp4"
+    slots_in_use = []
+
+    def download(youtube_url, video_id):
+        slots_in_use.append(admission._get_resource("download").in_use)
+        downloaded.write_bytes(b"video")
+        return downloaded
+
+    def extract_window(video_path, start, end, max_frames):
+        slots_in_use.append(admission._get_resource("download").in_use)
+        return [(start, b"first")]
+
+    monkeypatch.setattr(keyframe_service, "is_ffmpeg_available", lambda: True)
+    monkeypatch.setattr(keyframe_service, "_download_lowres_video", download)
+    monkeypatch.setattr(keyframe_service, "_extract_window", extract_window)
+    # Threads of the test's own loop, which are shut down with it
+    monkeypatch.setattr(keyframe_service, "get_executor", lambda resource: None)
+    monkeypatch.setattr(keyframe_service, "_get_decode_executor", lambda: None)
+
+    index = asyncio.run(keyframe_service.create_keyframes(f"https://www.youtube.com/watch?v={video}"))
+    assert index["timestamps"] == [0.0, 50.0]
+    # Held while downloading only
+    assert slots_in_use == [1, 0, 0]
+    assert not downloaded.exists()
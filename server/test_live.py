@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Tests for live transcription against a local stand-in for the Deepgram live API
+that replays a recorded transcript, one result per audio chunk received.
+"""
+
+import json
+import asyncio
+from pathlib import Path
+import websockets
+import services.utils.storage as storage
+from services.live_service import LiveSession
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+VIDEO_URL = "https://www.youtube.com/watch?v=liveTest123"
+
+
+def load_recorded_results():
+    with open(TEST_DATA_DIR / "live_transcript.json", 'r') as f:
+        return json.load(f)
+
+
+async def replay_server(results):
+    """
+    Start a websocket server that answers every audio chunk with the next recorded result.
+    """
+    remaining = list(results)
+
+    async def handler(websocket):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                if remaining:
+                    await websocket.send(json.dumps(remaining.pop(0)))
+            elif json.loads(message).get("type") == "CloseStream":
+                await websocket.close()
+                return
+
+    return await websockets.serve(handler, "127.0.0.1", 0)
+
+
+async def audio_chunks(count):
+    for _ in range(count):
+        yield b"\x00" * 1024
+        await asyncio.sleep(0.01)
+
+
+def run_session(tmp_path, monkeypatch, resection_interval):
+    from deepgram import DeepgramClient, DeepgramClientOptions
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    results = load_recorded_results()
+    sectioner_calls = []
+
+    async def fake_sectioner(words):
+        # One section per 20 seconds of the words we are given, like an LLM splitting by topic
+        sectioner_calls.append(words)
+        sections = []
+        start = words[0]['start']
+        while start <= words[-1]['start']:
+            section_words = [word for word in words if start <= word['start'] < start + 20]
+            if section_words:
+                sections.append({
+                    "title": f"Part starting at {int(start)}s",
+                    "summary": [" ".join(word['word'] for word in section_words[:5])],
+                    "start": f"00:00:{int(section_words[0]['start']):02d}",
+                    "end": f"00:00:{int(section_words[-1]['end']):02d}",
+                })
+            start += 20
+        return sections
+
+    async def main():
+        server = await replay_server(results)
+        port = server.sockets[0].getsockname()[1]
+        client = DeepgramClient("test", DeepgramClientOptions(url=f"ws://127.0.0.1:{port}"))
+
+        session = LiveSession(
+            VIDEO_URL,
+            audio_source=audio_chunks(len(results)),
+            sectioner=fake_sectioner,
+            deepgram_client=client,
+            resection_interval=resection_interval,
+        )
+        updates = session.subscribe()
+        session.start()
+        await session.wait()
+        server.close()
+
+        messages = []
+        while not updates.empty():
+            messages.append(updates.get_nowait())
+        return session, messages
+
+    session, messages = asyncio.run(main())
+    return session, messages, sectioner_calls, results
+
+
+def test_live_session_appends_final_words(tmp_path, monkeypatch):
+    session, messages, _, results = run_session(tmp_path, monkeypatch, resection_interval=1000)
+
+    final_words = [word for result in results if result["is_final"] for word in result["channel"]["alternatives"][0]["words"]]
+    assert session.status == "completed"
+    # Interim results are ignored, so no word is duplicated
+    assert [word['word'] for word in session.words] == [word['word'] for word in final_words]
+
+    assert messages[0]["type"] == "snapshot"
+    assert any(message["type"] == "words" for message in messages)
+    assert messages[-1] == {"type": "status", "status": "completed", "error": None}
+
+
+def test_live_session_only_resections_the_tail(tmp_path, monkeypatch):
+    session, messages, sectioner_calls, _ = run_session(tmp_path, monkeypatch, resection_interval=15)
+
+    assert len(sectioner_calls) >= 3
+    # After the first call, the words before the last stable section are never sent again
+    for previous, current in zip(sectioner_calls, sectioner_calls[1:]):
+        assert current[0]['start'] > previous[0]['start'] or len(current) > len(previous)
+    assert sectioner_calls[-1][0]['start'] > 0
+    assert len(sectioner_calls[-1]) < len(session.words)
+
+    # Sections cover the whole stream and stay in order
+    starts = [section['start'] for section in session.sections]
+    assert starts == sorted(starts)
+    assert len(session.sections) == 4
+    assert any(message["type"] == "sections" for message in messages)
+
+
+def test_live_session_saves_artifacts(tmp_path, monkeypatch):
+    session, _, _, _ = run_session(tmp_path, monkeypatch, resection_interval=15)
+
+    with open(tmp_path / session.video_id / "transcription.json", 'r') as f:
+        transcription = json.load(f)
+    assert transcription['metadata']['source'] == "deepgram_live"
+    assert len(transcription['results']['channels'][0]['alternatives'][0]['words']) == len(session.words)
+
+    with open(tmp_path / session.video_id / "sections.json", 'r') as f:
+        assert json.load(f) == session.sections
+
+
+def make_words(start, end):
+    return [
+        {"word": f"w{t}", "start": t, "end": t + 0.5, "confidence": 0.9, "punctuated_word": f"w{t}"}
+        for t in range(start, end)
+    ]
+
+
+def test_stopping_a_session_cancels_its_sectioning(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    sectioning = {"started": False, "cancelled": False}
+
+    async def slow_sectioner(words):
+        sectioning["started"] = True
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            sectioning["cancelled"] = True
+            raise
+        return []
+
+    async def main():
+        session = LiveSession(VIDEO_URL, sectioner=slow_sectioner, resection_interval=10)
+        session.add_words(make_words(0, 20))
+        await asyncio.sleep(0)
+        await session.stop()
+        return session
+
+    session = asyncio.run(main())
+    assert sectioning == {"started": True, "cancelled": True}
+    assert session._sectioning_task.done()
+
+
+def test_followers_that_fall_behind_are_dropped(monkeypatch):
+    import services.live_service as live_service
+    monkeypatch.setattr(live_service, "LIVE_SUBSCRIBER_QUEUE_SIZE", 3)
+
+    async def main():
+        session = LiveSession(VIDEO_URL, resection_interval=1000)
+        stalled = session.subscribe()
+        following = session.subscribe()
+        for second in range(4):
+            session.add_words(make_words(second, second + 1))
+            # Only this follower keeps up
+            while not following.empty():
+                following.get_nowait()
+        return session, stalled, following
+
+    session, stalled, following = asyncio.run(main())
+    assert session._subscribers == {following}
+    assert stalled.qsize() == 1 and stalled.get_nowait()["type"] == "error"
+
+
+def test_the_tail_starts_exactly_at_the_last_section(monkeypatch):
+    import services.llm_service as llm_service
+    from services.models import VideoSectionsLLM
+
+    async def call_llm_with_instructor(messages, model, model_provider, params=None, response_model=None):
+        # Two sections: segments 0-1 and 2-3 (segments are 10 seconds long)
+        return VideoSectionsLLM(sections=[
+            {"title": "First", "start_index": 0, "end_index": 1, "summary": ["point"]},
+            {"title": "Second", "start_index": 2, "end_index": 3, "summary": ["point"]},
+        ])
+
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", call_llm_with_instructor)
+    # One word every 0.6 seconds from 0.5s, so the second section starts at 20.9s and the word
+    # at 20.3s belongs to the first section although it is past the rounded start of the second
+    words = [
+        {"word": f"w{i}", "start": round(0.5 + 0.6 * i, 1), "end": round(0.8 + 0.6 * i, 1), "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(57)
+    ]
+
+    async def main():
+        session = LiveSession(VIDEO_URL, resection_interval=1000)
+        session.words = words
+        await session.resection_tail()
+        return session
+
+    session = asyncio.run(main())
+    assert session.tail_start == 20.9
+    assert [section["start"] for section in session.sections] == ["00:00:00", "00:00:20"]
+    assert all("start_seconds" not in section for section in session.sections)
+    tail = [word for word in session.words if word['start'] >= session.tail_start]
+    assert tail[0]['start'] == 20.9
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus metrics, the trace spans and the middleware that records both.
+"""
+
+import os
+import time
+import asyncio
+import pytest
+import services.utils.metrics as metrics
+import services.utils.tracing as tracing
+from services.utils.metrics import Counter, Gauge, Histogram, render_metrics, timed_stage, STAGE_DURATION, HTTP_REQUEST_DURATION
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Metrics created by a test are not rendered by the others
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+
+def test_metrics_render_in_the_prometheus_text_format(registry):
+    counter = Counter("test_bytes_total", "Bytes", ["kind"])
+    counter.inc(10, kind="audio")
+    counter.inc(5, kind="audio")
+    counter.inc(kind='say "hi"\n')
+    gauge = Gauge("test_in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    histogram = Histogram("test_seconds", "Latency", ["stage"], buckets=(0.1, 1))
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, stage="transcribe")
+
+    assert counter.get(kind="audio") == 15 and gauge.get() == 1 and histogram.get_count(stage="transcribe") == 4
+    assert render_metrics() == "\n".join([
+        "# HELP test_bytes_total Bytes",
+        "# TYPE test_bytes_total counter",
+        'test_bytes_total{kind="audio"} 15',
+        'test_bytes_total{kind="say \\"hi\\"\\n"} 1',
+        "",
+        "# HELP test_in_flight In flight",
+        "# TYPE test_in_flight gauge",
+        "test_in_flight 1",
+        "",
+        "# HELP test_seconds Latency",
+        "# TYPE test_seconds histogram",
+        # Buckets are cumulative and include values equal to their bound
+        'test_seconds_bucket{stage="transcribe",le="0.1"} 2',
+        'test_seconds_bucket{stage="transcribe",le="1"} 3',
+        'test_seconds_bucket{stage="transcribe",le="+Inf"} 4',
+        'test_seconds_sum{stage="transcribe"} 3.65',
+        'test_seconds_count{stage="transcribe"} 4',
+    ]) + "\n"
+
+
+def test_timed_stage_records_latency_status_and_spans():
+    @timed_stage("test_sync_stage")
+    def sync_stage(fail):
+        if fail:
+            raise ValueError("failed")
+
+    @timed_stage("test_async_stage")
+    async def async_stage():
+        with tracing.start_span("inner"):
+            await asyncio.sleep(0)
+
+    sync_stage(False)
+    with pytest.raises(ValueError):
+        sync_stage(True)
+    asyncio.run(async_stage())
+
+    assert STAGE_DURATION.get_count(stage="test_sync_stage", status="ok") == 1
+    assert STAGE_DURATION.get_count(stage="test_sync_stage", status="error") == 1
+    assert STAGE_DURATION.get_count(stage="test_async_stage", status="ok") == 1
+    spans = {span["name"]: span for span in tracing.get_recent_spans()[-2:]}
+    assert spans["inner"]["parent_span_id"] == spans["test_async_stage"]["span_id"]
+    assert spans["inner"]["trace_id"] == spans["test_async_stage"]["trace_id"]
+
+
+def test_middleware_labels_requests_by_route_and_continues_traces():
+    os.environ.setdefault("DEEPGRAM_API_KEY", "test")
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    before = HTTP_REQUEST_DURATION.get_count(method="GET", endpoint="/videos/{video_id}/sections", status="404")
+    trace_id = "0af7651916cd43dd8448eb211c80319c"
+    response = client.get("/videos/nosections1/sections", headers={"traceparent": f"00-{trace_id}-b7ad6b7169203331-01"})
+    assert response.status_code == 404
+    # Labelled by the route template rather than the path
+    assert HTTP_REQUEST_DURATION.get_count(method="GET", endpoint="/videos/{video_id}/sections", status="404") == before + 1
+    assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+    root = [span for span in tracing.get_recent_spans(trace_id) if span["name"] == "GET /videos/{video_id}/sections"]
+    assert root[0]["parent_span_id"] == "b7ad6b7169203331" and root[0]["attributes"]["http.status_code"] == 404
+
+    body = client.get("/metrics").text
+    assert '# TYPE vidly_http_request_duration_seconds histogram' in body
+    assert 'vidly_http_request_duration_seconds_count{method="GET",endpoint="/videos/{video_id}/sections",status="404"}' in body
+
+
+def test_deepgram_upload_and_processing_are_timed_separately():
+    import httpx
+    from services.transcription_service import get_upload_timing_transport_class
+
+    class Deepgram(httpx.BaseTransport):
+        def handle_request(self, request):
+            # Sent like a connection would, then processed
+            assert b"".join(request.stream) == b"a" * 1000
+            time.sleep(0.05)
+            return httpx.Response(200, json={"results": {}})
+
+    transport = get_upload_timing_transport_class()(Deepgram())
+    with tracing.start_span("deepgram_request") as request_span:
+        with httpx.Client(transport=transport) as client:
+            assert client.post("https://api.deepgram.com/v1/listen", content=b"a" * 1000).json() == {"results": {}}
+
+    spans = {span["name"]: span for span in tracing.get_recent_spans(request_span.trace_id)}
+    upload, processing = spans["deepgram_upload"], spans["deepgram_processing"]
+    assert upload["parent_span_id"] == processing["parent_span_id"] == request_span.span_id
+    assert upload["attributes"]["bytes"] == 1000
+    assert upload["start_time_ns"] + upload["duration_seconds"] * 1e9 <= processing["start_time_ns"] + 1e3
+    assert processing["duration_seconds"] >= 0.05 > upload["duration_seconds"]
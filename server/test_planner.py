@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the planner that picks the model and strategy of LLM calls from the transcript size.
+"""
+
+import asyncio
+import services.utils.storage as storage
+import services.utils.llm_planner as llm_planner
+import services.llm_service as llm_service
+from services.models import VideoSectionsLLM, AnswerQuestionLLM
+
+
+def make_words(duration_seconds):
+    # Two words per second
+    return [
+        {"word": f"w{i}", "start": i / 2, "end": i / 2 + 0.4, "confidence": 0.9, "punctuated_word": f"w{i}"}
+        for i in range(int(duration_seconds * 2))
+    ]
+
+
+def fake_llm(calls):
+    async def call_llm_with_instructor(messages, model, model_provider, params=None, response_model=None):
+        calls.append({"model": model, "max_tokens": params["max_tokens"], "messages": messages})
+        if response_model is AnswerQuestionLLM:
+            return AnswerQuestionLLM(response="answer")
+        segment_count = len(messages[1]["content"].split("\n\n", 1)[1].splitlines())
+        # One section per 18 segments (3 minutes)
+        return VideoSectionsLLM(sections=[
+            {"title": f"Section {start}", "start_index": start, "end_index": min(start + 17, segment_count - 1), "summary": ["point"]}
+            for start in range(0, segment_count, 18)
+        ])
+    return call_llm_with_instructor
+
+
+def test_short_videos_are_sectioned_directly_with_the_small_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    segments, llm_input = llm_service.get_segments_from_words(make_words(120))
+
+    plan = llm_planner.plan_sections(segments, llm_input)
+
+    assert plan["strategy"] == llm_planner.DIRECT
+    assert plan["model"] == llm_planner.SMALL_MODEL
+    assert plan["windows"] == [(0, len(segments))]
+    assert plan["max_tokens"] == 1024
+
+
+def test_long_videos_are_sectioned_in_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+    segments, llm_input = llm_service.get_segments_from_words(make_words(5 * 3600))
+
+    plan = llm_planner.plan_sections(segments, llm_input)
+    assert plan["strategy"] == llm_planner.WINDOWED
+    assert plan["model"] == llm_planner.LARGE_MODEL
+    assert plan["windows"][0][0] == 0 and plan["windows"][-1][1] == len(segments)
+    assert all(previous[1] == following[0] for previous, following in zip(plan["windows"], plan["windows"][1:]))
+
+    sections, derived = asyncio.run(llm_service.create_planned_sections(segments, llm_input, "plannerTest"))
+
+    # Every window is numbered from 0 and mapped back to its own part of the video
+    assert len(calls) == len(plan["windows"])
+    assert all(call["messages"][1]["content"].split("\n\n", 1)[1].startswith("0: ") for call in calls)
+    assert sections[0]["start"] == "00:00:00"
+    assert sections[-1]["end"] == "04:59:59"
+    assert [section["start"] for section in sections] == sorted(section["start"] for section in sections)
+    assert derived == {}
+
+    recorded = llm_planner.load_plans()
+    assert recorded[-1]["strategy"] == llm_planner.WINDOWED
+    assert recorded[-1]["windows"] == len(plan["windows"])
+    assert recorded[-1]["status"] == "ok"
+
+
+def test_answers_for_long_transcripts_only_send_the_section_and_an_outline(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    calls = []
+    monkeypatch.setattr(llm_service, "call_llm_with_instructor", fake_llm(calls))
+
+    def answer(video_id, duration_seconds):
+        words = make_words(duration_seconds)
+        transcription = {"results": {"channels": [{"alternatives": [
+            {"transcript": " ".join(word["word"] for word in words), "words": words}
+        ]}]}}
+        sections = [{"title": "Intro", "start": "00:00:00", "end": "00:00:59", "summary": ["hello"]},
+                    {"title": "Rest", "start": "00:01:00", "end": "23:59:59", "summary": ["more"]}]
+        (tmp_path / video_id).mkdir()
+        llm_service.dump_file(transcription, storage.get_artifact_path(video_id, "transcription.json"))
+        llm_service.dump_file(sections, storage.get_artifact_path(video_id, "sections.json"))
+        return asyncio.run(llm_service.answer_question(f"https://www.youtube.com/watch?v={video_id}", "What?", "00:00:30"))
+
+    assert answer("shortVideo1", 300) == "answer"
+    assert calls[-1]["model"] == llm_planner.SMALL_MODEL
+    assert calls[-1]["max_tokens"] == llm_planner.ANSWER_MAX_TOKENS
+    assert calls[-1]["messages"][1]["content"].startswith("Here is the transcript of the video: w0 w1")
+
+    assert answer("longVideo01", 4 * 3600) == "answer"
+    transcript_message = calls[-1]["messages"][1]["content"]
+    assert "outline" in transcript_message and "[00:01:00] Rest: more" in transcript_message
+    assert "w1000 " not in transcript_message
+
+    assert [plan["strategy"] for plan in llm_planner.load_plans()] == [llm_planner.DIRECT, llm_planner.RETRIEVAL_ONLY]
+    summary = llm_planner.summarize_plans(llm_planner.load_plans())
+    assert summary[("answer", llm_planner.RETRIEVAL_ONLY, llm_planner.SMALL_MODEL)]["count"] == 1
+
+
+def test_plans_log_is_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(llm_planner, "PLANS_LOG_MAX_BYTES", 2000)
+    plan = llm_planner.plan_answer(100, 100)
+
+    for _ in range(100):
+        llm_planner.record_plan(plan, "rotationTest", 0.1, "ok")
+
+    assert (tmp_path / llm_planner.PLANS_LOG).stat().st_size <= 2000
+    assert (tmp_path / f"{llm_planner.PLANS_LOG}.1").stat().st_size <= 2000 + 500
+    plans = llm_planner.load_plans()
+    assert 0 < len(plans) < 100 and plans[-1]["video_id"] == "rotationTest"
+    assert len(llm_planner.load_plans(limit=3)) == 3
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for on-demand request profiling and slow-request capture.
+"""
+
+import os
+import time
+import pytest
+import services.utils.profiling as profiling
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    os.environ.setdefault("DEEPGRAM_API_KEY", "test")
+    from fastapi.testclient import TestClient
+    from main import app
+
+    monkeypatch.setattr(profiling, "PROFILES_DIR", tmp_path / "profiles")
+    monkeypatch.setattr(profiling, "PROFILE_ON_REQUEST", True)
+    return TestClient(app)
+
+
+def busy_wait_for_profiler(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_capture_records_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILES_DIR", tmp_path)
+    capture = profiling.Capture("request")
+    busy_wait_for_profiler(0.1)
+    assert capture.finish()
+
+    profile_id = profiling.save_capture(capture, {"path": "/test"})
+    saved = profiling.get_profile(profile_id)
+    assert saved["samples"] > 0
+    lines = saved["folded"].splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("MainThread;") and "busy_wait_for_profiler (test_profiling.py:" in line for line in lines)
+    assert saved["top_frames"][0][0].startswith("busy_wait_for_profiler")
+
+
+def test_requests_are_profiled_on_demand(client):
+    assert "X-Profile-Id" not in client.get("/").headers
+    assert client.get("/profiles").json() == []
+
+    response = client.get("/", params={"profile": "1"})
+    profile_id = response.headers["X-Profile-Id"]
+    assert client.get("/", headers={"X-Profile": "1"}).headers["X-Profile-Id"] != profile_id
+
+    profiles = client.get("/profiles").json()
+    assert len(profiles) == 2
+    assert profiles[1]["id"] == profile_id
+    assert profiles[1]["trigger"] == "request"
+    assert profiles[1]["route"] == "/"
+    assert "folded" not in profiles[1]
+    assert client.get(f"/profiles/{profile_id}").headers["content-type"].startswith("text/plain")
+    assert client.get("/profiles/..%2Fsecrets").status_code == 404
+
+
+def test_only_slow_requests_are_captured_and_the_ring_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_ROUTES", {"/"})
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_SECONDS", 10)
+    assert "X-Profile-Id" not in client.get("/").headers
+
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_SECONDS", 0.000001)
+    monkeypatch.setattr(profiling, "PROFILE_RING_SIZE", 2)
+    ids = [client.get("/").headers["X-Profile-Id"] for _ in range(3)]
+
+    profiles = client.get("/profiles").json()
+    assert [profile["trigger"] for profile in profiles] == ["slow", "slow"]
+    assert ids[0] not in [profile["id"] for profile in profiles]
+
+
+def test_cheap_and_unknown_routes_are_not_watched_for_slow_requests(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_SECONDS", 0.000001)
+    assert profiling.get_trigger({}, {}, "/videos/answer_question") == "slow"
+    for endpoint in ("/metrics", "/", "unmatched"):
+        assert profiling.get_trigger({}, {}, endpoint) is None
+    assert "X-Profile-Id" not in client.get("/metrics").headers
+    assert client.get("/profiles").json() == []
+
+
+def test_a_ring_of_zero_keeps_no_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILES_DIR", tmp_path)
+    monkeypatch.setattr(profiling, "PROFILE_RING_SIZE", 0)
+    for _ in range(2):
+        capture = profiling.Capture("request")
+        capture.finish()
+        profiling.save_capture(capture, {"path": "/test"})
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_profiling_requires_the_token_when_configured(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert "X-Profile-Id" not in client.get("/", params={"profile": "1"}).headers
+    assert "X-Profile-Id" not in client.get("/", params={"profile": "1"}, headers={"X-Profile-Token": "wrong"}).headers
+    assert client.get("/profiles").status_code == 403
+
+    profile_id = client.get("/", params={"profile": "1"}, headers={"X-Profile-Token": "s3cret"}).headers["X-Profile-Id"]
+    assert [profile["id"] for profile in client.get("/profiles", headers={"X-Profile-Token": "s3cret"}).json()] == [profile_id]
+    assert client.get(f"/profiles/{profile_id}").status_code == 403
+
+    # Off by default
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    monkeypatch.setattr(profiling, "PROFILE_ON_REQUEST", False)
+    assert "X-Profile-Id" not in client.get("/", params={"profile": "1"}).headers
+    assert client.get("/profiles").status_code == 403
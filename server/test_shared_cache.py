@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the transcript cache shared by uvicorn workers through memory-mapped files.
+"""
+
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+import pytest
+import services.utils.storage as storage
+import services.utils.shared_cache as shared_cache
+from services.utils.metrics import SHARED_CACHE_LOOKUPS_TOTAL
+
+server_dir = Path(__file__).parent
+
+
+def write_artifacts(data_dir, video_id, word_count=600):
+    words = [
+        {"word": f"wörd{i}", "start": i / 2, "end": i / 2 + 0.4, "confidence": 0.9, "punctuated_word": f"Wörd{i}."}
+        for i in range(word_count)
+    ]
+    sections = [{"title": "Only", "start": "00:00:00", "end": "01:00:00", "summary": ["all"]}]
+    video_dir = data_dir / video_id
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"transcript": "Full transcript.", "words": words}]}]}}, f)
+    with open(video_dir / "sections.json", 'w') as f:
+        json.dump(sections, f)
+    return words
+
+
+@pytest.fixture
+def cache_dirs(tmp_path, monkeypatch):
+    data_dir, cache_dir = tmp_path / "data", tmp_path / "shm"
+    data_dir.mkdir()
+    monkeypatch.setattr(storage, "DATA_DIR", data_dir)
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(shared_cache, "_attached", type(shared_cache._attached)())
+    return data_dir, cache_dir
+
+
+def test_lookups_match_the_parsed_transcript(cache_dirs):
+    data_dir, _ = cache_dirs
+    words = write_artifacts(data_dir, "sharedTest1")
+
+    transcript = shared_cache.acquire_transcript("sharedTest1")
+    try:
+        assert transcript.word_count == len(words)
+        assert transcript.get_transcript() == "Full transcript."
+        assert transcript.sections[0]["title"] == "Only"
+        expected = ' '.join(word['word'] for word in words if 10 <= word['start'] <= 20)
+        assert transcript.get_text(10, 20) == expected
+        assert transcript.get_words(10, 10.5) == [
+            {"word": "wörd20", "start": 10.0, "end": 10.4}, {"word": "wörd21", "start": 10.5, "end": 10.9}
+        ]
+        assert transcript.get_text(1000, 2000) == ''
+    finally:
+        shared_cache.release_transcript(transcript)
+
+
+def test_other_processes_map_the_same_file(cache_dirs):
+    data_dir, cache_dir = cache_dirs
+    write_artifacts(data_dir, "sharedTest1")
+    built_before = SHARED_CACHE_LOOKUPS_TOTAL.get(result="built")
+
+    transcript = shared_cache.acquire_transcript("sharedTest1")
+    assert SHARED_CACHE_LOOKUPS_TOTAL.get(result="built") == built_before + 1
+    # A second acquire in this process reuses the mapping
+    assert shared_cache.acquire_transcript("sharedTest1") is transcript
+
+    # Another worker maps the file instead of parsing the JSON
+    code = (
+        "import json\n"
+        "from services.utils.shared_cache import acquire_transcript\n"
+        "from services.utils.metrics import SHARED_CACHE_LOOKUPS_TOTAL\n"
+        "transcript = acquire_transcript('sharedTest1')\n"
+        "print(json.dumps([SHARED_CACHE_LOOKUPS_TOTAL.get(result='mapped'), transcript.get_text(0, 1)]))\n"
+    )
+    env = {**os.environ, "VIDLY_DATA_DIR": str(data_dir), "SHARED_CACHE_DIR": str(cache_dir), "DEEPGRAM_API_KEY": "test"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=server_dir, env=env, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == [1, "wörd0 wörd1 wörd2"]
+    assert len(list(cache_dir.glob("*.bin"))) == 1
+
+    shared_cache.release_transcript(transcript)
+    shared_cache.release_transcript(transcript)
+
+
+def test_eviction_skips_transcripts_in_use(cache_dirs, monkeypatch):
+    data_dir, cache_dir = cache_dirs
+    for video_id in ("sharedTest1", "sharedTest2", "sharedTest3"):
+        write_artifacts(data_dir, video_id)
+    # Each worker only keeps transcripts mapped while they are used
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_ATTACHED", 0)
+
+    in_use = shared_cache.acquire_transcript("sharedTest1")
+    shared_cache.release_transcript(shared_cache.acquire_transcript("sharedTest2"))
+    assert shared_cache.get_attached_keys() == [in_use.key]
+
+    # Room for two transcripts: the unused one is evicted, the one in use stays
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_MAX_BYTES", 2 * in_use.size)
+    shared_cache.release_transcript(shared_cache.acquire_transcript("sharedTest3"))
+    assert sorted(path.name.split("-")[0] for path in cache_dir.glob("*.bin")) == ["sharedTest1", "sharedTest3"]
+    assert in_use.get_text(0, 1) == "wörd0 wörd1 wörd2"
+
+    shared_cache.release_transcript(in_use)
+    assert shared_cache.get_attached_keys() == []
+
+
+def test_new_transcriptions_get_a_new_entry(cache_dirs):
+    data_dir, _ = cache_dirs
+    write_artifacts(data_dir, "sharedTest1")
+    first = shared_cache.acquire_transcript("sharedTest1")
+    shared_cache.release_transcript(first)
+
+    write_artifacts(data_dir, "sharedTest1", word_count=10)
+    second = shared_cache.acquire_transcript("sharedTest1")
+    shared_cache.release_transcript(second)
+    assert second.key != first.key
+    assert second.word_count == 10
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for finding similar videos from the embeddings of their sections.
+"""
+
+import os
+import json
+import random
+import services.utils.storage as storage
+import services.similar_service as similar_service
+from services.similar_service import SimilarVideoIndex, embed_sections
+
+TOPICS = {
+    "cooking": ["pasta", "sauce", "garlic", "tomato", "oven", "recipe", "flour", "basil"],
+    "finance": ["stocks", "bonds", "portfolio", "dividend", "inflation", "savings", "index", "broker"],
+    "fitness": ["squat", "cardio", "protein", "muscle", "stretch", "workout", "running", "weights"],
+}
+
+
+def make_sections(topic, seed):
+    rng = random.Random(seed)
+    words = TOPICS[topic]
+    return [
+        {"title": " ".join(rng.sample(words, 3)), "summary": [" ".join(rng.choices(words, k=8)) for _ in range(2)]}
+        for _ in range(4)
+    ]
+
+
+def test_videos_on_the_same_topic_are_closest():
+    pasta = embed_sections(make_sections("cooking", 1))
+    sauce = embed_sections(make_sections("cooking", 2))
+    stocks = embed_sections(make_sections("finance", 3))
+    assert len(pasta) == similar_service.EMBEDDING_DIM
+
+    packed = similar_service.PackedVectors(len(pasta), [sauce, stocks])
+    same, other = packed.dot(pasta)
+    assert same == sum(a * b for a, b in zip(pasta, sauce))
+    assert same > 2 * other
+    # Unit length once the int8 scale is taken out
+    assert abs(sum(x * x for x in pasta) / similar_service.QUANTIZATION_SCALE ** 2 - 1) < 0.05
+
+
+def test_search_matches_brute_force_across_training_and_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(similar_service, "SIMILAR_MIN_TRAIN", 60)
+    rng = random.Random(0)
+    vectors = {f"video{i:06d}": embed_sections(make_sections(rng.choice(list(TOPICS)), i)) for i in range(80)}
+
+    index = SimilarVideoIndex(tmp_path)
+    for video_id, vector in vectors.items():
+        index.add(video_id, vector)
+    index.wait_for_training()
+    # Clustered once it reached SIMILAR_MIN_TRAIN, the later videos added to the lists
+    assert index.trained_on == 60 and len(index.lists) == 7
+    assert sum(len(rows) for rows in index.lists) == 80
+
+    query = vectors["video000003"]
+    exact = index.brute_force(query, k=5, exclude="video000003")
+    assert index.search(query, k=5, nprobe=len(index.lists), exclude="video000003") == exact
+    assert "video000003" not in [video_id for video_id, _ in exact]
+
+    # Another worker loads the lists and vectors from disk and sees its inserts
+    other = SimilarVideoIndex(tmp_path)
+    assert other.brute_force(query, k=5, exclude="video000003") == exact
+    index.add("video000080", query)
+    assert other.search(query, k=1, exclude="video000003")[0][0] == "video000080"
+
+    # A re-sectioned video moves to the list of its new vector
+    index.add("video000080", vectors["video000004"])
+    assert other.search(query, k=1, exclude="video000003")[0][0] != "video000080"
+    assert len(other) == 81
+
+
+def test_similar_videos_endpoint(tmp_path, monkeypatch):
+    os.environ.setdefault("DEEPGRAM_API_KEY", "test")
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # The index follows the data directory
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    for seed, (video_id, topic) in enumerate([("cooking0001", "cooking"), ("cooking0002", "cooking"), ("finance0001", "finance")]):
+        (tmp_path / video_id).mkdir()
+        with open(tmp_path / video_id / "sections.json", "w") as f:
+            json.dump(make_sections(topic, seed), f)
+
+    client = TestClient(app)
+    # The videos sectioned before the index existed are added in the background when it is first used
+    similar_service.get_similar_index()
+    similar_service._backfill_thread.join()
+    response = client.get("/videos/cooking0001/similar?k=1")
+    assert response.status_code == 200
+    assert [video["video_id"] for video in response.json()] == ["cooking0002"]
+    assert len(client.get("/videos/cooking0001/similar").json()) == 2
+
+    assert client.get("/videos/missing0001/similar").status_code == 404
+    assert client.get("/videos/cooking0001/similar?k=0").status_code == 400
+    assert (tmp_path / "similar_index" / "vectors.bin").exists()
+
+    # Without fcntl the workers can't share the index
+    monkeypatch.setattr(similar_service, "fcntl", None)
+    assert client.get("/videos/cooking0001/similar").status_code == 501
+
+
+def test_inserts_do_not_wait_for_the_lists_to_be_rebuilt(tmp_path, monkeypatch):
+    import threading
+    monkeypatch.setattr(similar_service, "SIMILAR_MIN_TRAIN", 4)
+    release = threading.Event()
+    train = SimilarVideoIndex._train
+
+    def slow_train(self, vectors, inode, seed=0):
+        release.wait(10)
+        train(self, vectors, inode, seed)
+
+    monkeypatch.setattr(SimilarVideoIndex, "_train", slow_train)
+    index = SimilarVideoIndex(tmp_path)
+    for i in range(6):
+        index.add(f"video{i:06d}", embed_sections(make_sections("cooking", i)))
+    # The rebuild started by the 4th insert is still running and the later inserts went through
+    assert len(index) == 6 and index.trained_on == 0
+    assert index.get_vector("video000005") is not None
+
+    release.set()
+    index.wait_for_training()
+    assert index.trained_on == 4
+    assert sum(len(rows) for rows in index.lists) == 6
+    assert index.get_vector("missing") is None
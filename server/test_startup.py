@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests that importing the server stays fast: SDKs are loaded lazily and the cost is paid by the warm-up instead.
+"""
+
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+server_dir = Path(__file__).parent
+
+# Importing main.py (FastAPI + our modules, without any provider SDK) takes about 0.5s on a laptop
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", 2.0))
+LAZY_MODULES = ["google.generativeai", "instructor", "backoff", "deepgram"]
+
+
+def measure_import(module: str):
+    # A fresh interpreter so that nothing is already imported by the test runner
+    code = (
+        "import sys, time, json\n"
+        "started_at = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - started_at, 'modules': sorted(sys.modules)}))\n"
+    )
+    env = {**os.environ, "DEEPGRAM_API_KEY": os.getenv("DEEPGRAM_API_KEY", "test")}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=server_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_time_within_budget():
+    result = measure_import("main")
+    assert result["seconds"] < IMPORT_TIME_BUDGET_SECONDS, (
+        f"Importing main took {result['seconds']:.2f}s (budget {IMPORT_TIME_BUDGET_SECONDS}s)"
+    )
+
+
+def test_services_do_not_import_sdks():
+    for module in ["main", "services.llm_service", "services.transcription_service"]:
+        loaded = set(measure_import(module)["modules"])
+        assert not loaded.intersection(LAZY_MODULES), f"{module} imports {loaded.intersection(LAZY_MODULES)}"
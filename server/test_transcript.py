@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for time-range transcript reads and the cached transcript/sections endpoints.
+"""
+
+import os
+import gzip
+import json
+import services.utils.storage as storage
+from services.transcript_service import get_transcript_window, WORDS_ARTIFACT
+
+VIDEO_ID = "windowTest1"
+
+
+def write_transcription(data_dir, duration=300):
+    words = [
+        {"word": f"w{i}", "start": float(i), "end": i + 0.5, "confidence": 0.9, "punctuated_word": f"W{i}."}
+        for i in range(duration)
+    ]
+    video_dir = data_dir / VIDEO_ID
+    video_dir.mkdir(parents=True, exist_ok=True)
+    with open(video_dir / "transcription.json", 'w') as f:
+        json.dump({"results": {"channels": [{"alternatives": [{"words": words}]}]}}, f)
+
+
+def test_transcript_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    write_transcription(tmp_path)
+
+    window = get_transcript_window(VIDEO_ID, 45, 95.5)
+
+    assert [word["start"] for word in window["words"]] == [float(i) for i in range(45, 96)]
+    assert window["words"][0] == {"start": 45.0, "end": 45.5, "word": "W45."}
+    assert window["duration"] == 299.5
+    assert (tmp_path / VIDEO_ID / WORDS_ARTIFACT).exists()
+
+    # The index is rebuilt when the transcription changes
+    write_transcription(tmp_path, duration=100)
+    os.utime(tmp_path / VIDEO_ID / "transcription.json", ns=(0, 0))
+    assert get_transcript_window(VIDEO_ID, 90)["words"][-1]["start"] == 99.0
+
+
+def test_transcript_endpoint_etag_and_compression(tmp_path, monkeypatch):
+    os.environ.setdefault("DEEPGRAM_API_KEY", "test")
+    from fastapi.testclient import TestClient
+    from main import app
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    write_transcription(tmp_path)
+    client = TestClient(app)
+
+    response = client.get(f"/videos/{VIDEO_ID}/transcript", params={"start": 0, "end": 120}, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["words"]) == 121
+    etag = response.headers["etag"]
+    # The compressed and identity representations share a tag, so it is weak
+    assert etag.startswith('W/"')
+
+    response = client.get(f"/videos/{VIDEO_ID}/transcript", params={"start": 0, "end": 120}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # A zero q value in any notation refuses the encoding
+    for refusal in ["gzip;q=0", "gzip; q=0.0", "gzip;q=0.000, identity"]:
+        response = client.get(f"/videos/{VIDEO_ID}/transcript", params={"start": 0, "end": 120}, headers={"Accept-Encoding": refusal})
+        assert "content-encoding" not in response.headers
+    response = client.get(f"/videos/{VIDEO_ID}/transcript", params={"start": 0, "end": 120}, headers={"Accept-Encoding": "gzip;q=0.5"})
+    assert response.headers["content-encoding"] == "gzip"
+
+    # Another window is another representation
+    response = client.get(f"/videos/{VIDEO_ID}/transcript", params={"start": 0, "end": 60}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    assert client.get("/videos/missingVid1/transcript").status_code == 404
+    assert client.get("/videos/bad..id/transcript").status_code == 400
+    assert client.get(f"/videos/{VIDEO_ID}/sections").status_code == 404
+
+
+def test_concurrent_writes_of_an_artifact_never_mix(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from services.utils.json_utils import dump_file, load_file
+
+    path = tmp_path / "stats.json"
+    payloads = [{"writer": writer, "values": list(range(20000))} for writer in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda payload: dump_file(payload, path), payloads * 5))
+
+    # One complete write won, and no temporary file is left behind
+    assert load_file(path) in payloads
+    assert [p.name for p in tmp_path.iterdir()] == ["stats.json"]